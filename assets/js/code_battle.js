@@ -277,6 +277,244 @@ function startBattleTimer() {
 // Continue with all other functions...
 // For brevity, I'll include the key functions and end the file properly
 
+// ============ BATTLE EVENTS (SERVER PUSH) ============
+// Nhận sự kiện của battle room (player_joined, countdown, submission, result)
+// qua SSE; trình duyệt không hỗ trợ EventSource, hoặc server từ chối kết nối
+// SSE (quá nhiều kết nối), thì dùng long-poll.
+function subscribeBattle(battleId, onEvent) {
+    const base = '/api/games/battle/' + encodeURIComponent(battleId);
+    let closed = false;
+    let source = null;
+    let lastSeq = 0;
+
+    function deliver(event) {
+        if (event.seq <= lastSeq) return;
+        lastSeq = event.seq;
+        onEvent(event);
+    }
+
+    async function poll() {
+        while (!closed) {
+            try {
+                const response = await fetch(base + '/poll?after=' + lastSeq + '&timeout=25');
+                const data = await response.json();
+                if (response.status === 503 && data.retry_after) {
+                    // Server đang đủ kết nối chờ: đợi rồi hỏi lại
+                    await new Promise(resolve => setTimeout(resolve, data.retry_after * 1000));
+                    continue;
+                }
+                if (!data.success) break;
+                data.events.forEach(deliver);
+            } catch (error) {
+                await new Promise(resolve => setTimeout(resolve, 3000));
+            }
+        }
+    }
+
+    if (window.EventSource) {
+        // EventSource tự kết nối lại và gửi Last-Event-ID để không mất sự kiện
+        source = new EventSource(base + '/events');
+        ['player_joined', 'countdown', 'submission', 'result', 'resync'].forEach(type => {
+            source.addEventListener(type, e => deliver(JSON.parse(e.data)));
+        });
+        source.onerror = () => {
+            // Server trả lỗi (vd. 503) thì EventSource dừng hẳn, không tự kết nối lại
+            if (source.readyState === EventSource.CLOSED && !closed) {
+                source = null;
+                poll();
+            }
+        };
+    } else {
+        poll();
+    }
+    return () => {
+        closed = true;
+        if (source) source.close();
+    };
+}
+
+// ============ PVP BATTLE ============
+// Ghép trận với người chơi khác qua /api/games/matchmaking, rồi theo dõi
+// room bằng subscribeBattle(); bài của hai người được chấm cùng lúc ở server.
+let pvpBattleId = null;
+let pvpOpponent = null;
+let pvpUnsubscribe = null;
+
+async function findOpponent() {
+    const button = document.getElementById('pvp-battle-btn');
+    button.disabled = true;
+    try {
+        let data = await (await fetch('/api/games/matchmaking/join', { method: 'POST' })).json();
+        if (!data.success) throw new Error(data.message || 'Không vào được hàng đợi ghép trận');
+        showNotification(' Đang tìm đối thủ...', 'info');
+
+        let ticket = data.ticket;
+        while (ticket.status !== 'matched') {
+            const response = await fetch('/api/games/matchmaking/status?timeout=25');
+            data = await response.json();
+            if (response.status === 503 && data.retry_after) {
+                // Server đang đủ kết nối chờ: đợi rồi hỏi lại
+                await new Promise(resolve => setTimeout(resolve, data.retry_after * 1000));
+                continue;
+            }
+            if (!data.success) throw new Error(data.message || 'Đã rời hàng đợi ghép trận');
+            ticket = data.ticket;
+        }
+        pvpOpponent = ticket.opponent;
+        await enterPvpBattle(ticket.battle_id);
+    } catch (error) {
+        showNotification(error.message, 'warning');
+        button.disabled = false;
+    }
+}
+
+async function enterPvpBattle(battleId) {
+    const data = await (await fetch('/api/games/battle/' + encodeURIComponent(battleId))).json();
+    if (!data.success || !data.challenge) throw new Error(data.message || 'Không tải được trận đấu');
+
+    pvpBattleId = battleId;
+    currentProblem = data.challenge;
+    userCompleted = false;
+    document.getElementById('ai-selection').style.display = 'none';
+    document.getElementById('battle-arena').style.display = 'block';
+    document.getElementById('problem-title').textContent = currentProblem.title;
+    document.getElementById('problem-description').textContent = currentProblem.description || '';
+    document.getElementById('problem-example').textContent = '';
+    document.getElementById('ai-name').textContent = 'Đối thủ';
+    document.getElementById('difficulty-level').textContent = 'PvP';
+    document.getElementById('ai-status').textContent = 'Chờ trận đấu bắt đầu...';
+    document.querySelector('.action-btn.submit').onclick = submitPvpCode;
+
+    pvpUnsubscribe = subscribeBattle(battleId, onPvpEvent);
+}
+
+function onPvpEvent(event) {
+    if (event.event === 'countdown') {
+        startPvpCountdown(event.data.starts_at);
+    } else if (event.event === 'submission') {
+        if (event.data.user_id === pvpOpponent) {
+            document.getElementById('ai-status').textContent = 'Đối thủ đã nộp bài!';
+            document.getElementById('ai-progress-bar').style.width = '100%';
+        }
+    } else if (event.event === 'result') {
+        showPvpResult(event.data);
+    } else if (event.event === 'resync') {
+        // Đã lỡ sự kiện: đọc lại trạng thái room
+        fetch('/api/games/battle/' + encodeURIComponent(pvpBattleId))
+            .then(response => response.json())
+            .then(data => {
+                if (data.success && data.battle.result) showPvpResult(data.battle.result);
+            });
+    }
+}
+
+function startPvpCountdown(startsAt) {
+    const countdown = document.getElementById('countdown');
+    const countdownNumber = document.getElementById('countdown-number');
+    countdown.style.display = 'flex';
+
+    const tick = () => {
+        const remaining = Math.ceil(startsAt - Date.now() / 1000);
+        if (remaining > 0) {
+            countdownNumber.textContent = remaining;
+            setTimeout(tick, 250);
+            return;
+        }
+        countdown.style.display = 'none';
+        document.getElementById('ai-status').textContent = 'Đối thủ đang code...';
+        userStartTime = Date.now();
+        startPvpTimer();
+        document.getElementById('user-code').focus();
+        showNotification(' Trận đấu bắt đầu! Hãy code thật tốt!', 'success');
+    };
+    tick();
+}
+
+function startPvpTimer() {
+    clearInterval(battleTimer);
+    battleTimeLeft = 300;
+    battleTimer = setInterval(() => {
+        battleTimeLeft--;
+        const minutes = Math.floor(battleTimeLeft / 60);
+        const seconds = battleTimeLeft % 60;
+        document.getElementById('battle-timer').textContent =
+            minutes.toString().padStart(2, '0') + ':' + seconds.toString().padStart(2, '0');
+
+        if (battleTimeLeft <= 0) {
+            // Hết giờ: tự nộp code hiện tại
+            clearInterval(battleTimer);
+            if (!userCompleted) submitPvpCode();
+        }
+    }, 1000);
+}
+
+async function submitPvpCode() {
+    if (userCompleted) return;
+    const code = document.getElementById('user-code').value;
+    if (!code.trim()) {
+        showNotification('Hãy viết code trước khi nộp bài!', 'warning');
+        return;
+    }
+    try {
+        const response = await fetch('/api/games/battle/' + encodeURIComponent(pvpBattleId) + '/submit', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ code })
+        });
+        const data = await response.json();
+        if (!data.success) throw new Error(data.message || 'Không nộp được bài');
+        userCompleted = true;
+        userCompletionTime = Date.now() - userStartTime;
+        showNotification(data.judging ? ' Đang chấm bài...' : ' Đã nộp bài, chờ đối thủ...', 'success');
+    } catch (error) {
+        showNotification(error.message, 'error');
+    }
+}
+
+function showPvpResult(result) {
+    clearInterval(battleTimer);
+    if (pvpUnsubscribe) {
+        pvpUnsubscribe();
+        pvpUnsubscribe = null;
+    }
+    if (result.error) {
+        showNotification(' Không chấm được trận đấu: ' + result.error, 'error');
+        return;
+    }
+
+    const me = result.players.find(player => player.user_id !== pvpOpponent);
+    let message = ' Hòa!';
+    if (result.winner && result.winner === pvpOpponent) {
+        message = ' Đối thủ đã thắng!';
+    } else if (result.winner) {
+        message = ' Bạn đã thắng!';
+    }
+    if (me) message += ' (' + me.passed_count + '/' + me.total + ' test đúng)';
+    document.getElementById('ai-status').textContent = message;
+    showNotification(message, result.winner && result.winner !== pvpOpponent ? 'success' : 'info');
+}
+
+// Gợi ý cho thử thách của trận PvP (thử thách speed coding trong catalog của server)
+let hintRequest = null;
+
+async function getHint() {
+    if (!pvpBattleId || !currentProblem || typeof currentProblem.id !== 'number') {
+        showNotification('Gợi ý chỉ có trong trận đấu với người chơi khác', 'info');
+        return;
+    }
+    if (!hintRequest || hintRequest.id !== currentProblem.id) {
+        hintRequest = {
+            id: currentProblem.id,
+            data: fetch('/api/games/hints/speed/' + currentProblem.id)
+                .then(response => response.json())
+                .then(data => data.success ? data : null)
+                .catch(() => null)
+        };
+    }
+    const data = await hintRequest.data;
+    showNotification(' Gợi ý: ' + ((data && data.hint) || currentProblem.hint || 'Không có gợi ý cho thử thách này.'), 'info');
+}
+
 // ============ NOTIFICATION SYSTEM ============
 function showNotification(message, type = 'info') {
     // Remove existing notifications
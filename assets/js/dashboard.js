@@ -16,9 +16,9 @@ let userStats = {
 };
 
 // AI Service Configuration - OpenRouter Multi-Model Support
+// Mọi request đi qua gateway /api/ai/* của server (API key chỉ nằm ở server,
+// server cache câu trả lời và gộp các prompt giống nhau)
 const AI_CONFIG = {
-  API_KEY:
-    "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",
   PROVIDER: "openrouter",
   MODEL: "openai/gpt-4o-mini", // Default model
   AVAILABLE_MODELS: [
@@ -30,12 +30,10 @@ const AI_CONFIG = {
     "meta-llama/llama-3.1-8b-instruct:free",
   ],
   ENDPOINTS: {
-    chat: "https://openrouter.ai/api/v1/chat/completions",
-    models: "https://openrouter.ai/api/v1/models",
-  },
-  HEADERS: {
-    "HTTP-Referer": "https://codequest-ai.vercel.app",
-    "X-Title": "CodeQuest AI Learning Platform",
+    chat: "/api/ai/generate",
+    stream: "/api/ai/stream",
+    models: "/api/ai/models",
+    evaluate: "/api/ai/evaluate",
   },
 };
 
@@ -49,7 +47,6 @@ async function generateText(prompt, model = AI_CONFIG.MODEL) {
 
   console.log("🔍 generateText called with OpenRouter:", {
     promptLength: prompt.length,
-    apiKey: AI_CONFIG.API_KEY.substring(0, 15) + "...",
     model: model,
     provider: AI_CONFIG.PROVIDER,
     url: url,
@@ -58,27 +55,18 @@ async function generateText(prompt, model = AI_CONFIG.MODEL) {
   try {
     const requestBody = {
       model: model,
-      messages: [
-        {
-          role: "user",
-          content: prompt,
-        },
-      ],
+      prompt: prompt,
       temperature: 0.7,
       max_tokens: 1024,
       top_p: 0.95,
-      stream: false,
     };
 
-    console.log("📤 Sending request to OpenRouter API...");
+    console.log("📤 Sending request to AI gateway...");
 
     const response = await fetch(url, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
-        Authorization: `Bearer ${AI_CONFIG.API_KEY}`,
-        "HTTP-Referer": AI_CONFIG.HEADERS["HTTP-Referer"],
-        "X-Title": AI_CONFIG.HEADERS["X-Title"],
       },
       body: JSON.stringify(requestBody),
     });
@@ -117,7 +105,7 @@ async function generateText(prompt, model = AI_CONFIG.MODEL) {
     const data = await response.json();
     console.log("🔍 OpenRouter Response data:", data);
 
-    const result = data.choices?.[0]?.message?.content || "";
+    const result = data.text || "";
 
     if (!result) {
       console.error("❌ Empty result from OpenRouter response:", data);
@@ -907,81 +895,26 @@ async function submitToAI() {
 
   showAINotification("🤖 AI đang phân tích và chấm điểm...", "info");
 
-  // Gọi AI thực sự để chấm điểm
+  // Gọi AI thực sự để chấm điểm (server gom các bài nộp cùng đề thành batch
+  // và dùng lại kết quả cho bài trùng, xem utils/ai_evaluator.py)
   try {
-    const aiPrompt = `
-Bạn là một AI giáo viên chấm bài lập trình. Hãy chấm điểm code sau theo thang điểm 100:
-
-BÀI TẬP: Tính tổng hai số a và b
-
-CODE CỦA HỌC SINH:
-\`\`\`
-${codeContent}
-\`\`\`
-
-HÃY ĐÁNH GIÁ:
-1. Code có giải quyết đúng bài toán không? (40 điểm)
-2. Cú pháp có chính xác không? (20 điểm) 
-3. Code có dễ đọc, gọn gàng không? (20 điểm)
-4. Có hiển thị kết quả không? (20 điểm)
-
-Trả về JSON format:
-{
-  "score": số_điểm_từ_0_đến_100,
-  "evaluation": [
-    "✅ hoặc ❌ Chi tiết đánh giá từng tiêu chí",
-    "..."
-  ],
-  "comment": "Nhận xét tổng thể ngắn gọn",
-  "correct": true/false
-}
-    `;
-
-    // Gọi AI API
-    const response = await fetch(
-      "https://openrouter.ai/api/v1/chat/completions",
-      {
-        method: "POST",
-        headers: {
-          Authorization: `Bearer ${AI_CONFIG.API_KEY}`,
-          "Content-Type": "application/json",
-          "HTTP-Referer": AI_CONFIG.HEADERS["HTTP-Referer"],
-          "X-Title": AI_CONFIG.HEADERS["X-Title"],
-        },
-        body: JSON.stringify({
-          model: AI_CONFIG.MODEL,
-          messages: [
-            {
-              role: "user",
-              content: aiPrompt,
-            },
-          ],
-          temperature: 0.3,
-        }),
-      }
-    );
+    const response = await fetch(AI_CONFIG.ENDPOINTS.evaluate, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        model: AI_CONFIG.MODEL,
+        challenge: "Tính tổng hai số a và b",
+        code: codeContent,
+      }),
+    });
 
     const data = await response.json();
-    const aiResponse = data.choices[0].message.content;
-
-    // Parse AI response
-    let aiResult;
-    try {
-      const jsonMatch = aiResponse.match(/\{[\s\S]*\}/);
-      if (jsonMatch) {
-        aiResult = JSON.parse(jsonMatch[0]);
-      } else {
-        throw new Error("No JSON found");
-      }
-    } catch (e) {
-      // Fallback nếu AI không trả về JSON đúng format
-      aiResult = {
-        score: 70,
-        evaluation: ["🤖 AI đã phân tích code của bạn"],
-        comment: aiResponse.slice(0, 200) + "...",
-        correct: true,
-      };
+    if (!response.ok || !data.success) {
+      throw new Error(data.error || `HTTP ${response.status}`);
     }
+    const aiResult = data.verdict;
 
     const score = Math.max(20, Math.min(aiResult.score, 95));
     const feedback_details = aiResult.evaluation || [
@@ -1455,6 +1388,9 @@ function filterRanking(type) {
 
   // Reload leaderboard with filter
   loadLeaderboard();
+  if (typeof loadGameLeaderboard === "function") {
+    loadGameLeaderboard(type);
+  }
 }
 
 // ==================== AI ASSISTANT ====================
@@ -1709,13 +1645,10 @@ async function autoDetectWorkingModel() {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
-          Authorization: `Bearer ${AI_CONFIG.API_KEY}`,
-          "HTTP-Referer": AI_CONFIG.HEADERS["HTTP-Referer"],
-          "X-Title": AI_CONFIG.HEADERS["X-Title"],
         },
         body: JSON.stringify({
           model: model,
-          messages: [{ role: "user", content: "Hi" }],
+          prompt: "Hi",
           max_tokens: 10,
         }),
       });
@@ -1744,10 +1677,7 @@ async function autoDetectWorkingModel() {
  * Test OpenRouter AI connection with comprehensive model detection
  */
 async function testAIConnection() {
-  console.log(
-    "🔍 Testing OpenRouter connection with API key:",
-    AI_CONFIG.API_KEY.substring(0, 15) + "..."
-  );
+  console.log("🔍 Testing OpenRouter connection via AI gateway...");
   updateTutorStatus("Đang kiểm tra API...");
 
   try {
@@ -1840,16 +1770,11 @@ async function testAPIVersions() {
 
     const modelsResponse = await fetch(AI_CONFIG.ENDPOINTS.models, {
       method: "GET",
-      headers: {
-        Authorization: `Bearer ${AI_CONFIG.API_KEY}`,
-        "HTTP-Referer": AI_CONFIG.HEADERS["HTTP-Referer"],
-        "X-Title": AI_CONFIG.HEADERS["X-Title"],
-      },
     });
 
     if (modelsResponse.ok) {
       const modelsData = await modelsResponse.json();
-      const availableModels = modelsData.data?.map((m) => m.id) || [];
+      const availableModels = modelsData.models || [];
       console.log("✅ Available models:", availableModels.slice(0, 10)); // Log first 10
 
       // Update available models list with working ones
@@ -1873,13 +1798,10 @@ async function testAPIVersions() {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
-            Authorization: `Bearer ${AI_CONFIG.API_KEY}`,
-            "HTTP-Referer": AI_CONFIG.HEADERS["HTTP-Referer"],
-            "X-Title": AI_CONFIG.HEADERS["X-Title"],
           },
           body: JSON.stringify({
             model: model,
-            messages: [{ role: "user", content: "Test" }],
+            prompt: "Test",
             max_tokens: 5,
           }),
         });
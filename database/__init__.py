@@ -1,5 +1,5 @@
-from .models import db, User, Session
+from .models import db, User, Session, GameScore, BattleRoom, BattleEvent, MatchmakingTicket
 from .config import DatabaseConfig
-from .database import init_database, create_database_if_not_exists, test_connection
+from .database import init_database, create_database_if_not_exists, create_tables, test_connection
 
-__all__ = ['db', 'User', 'Session', 'DatabaseConfig', 'init_database', 'create_database_if_not_exists', 'test_connection']
\ No newline at end of file
+__all__ = ['db', 'User', 'Session', 'GameScore', 'BattleRoom', 'BattleEvent', 'MatchmakingTicket', 'DatabaseConfig', 'init_database', 'create_database_if_not_exists', 'create_tables', 'test_connection']
\ No newline at end of file
@@ -14,10 +14,28 @@ class DatabaseConfig:
     def get_database_url(cls):
         password_encoded = quote_plus(cls.DB_PASSWORD)
         return f"postgresql://{cls.DB_USER}:{password_encoded}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
+
+    # Tham số kết nối cho psycopg2.connect (dùng bởi connection pool)
+    @classmethod
+    def get_connect_kwargs(cls):
+        return {
+            'host': cls.DB_HOST,
+            'port': cls.DB_PORT,
+            'database': cls.DB_NAME,
+            'user': cls.DB_USER,
+            'password': cls.DB_PASSWORD
+        }
+
+    # Connection pool cho đường psycopg2 thuần (database/pool.py)
+    POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))  # giây chờ mượn kết nối
+    POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
     
     # Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'codequest-ai-secret-key-2024'
-    SQLALCHEMY_DATABASE_URI = get_database_url.__func__()
+    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{quote_plus(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
@@ -61,6 +61,118 @@ def init_database(app: Flask):
         print(f"❌ Error initializing database: {e}")
         return False
 
+def create_tables():
+    """Tạo các bảng dùng bởi đường psycopg2 thuần (users, sessions, game_scores, battle_rooms, battle_events, matchmaking_tickets)"""
+    try:
+        conn = psycopg2.connect(**DatabaseConfig.get_connect_kwargs())
+    except Exception as e:
+        print(f"❌ Database connection failed: {e}")
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        
+        # Tạo bảng users
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id VARCHAR(36) PRIMARY KEY,
+                full_name VARCHAR(100) NOT NULL,
+                email VARCHAR(120) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                is_verified BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP
+            )
+        ''')
+        
+        # Tạo bảng sessions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                id VARCHAR(36) PRIMARY KEY,
+                user_id VARCHAR(36) REFERENCES users(id),
+                session_token VARCHAR(255) UNIQUE NOT NULL,
+                expires_at TIMESTAMP NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Tạo bảng game_scores (kết quả từng lượt chơi, dùng cho leaderboard)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS game_scores (
+                id SERIAL PRIMARY KEY,
+                user_id VARCHAR(36) NOT NULL REFERENCES users(id),
+                game VARCHAR(30) NOT NULL,
+                score REAL NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_scores_user_id ON game_scores (user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_scores_created_at ON game_scores (created_at)')
+        
+        # Tạo bảng battle_rooms (battle room dùng chung giữa các worker process)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS battle_rooms (
+                id VARCHAR(16) PRIMARY KEY,
+                creator VARCHAR(36) NOT NULL,
+                players TEXT NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'waiting',
+                max_players INTEGER NOT NULL DEFAULT 2,
+                challenge_id INTEGER,
+                submissions TEXT,
+                result TEXT,
+                version INTEGER NOT NULL DEFAULT 1,
+                created_at DOUBLE PRECISION NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_battle_rooms_updated_at ON battle_rooms (updated_at)')
+        for column, column_type in (('challenge_id', 'INTEGER'), ('submissions', 'TEXT'), ('result', 'TEXT'),
+                                    ('event_seq', 'INTEGER NOT NULL DEFAULT 0')):
+            cursor.execute(f'ALTER TABLE battle_rooms ADD COLUMN IF NOT EXISTS {column} {column_type}')
+        
+        # Tạo bảng battle_events (sự kiện của battle room, seq tăng dần theo room)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS battle_events (
+                battle_id VARCHAR(16) NOT NULL,
+                seq INTEGER NOT NULL,
+                event VARCHAR(30) NOT NULL,
+                data TEXT,
+                created_at DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (battle_id, seq)
+            )
+        ''')
+        
+        # Tạo bảng matchmaking_tickets (hàng đợi ghép trận dùng chung giữa các worker)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS matchmaking_tickets (
+                user_id VARCHAR(36) PRIMARY KEY,
+                rating DOUBLE PRECISION NOT NULL,
+                enqueued_at DOUBLE PRECISION NOT NULL,
+                last_seen DOUBLE PRECISION NOT NULL,
+                status VARCHAR(10) NOT NULL DEFAULT 'waiting',
+                battle_id VARCHAR(16),
+                opponent VARCHAR(36),
+                matched_at DOUBLE PRECISION,
+                matching_since DOUBLE PRECISION
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_matchmaking_tickets_status_rating ON matchmaking_tickets (status, rating)')
+        cursor.execute('ALTER TABLE matchmaking_tickets ADD COLUMN IF NOT EXISTS matching_since DOUBLE PRECISION')
+        
+        conn.commit()
+        cursor.close()
+        conn.close()
+        print("✅ Database tables created successfully!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error creating tables: {e}")
+        conn.rollback()
+        conn.close()
+        return False
+
 def create_default_admin():
     """Tạo admin user mặc định"""
     try:
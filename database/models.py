@@ -1,5 +1,4 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid
 
@@ -19,12 +18,17 @@ class User(db.Model):
     last_login = db.Column(db.DateTime)
     
     def set_password(self, password):
-        """Hash và lưu mật khẩu"""
-        self.password_hash = generate_password_hash(password)
+        """Hash và lưu mật khẩu (chạy trên process pool của password_hasher)"""
+        from utils.passwords import password_hasher
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Kiểm tra mật khẩu"""
-        return check_password_hash(self.password_hash, password)
+        """Kiểm tra mật khẩu; hash cũ yếu hơn cấu hình được thay bằng hash mới"""
+        from utils.passwords import password_hasher
+        ok, new_hash = password_hasher.verify(password, self.password_hash)
+        if new_hash:
+            self.password_hash = new_hash
+        return ok
     
     def to_dict(self):
         """Chuyển đổi object thành dictionary"""
@@ -56,4 +60,63 @@ class Session(db.Model):
         return datetime.utcnow() > self.expires_at
     
     def __repr__(self):
-        return f'<Session {self.user_id}>'
\ No newline at end of file
+        return f'<Session {self.user_id}>'
+
+class GameScore(db.Model):
+    __tablename__ = 'game_scores'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    game = db.Column(db.String(30), nullable=False)
+    score = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<GameScore {self.user_id} {self.game} {self.score}>'
+
+class BattleRoom(db.Model):
+    __tablename__ = 'battle_rooms'
+    
+    id = db.Column(db.String(16), primary_key=True)
+    creator = db.Column(db.String(36), nullable=False)
+    players = db.Column(db.Text, nullable=False)  # JSON list user_id
+    status = db.Column(db.String(20), nullable=False, default='waiting')
+    max_players = db.Column(db.Integer, nullable=False, default=2)
+    challenge_id = db.Column(db.Integer)
+    submissions = db.Column(db.Text)  # JSON user_id -> {code, submitted_at}
+    result = db.Column(db.Text)  # JSON kết quả chấm
+    version = db.Column(db.Integer, nullable=False, default=1)
+    event_seq = db.Column(db.Integer, nullable=False, default=0)  # seq của sự kiện mới nhất
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<BattleRoom {self.id} v{self.version}>'
+
+class BattleEvent(db.Model):
+    __tablename__ = 'battle_events'
+    
+    battle_id = db.Column(db.String(16), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(30), nullable=False)
+    data = db.Column(db.Text)  # JSON dữ liệu sự kiện
+    created_at = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<BattleEvent {self.battle_id}#{self.seq} {self.event}>'
+
+class MatchmakingTicket(db.Model):
+    __tablename__ = 'matchmaking_tickets'
+    
+    user_id = db.Column(db.String(36), primary_key=True)
+    rating = db.Column(db.Float, nullable=False)
+    enqueued_at = db.Column(db.Float, nullable=False)
+    last_seen = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='waiting')  # waiting, matching, matched
+    battle_id = db.Column(db.String(16))
+    opponent = db.Column(db.String(36))
+    matched_at = db.Column(db.Float)
+    matching_since = db.Column(db.Float)  # lúc vé bị giữ để tạo trận (status = matching)
+    
+    def __repr__(self):
+        return f'<MatchmakingTicket {self.user_id} {self.status}>'
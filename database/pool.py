@@ -0,0 +1,284 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from .config import DatabaseConfig
+
+
+class PoolError(Exception):
+    """Lỗi chung của connection pool"""
+
+
+class PoolTimeout(PoolError):
+    """Hết thời gian chờ mượn kết nối từ pool"""
+
+
+class PooledConnection:
+    """Bọc kết nối psycopg2, close() trả kết nối về pool thay vì đóng hẳn"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        """Trả kết nối về pool (gọi nhiều lần không sao)"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn)
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise PoolError('Kết nối đã được trả về pool')
+        return getattr(conn, name)
+
+    def __del__(self):
+        # Phòng trường hợp code gọi quên close(): không để rò rỉ slot của pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Pool kết nối PostgreSQL an toàn với đa luồng.
+
+    - min_size / max_size: số kết nối giữ sẵn / tối đa được mở
+    - timeout: số giây tối đa chờ mượn kết nối khi pool đã đầy
+    - health_check_interval: kết nối rảnh lâu hơn ngưỡng này sẽ được ping
+      (SELECT 1) trước khi cho mượn; 0 = luôn ping
+    - max_idle: kết nối rảnh quá lâu (và pool đang dư so với min_size) sẽ bị đóng
+    """
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, timeout=5.0,
+                 health_check_interval=30.0, max_idle=300.0, connect=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Cấu hình pool không hợp lệ')
+
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self._connect = connect or (lambda: psycopg2.connect(**self.connect_kwargs))
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, thời điểm trả về pool)
+        self._size = 0        # tổng số kết nối đang mở (rảnh + đang dùng)
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Bộ đếm
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    # ---------- Mượn / trả kết nối ----------
+
+    def getconn(self, timeout=None):
+        """Mượn một kết nối; ném PoolTimeout nếu chờ quá timeout giây"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_started = None
+
+        while True:
+            conn = None
+            idle_since = None
+            create = False
+
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError('Pool đã bị đóng')
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        if waited:
+                            self._wait_time += time.monotonic() - wait_started
+                        raise PoolTimeout(
+                            f'Không mượn được kết nối sau {timeout} giây '
+                            f'(đang dùng {self._in_use}/{self.max_size})'
+                        )
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._waits += 1
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self._checkouts += 1
+                if waited:
+                    self._wait_time += time.monotonic() - wait_started
+            return PooledConnection(self, conn)
+
+    def putconn(self, conn, discard=False):
+        """Trả kết nối về pool; kết nối hỏng hoặc đang dở transaction sẽ được dọn"""
+        if isinstance(conn, PooledConnection):
+            conn.close()
+            return
+
+        with self._cond:
+            self._in_use -= 1
+
+        if not discard and not getattr(conn, 'closed', 0):
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        if discard or self._closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with db_pool.connection() as conn: ... (tự trả kết nối khi xong)"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ---------- Quản lý ----------
+
+    def warmup(self):
+        """Mở sẵn min_size kết nối"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._created += 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def closeall(self):
+        """Đóng toàn bộ kết nối rảnh; kết nối đang dùng sẽ bị đóng khi được trả về"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Các bộ đếm của pool"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 6),
+                'wait_time_avg': round(self._wait_time / self._waits, 6) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+            }
+
+    # ---------- Nội bộ ----------
+
+    def _is_healthy(self, conn, idle_since):
+        if getattr(conn, 'closed', 0):
+            return False
+
+        idle_for = time.monotonic() - idle_since
+        if self.max_idle and idle_for > self.max_idle:
+            with self._cond:
+                # Dư so với min_size thì đóng bớt thay vì ping
+                if self._size > self.min_size:
+                    return False
+
+        if idle_for < self.health_check_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            print(f"Pool health check failed: {e}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+
+db_pool = ConnectionPool(
+    DatabaseConfig.get_connect_kwargs(),
+    min_size=DatabaseConfig.POOL_MIN_SIZE,
+    max_size=DatabaseConfig.POOL_MAX_SIZE,
+    timeout=DatabaseConfig.POOL_TIMEOUT,
+    health_check_interval=DatabaseConfig.POOL_HEALTH_CHECK_INTERVAL,
+    max_idle=DatabaseConfig.POOL_MAX_IDLE,
+)
@@ -1,3 +1,8 @@
 from .auth import auth_bp
+from .games import games_bp
+from .execute import execute_bp
+from .pages import pages_bp
+from .metrics import metrics_bp
+from .ai import ai_bp
 
-__all__ = ['auth_bp']
\ No newline at end of file
+__all__ = ['auth_bp', 'games_bp', 'execute_bp', 'pages_bp', 'metrics_bp', 'ai_bp']
\ No newline at end of file
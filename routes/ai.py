@@ -0,0 +1,109 @@
+from flask import Blueprint, request, jsonify, Response
+
+from utils.ai_gateway import ai_gateway, AIGatewayError
+from utils.ai_evaluator import ai_evaluator
+from utils.helpers import sse_event, parse_bool, login_required
+from utils.rate_limit import ai_rate_limiter
+
+ai_bp = Blueprint('ai', __name__)
+
+MAX_PROMPT_CHARS = 20000
+MAX_CODE_CHARS = 20000
+MAX_CHALLENGE_CHARS = 4000
+
+
+def read_ai_request():
+    """Đọc prompt + tham số từ body JSON; trả về (prompt, kwargs) hoặc ném ValueError"""
+    data = request.get_json(silent=True) or {}
+    prompt = data.get('prompt')
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise ValueError('Thiếu prompt')
+    if len(prompt) > MAX_PROMPT_CHARS:
+        raise ValueError(f'Prompt quá dài (tối đa {MAX_PROMPT_CHARS} ký tự)')
+    try:
+        model, params = ai_gateway.resolve_params(
+            data.get('model'),
+            temperature=data.get('temperature'),
+            max_tokens=data.get('max_tokens'),
+            top_p=data.get('top_p')
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e))
+    return prompt, dict(params, model=model, use_cache=parse_bool(data.get('cache'), True))
+
+# ============ AI GATEWAY (API key chỉ nằm ở server) ============
+@ai_bp.route('/api/ai/models')
+def ai_models():
+    """Các model client được phép chọn"""
+    return jsonify({
+        'success': True,
+        'default': ai_gateway.default_model,
+        'models': list(ai_gateway.models),
+        'configured': bool(ai_gateway.api_key)
+    })
+
+@ai_bp.route('/api/ai/generate', methods=['POST'])
+@login_required
+@ai_rate_limiter.limited
+def ai_generate():
+    """Sinh câu trả lời đầy đủ (qua cache + gộp request trùng)"""
+    try:
+        prompt, kwargs = read_ai_request()
+        text, model, cached = ai_gateway.complete(prompt, **kwargs)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except AIGatewayError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+    return jsonify({'success': True, 'text': text, 'model': model, 'cached': cached})
+
+@ai_bp.route('/api/ai/stream', methods=['POST'])
+@login_required
+@ai_rate_limiter.limited
+def ai_stream():
+    """Stream câu trả lời về client (SSE): các sự kiện delta rồi done hoặc error"""
+    try:
+        prompt, kwargs = read_ai_request()
+        chunks, model, cached = ai_gateway.stream(prompt, **kwargs)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except AIGatewayError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+    def generate():
+        try:
+            for text in chunks:
+                yield sse_event('delta', {'text': text})
+        except AIGatewayError as e:
+            yield sse_event('error', {'success': False, 'error': str(e), 'status': e.status})
+            return
+        yield sse_event('done', {'success': True, 'model': model, 'cached': cached})
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@ai_bp.route('/api/ai/evaluate', methods=['POST'])
+@login_required
+@ai_rate_limiter.limited
+def ai_evaluate():
+    """Chấm code bằng AI qua hàng đợi gom batch theo đề (bài trùng dùng lại kết quả)"""
+    data = request.get_json(silent=True) or {}
+    code = data.get('code')
+    challenge = data.get('challenge')
+    if not isinstance(code, str) or len(code.strip()) < 5:
+        return jsonify({'success': False, 'error': 'Thiếu code để chấm'}), 400
+    if not isinstance(challenge, str) or not challenge.strip():
+        return jsonify({'success': False, 'error': 'Thiếu đề bài'}), 400
+    if len(code) > MAX_CODE_CHARS or len(challenge) > MAX_CHALLENGE_CHARS:
+        return jsonify({'success': False, 'error': 'Code hoặc đề bài quá dài'}), 400
+
+    try:
+        verdict, source = ai_evaluator.evaluate(code, challenge, model=data.get('model'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except AIGatewayError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+    return jsonify({'success': True, 'verdict': verdict, 'source': source})
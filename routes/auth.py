@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from database.models import db, User, Session as UserSession
+from utils.auth_cache import auth_cache
+from utils.passwords import PasswordHasherError
 from datetime import datetime, timedelta
 import uuid
 import re
@@ -67,6 +69,10 @@ def register():
             'user': new_user.to_dict()
         }), 201
         
+    except PasswordHasherError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 503
+        
     except Exception as e:
         db.session.rollback()
         print(f"Register error: {e}")
@@ -110,9 +116,12 @@ def login():
         db.session.add(user_session)
         db.session.commit()
         
-        # Lưu session vào Flask session
+        # Lưu session vào Flask session (với session id mới, chống session fixation)
+        session.regenerate()
         session['user_id'] = user.id
         session['session_token'] = session_token
+        session['user_email'] = user.email
+        session['user_name'] = user.full_name
         
         return jsonify({
             'success': True,
@@ -121,6 +130,10 @@ def login():
             'session_token': session_token
         }), 200
         
+    except PasswordHasherError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 503
+        
     except Exception as e:
         db.session.rollback()
         print(f"Login error: {e}")
@@ -138,9 +151,11 @@ def logout():
             if user_session:
                 db.session.delete(user_session)
                 db.session.commit()
+            auth_cache.invalidate_token(session_token)
         
-        # Xóa Flask session
+        # Xóa Flask session và bỏ luôn session id cũ
         session.clear()
+        session.regenerate()
         
         return jsonify({'success': True, 'message': 'Đăng xuất thành công'}), 200
         
@@ -169,6 +184,67 @@ def get_profile():
         print(f"Get profile error: {e}")
         return jsonify({'success': False, 'message': 'Có lỗi xảy ra'}), 500
 
+@auth_bp.route('/update-profile', methods=['POST'])
+def update_profile():
+    """API cập nhật thông tin user"""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'message': 'Chưa đăng nhập'}), 401
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Không có dữ liệu'}), 400
+        
+        full_name = data.get('full_name', '').strip()
+        current_password = data.get('current_password', '')
+        new_password = data.get('new_password', '')
+        
+        if not full_name:
+            return jsonify({'success': False, 'message': 'Vui lòng nhập họ và tên'}), 400
+        
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'success': False, 'message': 'Không tìm thấy user'}), 404
+        
+        # Đổi mật khẩu khi có nhập mật khẩu hiện tại và mật khẩu mới
+        if current_password and new_password:
+            if not user.check_password(current_password):
+                db.session.rollback()
+                return jsonify({'success': False, 'message': 'Mật khẩu hiện tại không đúng'}), 400
+            
+            if len(new_password) < 8:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': 'Mật khẩu mới phải có ít nhất 8 ký tự'}), 400
+            
+            user.set_password(new_password)
+        
+        user.full_name = full_name
+        db.session.commit()
+        # Thông tin user trong cache xác thực đã cũ
+        auth_cache.invalidate_user(user.id)
+        
+        session['user_name'] = full_name
+        
+        return jsonify({
+            'success': True,
+            'message': 'Cập nhật thông tin thành công!',
+            'user': {
+                'id': user.id,
+                'full_name': user.full_name,
+                'email': user.email
+            }
+        }), 200
+        
+    except PasswordHasherError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 503
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Update profile error: {e}")
+        return jsonify({'success': False, 'message': 'Có lỗi xảy ra, vui lòng thử lại'}), 500
+
 @auth_bp.route('/check-session', methods=['GET'])
 def check_session():
     """Kiểm tra session còn hợp lệ không"""
@@ -179,18 +255,9 @@ def check_session():
         if not user_id or not session_token:
             return jsonify({'success': False, 'authenticated': False}), 200
         
-        # Kiểm tra session trong database
-        user_session = UserSession.query.filter_by(
-            user_id=user_id,
-            session_token=session_token
-        ).first()
-        
-        if not user_session or user_session.is_expired():
-            session.clear()
-            return jsonify({'success': False, 'authenticated': False}), 200
-        
-        user = User.query.get(user_id)
-        if not user or not user.is_active:
+        # Kiểm tra session (qua cache, chỉ chạm database khi cache hết hạn)
+        user, _ = auth_cache.validate(user_id, session_token)
+        if user is None:
             session.clear()
             return jsonify({'success': False, 'authenticated': False}), 200
         
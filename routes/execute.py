@@ -0,0 +1,210 @@
+from flask import Blueprint, request, jsonify, Response
+
+from utils.helpers import sse_event, parse_bool, parse_number
+from utils.sandbox import sandbox_pool, SandboxBusy
+from utils.jobs import job_scheduler, JobQueueFull
+from utils.result_cache import run_cached
+
+execute_bp = Blueprint('execute', __name__)
+
+# ============ API EXECUTE PYTHON ============
+# Thời gian chạy ngắn nhất được nhận; giới hạn trên do sandbox pool kẹp (SANDBOX_MAX_TIMEOUT)
+MIN_TIMEOUT_SECONDS = 0.1
+
+def parse_run_options(data):
+    """Kiểm tra code/stdin/timeout/max_output trong request; trả về (dict tham số, None)
+    hoặc (None, thông báo lỗi cho response 400)"""
+    code = data.get('code', '')
+    stdin = data.get('stdin', '')
+    if not isinstance(code, str) or not isinstance(stdin, str):
+        return None, 'code và stdin phải là chuỗi'
+    try:
+        timeout = parse_number(data.get('timeout'), 5, minimum=MIN_TIMEOUT_SECONDS)
+    except ValueError as e:
+        return None, f'timeout {e}'
+    try:
+        max_output = parse_number(data.get('max_output'), None, minimum=1, integer=True)
+    except ValueError as e:
+        return None, f'max_output {e}'
+    return {'code': code, 'stdin': stdin, 'timeout': timeout, 'max_output': max_output}, None
+
+def format_execution_result(result):
+    """Chuyển ExecutionResult thành (payload JSON, status code)"""
+    if result.timed_out:
+        return {
+            'success': False,
+            'error': 'Code execution timed out'
+        }, 408
+
+    if result.returncode == 0:
+        payload = {
+            'success': True,
+            'output': result.stdout,
+            'error': result.stderr if result.stderr else None
+        }
+    else:
+        payload = {
+            'success': False,
+            'error': result.stderr or 'Execution failed',
+            'output': result.stdout
+        }
+    if result.truncated:
+        payload['truncated'] = True
+    return payload, 200
+
+@execute_bp.route('/api/execute-python', methods=['POST'])
+def execute_python():
+    """Execute Python code safely for code validation"""
+    try:
+        data = request.get_json(silent=True) or {}
+        options, error = parse_run_options(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        if not options['code']:
+            return jsonify({'error': 'No code provided'}), 400
+        
+        # Chạy trên worker Python đã khởi động sẵn thay vì spawn interpreter mới;
+        # code tất định lặp lại được trả thẳng từ result cache
+        result = run_cached(
+            options['code'],
+            timeout=options['timeout'],
+            stdin=options['stdin'],
+            use_cache=parse_bool(data.get('cache'), True)
+        )
+        payload, status = format_execution_result(result)
+        return jsonify(payload), status
+        
+    except SandboxBusy as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+                
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }), 500
+
+@execute_bp.route('/api/execute-python/stream', methods=['POST'])
+def execute_python_stream():
+    """Chạy code và stream stdout/stderr về client (SSE) trong lúc chạy"""
+    try:
+        data = request.get_json(silent=True) or {}
+        options, error = parse_run_options(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        if not options['code']:
+            return jsonify({'error': 'No code provided'}), 400
+        
+        events = sandbox_pool.stream(
+            options['code'],
+            timeout=options['timeout'],
+            stdin=options['stdin'],
+            max_output=options['max_output']
+        )
+        
+    except SandboxBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
+    
+    def generate():
+        try:
+            for name, payload in events:
+                if name != 'exit':
+                    yield sse_event(name, {'text': payload})
+                    continue
+                
+                result = payload
+                if result.truncated:
+                    yield sse_event('truncated', {'max_output': events.max_output})
+                yield sse_event('exit', {
+                    'success': result.ok,
+                    'returncode': result.returncode,
+                    'timed_out': result.timed_out,
+                    'truncated': result.truncated,
+                    'duration': result.duration,
+                    'error': 'Code execution timed out' if result.timed_out else None
+                })
+        finally:
+            events.close()
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# ============ API JOBS (chạy code bất đồng bộ) ============
+MAX_LONG_POLL_SECONDS = 30
+
+def run_execution_job(code, timeout, stdin, use_cache=True):
+    """Hàm chạy trong luồng của job scheduler"""
+    try:
+        result = run_cached(code, timeout=timeout, stdin=stdin, use_cache=use_cache)
+    except SandboxBusy as e:
+        return {'status_code': 503, 'response': {'success': False, 'error': str(e)}}
+    payload, status = format_execution_result(result)
+    return {'status_code': status, 'response': payload}
+
+@execute_bp.route('/api/jobs/execute-python', methods=['POST'])
+def submit_execution_job():
+    """Nhận code và trả về job_id ngay, không giữ request thread"""
+    try:
+        data = request.get_json(silent=True) or {}
+        # Tham số sai bị từ chối ngay khi nhận, không để job lỗi sau đó
+        options, error = parse_run_options(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        code, timeout, stdin = options['code'], options['timeout'], options['stdin']
+        use_cache = parse_bool(data.get('cache'), True)
+        
+        if not code:
+            return jsonify({'success': False, 'error': 'No code provided'}), 400
+        
+        # priority 0 (cao nhất) .. 9 (thấp nhất)
+        try:
+            priority = min(max(int(data.get('priority', 5)), 0), 9)
+        except (TypeError, ValueError):
+            priority = 5
+        
+        job = job_scheduler.submit(
+            lambda: run_execution_job(code, timeout, stdin, use_cache),
+            kind='execute-python',
+            priority=priority
+        )
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status
+        }), 202
+        
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
+
+@execute_bp.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Poll trạng thái/kết quả của job"""
+    job = job_scheduler.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Không tìm thấy job'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@execute_bp.route('/api/jobs/<job_id>/wait')
+def wait_job(job_id):
+    """Long-poll: chờ tối đa `timeout` giây cho tới khi job xong"""
+    job = job_scheduler.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Không tìm thấy job'}), 404
+    
+    try:
+        timeout = float(request.args.get('timeout', 25))
+    except ValueError:
+        timeout = 25
+    job.wait(min(max(timeout, 0), MAX_LONG_POLL_SECONDS))
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
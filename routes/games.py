@@ -1,153 +1,74 @@
-from flask import Blueprint, render_template, request, jsonify, session
-import json
-import random
+from flask import Blueprint, render_template, request, jsonify, session, Response
 import time
 import uuid
 
-games_bp = Blueprint('games', __name__)
-
-# Dữ liệu mẫu cho các game
-QUIZ_QUESTIONS = [
-    {
-        "id": 1,
-        "question": "Từ khóa nào được dùng để định nghĩa function trong Python?",
-        "options": ["function", "def", "func", "define"],
-        "correct": 1,
-        "difficulty": "easy"
-    },
-    {
-        "id": 2,
-        "question": "Cấu trúc dữ liệu nào trong Python có thể thay đổi được (mutable)?",
-        "options": ["tuple", "string", "list", "int"],
-        "correct": 2,
-        "difficulty": "easy"
-    },
-    {
-        "id": 3,
-        "question": "Kết quả của biểu thức '3' + '4' trong Python là gì?",
-        "options": ["7", "'34'", "Error", "'3''4'"],
-        "correct": 1,
-        "difficulty": "medium"
-    },
-    {
-        "id": 4,
-        "question": "Độ phức tạp thời gian của thuật toán bubble sort là gì?",
-        "options": ["O(n)", "O(n log n)", "O(n²)", "O(1)"],
-        "correct": 2,
-        "difficulty": "hard"
-    },
-    {
-        "id": 5,
-        "question": "Method nào được sử dụng để thêm phần tử vào cuối list trong Python?",
-        "options": ["add()", "append()", "insert()", "push()"],
-        "correct": 1,
-        "difficulty": "easy"
-    },
-    {
-        "id": 6,
-        "question": "Từ khóa nào dùng để bắt exception trong Python?",
-        "options": ["catch", "except", "error", "handle"],
-        "correct": 1,
-        "difficulty": "medium"
-    }
-]
-
-SPEED_CODING_CHALLENGES = [
-    {
-        "id": 1,
-        "title": "Hello World",
-        "description": "Viết chương trình in ra 'Hello, World!'",
-        "expected_code": "print('Hello, World!')",
-        "language": "python"
-    },
-    {
-        "id": 2,
-        "title": "Tính tổng hai số",
-        "description": "Viết function tính tổng hai số a và b",
-        "expected_code": "def add(a, b):\n    return a + b",
-        "language": "python"
-    },
-    {
-        "id": 3,
-        "title": "Kiểm tra số chẵn",
-        "description": "Viết function kiểm tra số chẵn",
-        "expected_code": "def is_even(n):\n    return n % 2 == 0",
-        "language": "python"
-    }
-]
-
-DEBUGGING_CHALLENGES = [
-    {
-        "id": 1,
-        "title": "Lỗi syntax",
-        "buggy_code": "def hello()\n    print('Hello')",
-        "correct_code": "def hello():\n    print('Hello')",
-        "error_type": "syntax",
-        "hint": "Thiếu dấu : sau tên function"
-    },
-    {
-        "id": 2,
-        "title": "Lỗi logic",
-        "buggy_code": "def factorial(n):\n    result = 0\n    for i in range(1, n+1):\n        result *= i\n    return result",
-        "correct_code": "def factorial(n):\n    result = 1\n    for i in range(1, n+1):\n        result *= i\n    return result",
-        "error_type": "logic",
-        "hint": "Giá trị khởi tạo của result không đúng"
-    },
-    {
-        "id": 3,
-        "title": "Lỗi indentation",
-        "buggy_code": "if True:\nprint('Hello')",
-        "correct_code": "if True:\n    print('Hello')",
-        "error_type": "indentation",
-        "hint": "Python yêu cầu indentation đúng"
-    }
-]
-
-
-
-# Routes cho các game
-@games_bp.route('/games/code-battle')
-def code_battle():
-    """Trang Code Battle"""
-    return render_template('games/code_battle.html')
+from utils.grading import grading_engine, GradingError
+from utils.normalize import code_normalizer
+from utils.catalog import catalog
+from utils.sampling import quiz_sampler
+from utils.leaderboard import leaderboard, GAMES, WINDOWS as LEADERBOARD_WINDOWS
+from utils.battles import battle_registry, BattleError
+from utils.battle_events import battle_events, BattleEventsFull
+from utils.matchmaking import matchmaker, MatchmakingError
+from utils.battle_judge import battle_judge, pick_challenge
+from utils.sandbox import SandboxBusy, SandboxError
+from utils.helpers import sse_event, login_required
+from utils.rate_limit import ai_rate_limiter
+from utils.page_cache import page_cache
+from utils.hints import hint_store, HINT_KINDS, build_prompt, parse_hint
+from utils.ai_gateway import ai_gateway, AIGatewayError
 
+games_bp = Blueprint('games', __name__)
 
+# Dữ liệu câu hỏi/thử thách nằm trong data/*.json, xem utils/catalog.py
 
-@games_bp.route('/games/speed-coding')
-def speed_coding():
-    """Trang Speed Coding"""
-    return render_template('games/speed_coding.html')
+# Routes cho các game: (đường dẫn, endpoint, template), đi qua page_cache (ETag/304)
+GAME_PAGES = (
+    ('/games/code-battle', 'code_battle', 'games/code_battle.html'),           # Code Battle
+    ('/games/speed-coding', 'speed_coding', 'games/speed_coding.html'),        # Speed Coding
+    ('/games/code-quiz', 'code_quiz', 'games/code_quiz.html'),                 # Code Quiz
+    ('/games/debugging-game', 'debugging_game', 'games/debugging_game.html'),  # Debugging Game
+    ('/games/code-story', 'code_story', 'games/code_story.html'),              # Code Story
+)
 
-@games_bp.route('/games/code-quiz')
-def code_quiz():
-    """Trang Code Quiz"""
-    return render_template('games/code_quiz.html')
+for rule, endpoint, template_name in GAME_PAGES:
+    games_bp.add_url_rule(rule, endpoint, page_cache.view(template_name))
 
-@games_bp.route('/games/debugging-game')
-def debugging_game():
-    """Trang Debugging Game"""
-    return render_template('games/debugging_game.html')
+# Chưa có pages/games/code_art.html nên không đi qua page_cache (warm-up sẽ lỗi)
+@games_bp.route('/games/code-art')
+def code_art():
+    """Trang Code Art"""
+    return render_template('games/code_art.html')
 
-@games_bp.route('/games/code-story')
-def code_story():
-    """Trang Code Story"""
-    return render_template('games/code_story.html')
+def record_game_score(game, score):
+    """Lưu kết quả game của user đang đăng nhập vào leaderboard (False nếu không lưu được)"""
+    user_id = session.get('user_id')
+    if user_id:
+        return leaderboard.record(user_id, game, score, name=session.get('user_name'))
+    return False
 
 # API endpoints cho Code Quiz
 @games_bp.route('/api/games/quiz/questions')
 def get_quiz_questions():
     """API lấy câu hỏi quiz"""
     difficulty = request.args.get('difficulty', 'all')
-    count = int(request.args.get('count', 5))
-    
-    questions = QUIZ_QUESTIONS.copy()
-    
-    if difficulty != 'all':
-        questions = [q for q in questions if q['difficulty'] == difficulty]
-    
-    # Trộn và lấy số lượng câu hỏi yêu cầu
-    random.shuffle(questions)
-    selected_questions = questions[:count]
+    try:
+        count = int(request.args.get('count', 5))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Số lượng câu hỏi không hợp lệ'}), 400
+    
+    # no_repeat=1: không ra lại câu user đã làm; seed: cố định bộ câu hỏi
+    user_key = session.get('user_id') if request.args.get('no_repeat') == '1' else None
+    
+    # Lấy mẫu O(count) từ bucket theo độ khó (tối đa MAX_QUIZ_COUNT câu),
+    # không copy và trộn toàn bộ ngân hàng câu hỏi
+    selected_questions = quiz_sampler.sample(
+        catalog.snapshot.quiz_bucket(difficulty),
+        count,
+        seed=request.args.get('seed'),
+        user_key=user_key,
+        difficulty=difficulty
+    )
     
     return jsonify({
         'success': True,
@@ -163,29 +84,19 @@ def submit_quiz():
     
     correct_count = 0
     total_questions = len(answers)
+    questions_by_id = catalog.snapshot.quiz_by_id
     
     for answer in answers:
         question_id = answer['question_id']
         selected_option = answer['selected_option']
         
         # Tìm câu hỏi tương ứng
-        question = next((q for q in QUIZ_QUESTIONS if q['id'] == question_id), None)
+        question = questions_by_id.get(question_id)
         if question and question['correct'] == selected_option:
             correct_count += 1
     
     score = round((correct_count / total_questions) * 100, 2) if total_questions > 0 else 0
-    
-    # Lưu kết quả vào session hoặc database
-    if 'quiz_scores' not in session:
-        session['quiz_scores'] = []
-    
-    session['quiz_scores'].append({
-        'score': score,
-        'correct': correct_count,
-        'total': total_questions,
-        'time': time_taken,
-        'date': time.time()
-    })
+    record_game_score('quiz', score)
     
     return jsonify({
         'success': True,
@@ -201,7 +112,7 @@ def get_speed_challenges():
     """API lấy thử thách speed coding"""
     return jsonify({
         'success': True,
-        'challenges': SPEED_CODING_CHALLENGES
+        'challenges': catalog.snapshot.speed_challenges
     })
 
 @games_bp.route('/api/games/speed-coding/submit', methods=['POST'])
@@ -213,13 +124,31 @@ def submit_speed_coding():
     time_taken = data.get('time_taken', 0)
     
     # Tìm thử thách
-    challenge = next((c for c in SPEED_CODING_CHALLENGES if c['id'] == challenge_id), None)
+    snapshot = catalog.snapshot
+    challenge = snapshot.speed_by_id.get(challenge_id)
     if not challenge:
         return jsonify({'success': False, 'message': 'Không tìm thấy thử thách'})
     
     # Kiểm tra code (đơn giản hóa)
     expected = challenge['expected_code'].strip()
-    is_correct = user_code == expected
+    # Tầng 1: khớp nguyên văn hoặc khớp dạng AST chuẩn hóa (không cần chạy code)
+    is_correct = user_code == expected or code_normalizer.equivalent(
+        user_code, snapshot.speed_canonical.get(challenge['id']))
+    
+    # Tầng 2: không khớp thì chạy bài nộp với bộ test case của thử thách
+    test_results = None
+    if not is_correct and challenge.get('test_cases'):
+        try:
+            report = grading_engine.grade(user_code, expected, challenge['test_cases'])
+        except SandboxBusy as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        except GradingError as e:
+            print(f"Grading error: {e}")
+            return jsonify({'success': False, 'message': 'Không chấm được bài, vui lòng thử lại sau'}), 500
+        except SandboxError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        is_correct = report.passed
+        test_results = report.to_dict()
     
     # Tính điểm dựa trên độ chính xác và thời gian
     if is_correct:
@@ -229,13 +158,15 @@ def submit_speed_coding():
         score = max(base_score - time_penalty, 50)
     else:
         score = 0
+    record_game_score('speed_coding', score)
     
     return jsonify({
         'success': True,
         'correct': is_correct,
         'score': round(score, 2),
         'time': time_taken,
-        'expected_code': expected
+        'expected_code': expected,
+        'test_results': test_results
     })
 
 # API endpoints cho Debugging Game
@@ -244,7 +175,7 @@ def get_debug_challenges():
     """API lấy thử thách debugging"""
     return jsonify({
         'success': True,
-        'challenges': DEBUGGING_CHALLENGES
+        'challenges': catalog.snapshot.debugging_challenges
     })
 
 @games_bp.route('/api/games/debugging/submit', methods=['POST'])
@@ -256,13 +187,30 @@ def submit_debug_solution():
     time_taken = data.get('time_taken', 0)
     
     # Tìm thử thách
-    challenge = next((c for c in DEBUGGING_CHALLENGES if c['id'] == challenge_id), None)
+    snapshot = catalog.snapshot
+    challenge = snapshot.debugging_by_id.get(challenge_id)
     if not challenge:
         return jsonify({'success': False, 'message': 'Không tìm thấy thử thách'})
     
     # Kiểm tra code đã sửa
     correct_code = challenge['correct_code'].strip()
-    is_correct = user_code == correct_code
+    is_correct = user_code == correct_code or code_normalizer.equivalent(
+        user_code, snapshot.debugging_canonical.get(challenge['id']))
+    
+    # Sửa khác với đáp án nhưng vẫn đúng thì chấm bằng test case
+    test_results = None
+    if not is_correct and challenge.get('test_cases'):
+        try:
+            report = grading_engine.grade(user_code, correct_code, challenge['test_cases'])
+        except SandboxBusy as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        except GradingError as e:
+            print(f"Grading error: {e}")
+            return jsonify({'success': False, 'message': 'Không chấm được bài, vui lòng thử lại sau'}), 500
+        except SandboxError as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
+        is_correct = report.passed
+        test_results = report.to_dict()
     
     # Tính điểm
     if is_correct:
@@ -271,6 +219,7 @@ def submit_debug_solution():
         score = max(base_score - time_penalty, 70)
     else:
         score = 0
+    record_game_score('debugging', score)
     
     return jsonify({
         'success': True,
@@ -278,12 +227,94 @@ def submit_debug_solution():
         'score': round(score, 2),
         'time': time_taken,
         'correct_code': correct_code,
-        'hint': challenge.get('hint', '')
+        'hint': challenge.get('hint', ''),
+        'test_results': test_results
     })
 
+# Gợi ý + lời giải thích (sinh sẵn bằng scripts/pregenerate_hints.py)
+@games_bp.route('/api/games/hints/<kind>/<int:item_id>')
+def get_hint(kind, item_id):
+    """API lấy gợi ý cho câu hỏi quiz / thử thách speed coding / debugging"""
+    if kind not in HINT_KINDS:
+        return jsonify({'success': False, 'message': 'Loại gợi ý không hợp lệ'}), 400
+    snapshot = catalog.snapshot
+    item = {'quiz': snapshot.quiz_by_id, 'speed': snapshot.speed_by_id,
+            'debugging': snapshot.debugging_by_id}[kind].get(item_id)
+    if item is None:
+        return jsonify({'success': False, 'message': 'Không tìm thấy câu hỏi/thử thách'}), 404
+    
+    entry = hint_store.get(kind, item)
+    if entry is not None:
+        return jsonify({
+            'success': True,
+            'hint': entry['hint'],
+            'explanation': entry['explanation'],
+            'source': 'pregenerated',
+            'version': entry.get('version')
+        })
+    
+    # Chưa sinh sẵn (hoặc nội dung vừa sửa): gợi ý viết tay trong catalog,
+    # rồi mới tới sinh trực tiếp qua AI gateway
+    if item.get('hint'):
+        return jsonify({'success': True, 'hint': item['hint'], 'explanation': None, 'source': 'catalog'})
+    if not ai_gateway.api_key:
+        return jsonify({'success': False, 'message': 'Chưa có gợi ý cho mục này'}), 404
+    return generate_hint(kind, item)
+
+@login_required
+@ai_rate_limiter.limited
+def generate_hint(kind, item):
+    """Sinh gợi ý trực tiếp qua AI gateway (tốn API key nên cần đăng nhập; câu trả lời được gateway cache)"""
+    try:
+        text, _, _ = ai_gateway.complete(build_prompt(kind, item), temperature=0.3, max_tokens=600)
+        hint = parse_hint(text)
+    except AIGatewayError as e:
+        return jsonify({'success': False, 'message': str(e)}), e.status
+    except ValueError:
+        return jsonify({'success': False, 'message': 'AI trả về gợi ý không đúng định dạng'}), 502
+    return jsonify({'success': True, 'hint': hint['hint'], 'explanation': hint['explanation'], 'source': 'ai'})
+
+# API endpoints cho Code Art
+@games_bp.route('/api/games/code-art/templates')
+def get_art_templates():
+    """API lấy template code art"""
+    return jsonify({
+        'success': True,
+        'templates': catalog.snapshot.art_templates
+    })
 
+@games_bp.route('/api/games/code-art/run', methods=['POST'])
+def run_art_code():
+    """API chạy code art"""
+    data = request.get_json()
+    code = data.get('code', '')
+    
+    try:
+        # Tạo namespace riêng để chạy code (simplified)
+        return jsonify({
+            'success': True,
+            'message': 'Code chạy thành công!'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
 
 # API endpoints cho Code Battle
+# Đếm ngược trước khi trận đấu bắt đầu; thời gian chờ tối đa của long-poll
+BATTLE_COUNTDOWN_SECONDS = 3
+BATTLE_MAX_POLL_SECONDS = 30
+# Server đang đủ kết nối chờ (BattleEventsFull): client long-poll hỏi lại sau chừng này giây
+BATTLE_POLL_RETRY_SECONDS = 5
+
+
+def _poll_busy(error):
+    response = jsonify({'success': False, 'message': str(error), 'retry_after': BATTLE_POLL_RETRY_SECONDS})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(BATTLE_POLL_RETRY_SECONDS)
+    return response
+
 @games_bp.route('/api/games/battle/create', methods=['POST'])
 def create_battle():
     """API tạo battle room"""
@@ -291,50 +322,147 @@ def create_battle():
     if not user_id:
         return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
     
-    battle_id = str(uuid.uuid4())[:8]
-    
-    # Lưu thông tin battle (trong thực tế sẽ lưu database)
-    if 'battles' not in session:
-        session['battles'] = {}
-    
-    session['battles'][battle_id] = {
-        'id': battle_id,
-        'creator': user_id,
-        'players': [user_id],
-        'status': 'waiting',
-        'created_at': time.time()
-    }
+    try:
+        room = battle_registry.create(user_id, challenge_id=pick_challenge())
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)})
     
     return jsonify({
         'success': True,
-        'battle_id': battle_id
+        'battle_id': room.id
     })
 
 @games_bp.route('/api/games/battle/join', methods=['POST'])
 def join_battle():
     """API tham gia battle"""
-    data = request.get_json()
+    data = request.get_json() or {}
     battle_id = data.get('battle_id')
     user_id = session.get('user_id')
     
     if not user_id:
         return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
     
-    battles = session.get('battles', {})
-    battle = battles.get(battle_id)
+    try:
+        battle, joined = battle_registry.join(battle_id, user_id)
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    if joined:
+        battle_events.publish(battle_id, 'player_joined', {'user_id': user_id, 'battle': battle})
+        if battle['status'] == 'ready':
+            battle_events.publish(battle_id, 'countdown', {
+                'seconds': BATTLE_COUNTDOWN_SECONDS,
+                'starts_at': time.time() + BATTLE_COUNTDOWN_SECONDS
+            })
     
+    return jsonify({
+        'success': True,
+        'battle': battle
+    })
+
+@games_bp.route('/api/games/battle/<battle_id>')
+def get_battle(battle_id):
+    """API lấy trạng thái battle room"""
+    try:
+        battle = battle_registry.snapshot(battle_id)
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     if not battle:
-        return jsonify({'success': False, 'message': 'Không tìm thấy battle room'})
+        return jsonify({'success': False, 'message': 'Không tìm thấy battle room'}), 404
     
-    if user_id not in battle['players']:
-        battle['players'].append(user_id)
+    return jsonify({
+        'success': True,
+        'battle': battle,
+        'challenge': catalog.snapshot.speed_by_id.get(battle['challenge_id'])
+    })
+
+@games_bp.route('/api/games/battle/<battle_id>/submit', methods=['POST'])
+def submit_battle(battle_id):
+    """API nộp bài trong battle; bài của mọi người được chấm cùng lúc khi đã nộp đủ"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
     
-    if len(battle['players']) >= 2:
-        battle['status'] = 'ready'
+    data = request.get_json() or {}
+    code = data.get('code', '')
+    if not code.strip():
+        return jsonify({'success': False, 'message': 'Chưa có code'}), 400
+    
+    try:
+        battle = battle_registry.submit(battle_id, user_id, code)
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    battle_events.publish(battle_id, 'submission', {'user_id': user_id, 'submitted': battle['submitted']})
+    judging = battle['status'] == 'judging'
+    if judging:
+        # Kết quả được đẩy qua sự kiện 'result'
+        battle_judge.schedule(battle_id)
     
     return jsonify({
         'success': True,
-        'battle': battle
+        'battle': battle,
+        'judging': judging
+    })
+
+@games_bp.route('/api/games/battle/<battle_id>/events')
+def battle_event_stream(battle_id):
+    """SSE: đẩy sự kiện của battle room (player_joined, countdown, submission, result)"""
+    try:
+        if not battle_registry.snapshot(battle_id):
+            return jsonify({'success': False, 'message': 'Không tìm thấy battle room'}), 404
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    # EventSource tự gửi Last-Event-ID khi kết nối lại
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        after = 0
+    
+    try:
+        events = battle_events.stream(battle_id, after)
+    except BattleEventsFull as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    def generate():
+        try:
+            for event in events:
+                if event is None:
+                    yield ': heartbeat\n\n'
+                else:
+                    yield sse_event(event['event'], event, event_id=event['seq'])
+        finally:
+            events.close()
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@games_bp.route('/api/games/battle/<battle_id>/poll')
+def battle_event_poll(battle_id):
+    """Long-poll: trả về sự kiện mới hơn `after`, chờ tối đa `timeout` giây"""
+    try:
+        if not battle_registry.snapshot(battle_id):
+            return jsonify({'success': False, 'message': 'Không tìm thấy battle room'}), 404
+    except BattleError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    try:
+        after = int(request.args.get('after', 0))
+        timeout = min(max(float(request.args.get('timeout', 25)), 0), BATTLE_MAX_POLL_SECONDS)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Tham số không hợp lệ'}), 400
+    
+    try:
+        events = battle_events.wait(battle_id, after, timeout)
+    except BattleEventsFull as e:
+        return _poll_busy(e)
+    return jsonify({
+        'success': True,
+        'events': events,
+        'last_seq': events[-1]['seq'] if events else after
     })
 
 # API endpoints cho Code Story
@@ -379,20 +507,99 @@ def list_stories():
         'stories': stories
     })
 
+@games_bp.route('/api/games/matchmaking/join', methods=['POST'])
+def join_matchmaking():
+    """API vào hàng đợi ghép trận Code Battle"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
+    
+    try:
+        ticket = matchmaker.enqueue(user_id)
+    except MatchmakingError as e:
+        print(f"Matchmaking error: {e}")
+        return jsonify({'success': False, 'message': 'Hàng đợi ghép trận tạm thời không dùng được'}), 503
+    
+    return jsonify({
+        'success': True,
+        'ticket': ticket
+    })
+
+@games_bp.route('/api/games/matchmaking/status')
+def matchmaking_status():
+    """API trạng thái ghép trận; long-poll tối đa `timeout` giây"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
+    
+    try:
+        timeout = min(max(float(request.args.get('timeout', 0)), 0), BATTLE_MAX_POLL_SECONDS)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'timeout không hợp lệ'}), 400
+    
+    try:
+        if timeout > 0:
+            # Long-poll giữ một luồng của server: tính chung giới hạn với SSE/long-poll battle
+            with battle_events.slot():
+                ticket = matchmaker.status(user_id, timeout)
+        else:
+            ticket = matchmaker.status(user_id, timeout)
+    except BattleEventsFull as e:
+        return _poll_busy(e)
+    except MatchmakingError as e:
+        print(f"Matchmaking error: {e}")
+        return jsonify({'success': False, 'message': 'Hàng đợi ghép trận tạm thời không dùng được'}), 503
+    if ticket is None:
+        return jsonify({'success': False, 'message': 'Bạn chưa vào hàng đợi'}), 404
+    
+    return jsonify({
+        'success': True,
+        'ticket': ticket
+    })
+
+@games_bp.route('/api/games/matchmaking/leave', methods=['POST'])
+def leave_matchmaking():
+    """API rời hàng đợi ghép trận"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Chưa đăng nhập'})
+    
+    try:
+        left = matchmaker.leave(user_id)
+    except MatchmakingError as e:
+        print(f"Matchmaking error: {e}")
+        return jsonify({'success': False, 'message': 'Hàng đợi ghép trận tạm thời không dùng được'}), 503
+    
+    return jsonify({
+        'success': left
+    })
+
 # API lấy leaderboard
 @games_bp.route('/api/games/leaderboard')
 def get_leaderboard():
     """API lấy bảng xếp hạng"""
-    # Dữ liệu mẫu
-    leaderboard = [
-        {'name': 'Nguyễn Văn A', 'score': 950, 'games_played': 25},
-        {'name': 'Trần Thị B', 'score': 890, 'games_played': 20},
-        {'name': 'Lê Văn C', 'score': 845, 'games_played': 18},
-        {'name': 'Phạm Thị D', 'score': 820, 'games_played': 22},
-        {'name': 'Hoàng Văn E', 'score': 780, 'games_played': 15}
-    ]
-    
-    return jsonify({
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        limit = 10
+    
+    window = request.args.get('window', 'all')
+    game = request.args.get('game') or None
+    if window != 'all' and window not in LEADERBOARD_WINDOWS:
+        return jsonify({'success': False, 'message': 'window không hợp lệ'}), 400
+    if game is not None and game not in GAMES:
+        return jsonify({'success': False, 'message': 'game không hợp lệ'}), 400
+    
+    # Đọc từ bảng xếp hạng trong bộ nhớ, không quét bảng game_scores
+    response = {
         'success': True,
-        'leaderboard': leaderboard
-    })
\ No newline at end of file
+        'window': window,
+        'game': game,
+        'leaderboard': leaderboard.top(limit, window=window, game=game)
+    }
+    
+    user_id = session.get('user_id')
+    if user_id:
+        response['me'] = leaderboard.rank_of(user_id, window=window, game=game)
+    
+    return jsonify(response)
\ No newline at end of file
@@ -0,0 +1,78 @@
+import hmac
+import os
+
+from flask import Blueprint, current_app, jsonify, request
+
+from database.pool import db_pool
+from utils.sandbox import sandbox_pool
+from utils.jobs import job_scheduler
+from utils.result_cache import result_cache
+from utils.grading import grading_engine
+from utils.normalize import code_normalizer
+from utils.catalog import catalog
+from utils.leaderboard import leaderboard
+from utils.battles import battle_registry
+from utils.battle_events import battle_events
+from utils.matchmaking import matchmaker
+from utils.battle_judge import battle_judge
+from utils.session_store import session_store
+from utils.auth_cache import auth_cache
+from utils.passwords import password_hasher
+from utils.static_assets import static_assets
+from utils.page_cache import page_cache
+from utils.ai_gateway import ai_gateway
+from utils.ai_evaluator import ai_evaluator
+from utils.rate_limit import ai_rate_limiter
+from utils.hints import hint_store
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+@metrics_bp.record_once
+def _init_config(state):
+    # METRICS_TOKEN: nếu đặt, /api/metrics yêu cầu header "Authorization: Bearer <token>";
+    # nếu để trống, chỉ request gửi thẳng từ localhost (không qua reverse proxy) được xem
+    state.app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN', ''))
+
+
+def _allowed():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        return hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+    # Request đi qua reverse proxy cùng máy cũng có remote_addr là localhost,
+    # nhưng proxy luôn thêm X-Forwarded-For
+    return request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers
+
+
+@metrics_bp.route('/api/metrics')
+def metrics():
+    """Các bộ đếm nội bộ của server (chỉ localhost hoặc có METRICS_TOKEN)"""
+    if not _allowed():
+        return jsonify({'success': False, 'error': 'Không có quyền truy cập'}), 403
+    return jsonify({
+        'success': True,
+        'db_pool': db_pool.stats(),
+        'sandbox': sandbox_pool.stats(),
+        'jobs': job_scheduler.stats(),
+        'result_cache': result_cache.stats(),
+        'grading': grading_engine.stats(),
+        'normalizer': code_normalizer.stats(),
+        'catalog': catalog.stats(),
+        'leaderboard': leaderboard.stats(),
+        'battles': battle_registry.stats(),
+        'battle_events': battle_events.stats(),
+        'matchmaking': matchmaker.stats(),
+        'battle_judge': battle_judge.stats(),
+        'sessions': session_store.stats(),
+        'auth_cache': auth_cache.stats(),
+        'passwords': password_hasher.stats(),
+        'static_assets': static_assets.stats(),
+        'page_cache': page_cache.stats(),
+        'ai_gateway': ai_gateway.stats(),
+        'ai_evaluator': ai_evaluator.stats(),
+        'ai_rate_limit': ai_rate_limiter.stats(),
+        'hints': hint_store.stats()
+    })
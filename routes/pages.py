@@ -0,0 +1,61 @@
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for
+
+from utils.static_assets import static_assets
+from utils.page_cache import page_cache
+
+pages_bp = Blueprint('pages', __name__)
+
+# Các trang tĩnh
+@pages_bp.route('/')
+def index():
+    return redirect(url_for('pages.home'))
+
+@pages_bp.route('/auth')
+def auth():
+    return render_template('auth.html')
+
+@pages_bp.route('/dashboard')
+def dashboard():
+    return render_template('dashboard.html')
+
+@pages_bp.route('/profile')
+def profile():
+    return render_template('profile.html')
+
+# Trang không phụ thuộc user: (đường dẫn, endpoint, template), đi qua page_cache (ETag/304)
+CACHED_PAGES = (
+    ('/home', 'home', 'home.html'),                  # Trang chủ
+    ('/about', 'about', 'about.html'),               # Giới thiệu
+    ('/features', 'features', 'features.html'),      # Tính năng
+    ('/contact', 'contact', 'contact.html'),         # Liên hệ
+    ('/careers', 'careers', 'careers.html'),         # Tuyển dụng
+    ('/clients', 'clients', 'clients.html'),         # Khách hàng
+    ('/legal', 'legal', 'legal.html'),               # Điều khoản
+)
+
+for rule, endpoint, template_name in CACHED_PAGES:
+    pages_bp.add_url_rule(rule, endpoint, page_cache.view(template_name))
+
+# Static files (xem utils/static_assets.py)
+@pages_bp.route('/assets/<path:filename>')
+def assets(filename):
+    return static_assets.send(filename)
+
+# Test route
+@pages_bp.route('/test')
+def test():
+    return jsonify({'status': 'OK', 'message': 'Server is running!'})
+
+# Error handlers
+@pages_bp.app_errorhandler(404)
+def not_found(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'message': 'API endpoint not found'}), 404
+    return render_template('home.html'), 404
+
+@pages_bp.app_errorhandler(500)
+def internal_error(error):
+    print(f"Internal server error: {error}")
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+    return "Internal Server Error", 500
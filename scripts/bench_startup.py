@@ -0,0 +1,112 @@
+"""Đo thời gian khởi động lạnh của ứng dụng và báo lỗi nếu vượt ngân sách.
+
+Mỗi lần đo chạy một process Python mới (như một worker vừa được autoscale):
+- import: thời gian import app cùng toàn bộ blueprint/extension
+- create_app: thời gian dựng Flask app (không kết nối database)
+- cold_start: tổng thời gian từ lúc tạo process tới khi app sẵn sàng,
+  gồm cả khởi động interpreter
+
+Dùng:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --runs 10 --import-budget 600 --startup-budget 1200
+
+Thoát với mã 1 nếu trung vị vượt ngân sách, kèm danh sách module import chậm nhất.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ngân sách mặc định (mili giây), ghi đè bằng tham số hoặc biến môi trường
+DEFAULT_IMPORT_BUDGET = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 800))
+DEFAULT_STARTUP_BUDGET = float(os.environ.get('STARTUP_COLD_START_BUDGET_MS', 1500))
+
+CHILD_CODE = '''
+import json, time
+started = time.perf_counter()
+import app, routes
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported}))
+'''
+
+
+def run_once():
+    """Một lần khởi động lạnh; trả về dict thời gian (mili giây)"""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', CHILD_CODE], cwd=ROOT,
+                          capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f'Khởi động app thất bại:\n{proc.stderr}')
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'import': timings['import'] * 1000,
+        'create_app': timings['create_app'] * 1000,
+        'cold_start': elapsed * 1000
+    }
+
+
+def slowest_imports(limit=15):
+    """Các module có thời gian import (cộng dồn) lớn nhất, đo bằng -X importtime"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app, routes'],
+                          cwd=ROOT, capture_output=True, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Chỉ lấy hai tầng đầu của cây import (app/routes và các module chúng import)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > 1:
+            continue
+        modules.append((int(cumulative_us) / 1000, name.strip()))
+    modules.sort(reverse=True)
+    return modules[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo thời gian khởi động lạnh của CodeQuest AI')
+    parser.add_argument('--runs', type=int, default=5, help='số lần đo (mỗi lần một process mới)')
+    parser.add_argument('--import-budget', type=float, default=DEFAULT_IMPORT_BUDGET,
+                        help='ngân sách thời gian import (ms)')
+    parser.add_argument('--startup-budget', type=float, default=DEFAULT_STARTUP_BUDGET,
+                        help='ngân sách thời gian khởi động lạnh (ms)')
+    args = parser.parse_args()
+
+    # Lần đầu làm nóng cache .pyc, không tính
+    run_once()
+    results = [run_once() for _ in range(max(args.runs, 1))]
+
+    medians = {key: statistics.median(r[key] for r in results) for key in results[0]}
+    for key in ('import', 'create_app', 'cold_start'):
+        values = [r[key] for r in results]
+        print(f"{key:<11} median {medians[key]:8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+    failures = []
+    if medians['import'] > args.import_budget:
+        failures.append(f"import {medians['import']:.1f} ms > ngân sách {args.import_budget:.0f} ms")
+    if medians['cold_start'] > args.startup_budget:
+        failures.append(f"cold start {medians['cold_start']:.1f} ms > ngân sách {args.startup_budget:.0f} ms")
+
+    if failures:
+        print('\n❌ Vượt ngân sách khởi động:')
+        for failure in failures:
+            print(f"   - {failure}")
+        print('\nModule import chậm nhất (cộng dồn):')
+        for cumulative_ms, name in slowest_imports():
+            print(f"   {cumulative_ms:8.1f} ms  {name}")
+        return 1
+
+    print(f"\n✅ Trong ngân sách (import ≤ {args.import_budget:.0f} ms, cold start ≤ {args.startup_budget:.0f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
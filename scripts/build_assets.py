@@ -0,0 +1,196 @@
+"""Build static asset: gắn hash nội dung vào tên file, nén sẵn và viết lại tham chiếu.
+
+Kết quả nằm trong build/ (đã có trong .gitignore):
+- build/assets/<thư mục>/<tên>.<hash>.<đuôi>, kèm bản .gz và .br (nếu cài
+  module brotli: pip install brotli) cho file văn bản
+- build/assets/manifest.json: tên gốc -> tên có hash, kích thước từng bản nén
+- build/pages/: bản sao pages/ với đường dẫn asset đã đổi sang tên có hash
+
+utils/static_assets.py đọc manifest để phục vụ file có hash với
+Cache-Control: immutable và chọn bản nén theo Accept-Encoding.
+
+Dùng:
+    python scripts/build_assets.py
+    python scripts/build_assets.py --out /tmp/build
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(ROOT, 'assets')
+PAGES_DIR = os.path.join(ROOT, 'pages')
+
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+# Chỉ nén file văn bản đủ lớn; ảnh đã được nén sẵn
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+MIN_COMPRESS_SIZE = 256
+
+# Tham chiếu asset trong HTML: "../assets/x", "../../assets/x", "/assets/x"
+HTML_ASSET_REF = re.compile(r'''(?P<prefix>["'(](?:\.\./|\./|/)*assets/)(?P<path>[^"'()?#\s]+)''')
+CSS_URL = re.compile(r'''url\(\s*(?P<quote>['"]?)(?P<url>[^'")]+)(?P=quote)\s*\)''')
+
+
+class AssetBuilder:
+    """Build toàn bộ thư mục assets/ vào `out_dir`"""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.assets_out = os.path.join(out_dir, 'assets')
+        self.pages_out = os.path.join(out_dir, 'pages')
+        self.sources = {}
+        self.manifest = {}
+
+    def run(self):
+        for directory in (self.assets_out, self.pages_out):
+            shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(self.assets_out)
+
+        for dirpath, dirnames, filenames in os.walk(ASSETS_DIR):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for filename in sorted(filenames):
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                logical = os.path.relpath(path, ASSETS_DIR).replace(os.sep, '/')
+                self.sources[logical] = path
+
+        for logical in self.sources:
+            self.build(logical)
+
+        with open(os.path.join(self.assets_out, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'assets': self.manifest}, f, indent=2, sort_keys=True)
+
+        pages = self.rewrite_pages()
+        return pages
+
+    def build(self, logical, _visiting=()):
+        """Build một file (CSS được build sau các file nó tham chiếu); trả về tên có hash"""
+        if logical in self.manifest:
+            return self.manifest[logical]['file']
+        if logical in _visiting:
+            # Vòng tham chiếu giữa các file CSS: giữ nguyên tham chiếu
+            return None
+
+        with open(self.sources[logical], 'rb') as f:
+            content = f.read()
+        name, ext = posixpath.splitext(logical)
+        if ext == '.css':
+            content = self.rewrite_css(logical, content.decode('utf-8'), _visiting + (logical,)).encode('utf-8')
+
+        digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        hashed = f'{name}.{digest}{ext}'
+        target = os.path.join(self.assets_out, *hashed.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+
+        encodings = {}
+        if ext in COMPRESSIBLE and len(content) >= MIN_COMPRESS_SIZE:
+            variants = [('gzip', '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('br', '.br', brotli.compress(content, quality=11)))
+            for encoding, suffix, data in variants:
+                # Bản nén không nhỏ hơn đáng kể thì không đáng giải nén ở client
+                if len(data) < len(content) * 0.9:
+                    with open(target + suffix, 'wb') as f:
+                        f.write(data)
+                    encodings[encoding] = len(data)
+
+        self.manifest[logical] = {
+            'file': hashed,
+            'hash': digest,
+            'size': len(content),
+            'encodings': encodings
+        }
+        return hashed
+
+    def rewrite_css(self, logical, css, visiting):
+        base = posixpath.dirname(logical)
+
+        def replace(match):
+            url = match.group('url').strip()
+            if re.match(r'^(?:[a-z]+:|//|#)', url, re.IGNORECASE):
+                return match.group(0)
+            path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+            if path.startswith('/assets/'):
+                target = path[len('/assets/'):]
+            else:
+                target = posixpath.normpath(posixpath.join(base, path))
+            if target not in self.sources:
+                return match.group(0)
+            hashed = self.build(target, visiting)
+            if hashed is None:
+                return match.group(0)
+            if path.startswith('/assets/'):
+                new_url = '/assets/' + hashed
+            else:
+                new_url = posixpath.relpath(hashed, base or '.')
+                if path.startswith('./') and not new_url.startswith('.'):
+                    new_url = './' + new_url
+            quote = match.group('quote')
+            return f'url({quote}{new_url}{suffix}{quote})'
+
+        return CSS_URL.sub(replace, css)
+
+    def rewrite_pages(self):
+        """Chép pages/ sang build/pages, đổi đường dẫn asset sang tên có hash"""
+        rewritten = 0
+        for dirpath, dirnames, filenames in os.walk(PAGES_DIR):
+            for filename in filenames:
+                source = os.path.join(dirpath, filename)
+                target = os.path.join(self.pages_out, os.path.relpath(source, PAGES_DIR))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if not filename.endswith('.html'):
+                    shutil.copy2(source, target)
+                    continue
+
+                with open(source, 'r', encoding='utf-8') as f:
+                    html = f.read()
+
+                def replace(match):
+                    entry = self.manifest.get(match.group('path'))
+                    return match.group('prefix') + entry['file'] if entry else match.group(0)
+
+                new_html = HTML_ASSET_REF.sub(replace, html)
+                rewritten += new_html != html
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(new_html)
+        return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build static asset cho CodeQuest AI')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'build'), help='thư mục kết quả (mặc định build/)')
+    args = parser.parse_args()
+
+    builder = AssetBuilder(os.path.abspath(args.out))
+    pages = builder.run()
+
+    total = sum(entry['size'] for entry in builder.manifest.values())
+    for encoding in ('gzip', 'br'):
+        compressed = [entry for entry in builder.manifest.values() if encoding in entry['encodings']]
+        if compressed:
+            before = sum(entry['size'] for entry in compressed)
+            after = sum(entry['encodings'][encoding] for entry in compressed)
+            print(f"{encoding:<5} {len(compressed):3d} file  {before / 1024:8.1f} KB -> {after / 1024:8.1f} KB")
+    print(f"✅ {len(builder.manifest)} asset ({total / 1024:.1f} KB), {pages} trang đã viết lại -> {args.out}")
+    if brotli is None:
+        print("ℹ️  Chưa cài module brotli: chỉ tạo bản .gz (pip install brotli)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Sinh sẵn gợi ý + lời giải thích bằng AI cho toàn bộ catalog (data/*.json).
+
+Duyệt mọi câu hỏi quiz, thử thách speed coding và debugging, gọi AI qua
+utils/ai_gateway.py với tối đa `--concurrency` request đồng thời, rồi ghi
+vào data/hints.json. Mỗi mục lưu hash nội dung lúc sinh nên:
+- chạy lại chỉ sinh các mục còn thiếu, lỗi lần trước, hoặc đã sửa nội dung
+- file được ghi lại (nguyên tử) sau mỗi mục thành công, dừng giữa chừng
+  (Ctrl+C, lỗi mạng) thì lần chạy sau tiếp tục từ chỗ đó
+Lúc chạy server, /api/games/hints/<loại>/<id> chỉ đọc file này.
+
+Dùng:
+    OPENROUTER_API_KEY=... python scripts/pregenerate_hints.py
+    python scripts/pregenerate_hints.py --upstream http://127.0.0.1:8765/v1 --api-key stub
+    python scripts/pregenerate_hints.py --kind quiz --force --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.ai_gateway import AIGateway, AIGatewayError  # noqa: E402
+from utils.catalog import Catalog, DATA_DIR  # noqa: E402
+from utils.hints import (  # noqa: E402
+    HINT_KINDS, HINTS_FILE, PROMPT_VERSION, build_prompt, content_hash, hint_key, parse_hint
+)
+
+
+class HintFile:
+    """data/hints.json: đọc một lần, ghi lại nguyên tử sau mỗi mục mới"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'version': 0, 'prompt_version': PROMPT_VERSION, 'items': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data = json.load(f)
+        self.bumped = False
+
+    def is_fresh(self, kind, item):
+        entry = self.data['items'].get(hint_key(kind, item['id']))
+        return entry is not None and entry.get('content_hash') == content_hash(kind, item)
+
+    def put(self, kind, item, hint, model):
+        with self.lock:
+            if not self.bumped:
+                # Mỗi lần chạy có thay đổi là một phiên bản mới của file
+                self.data['version'] += 1
+                self.bumped = True
+            self.data['prompt_version'] = PROMPT_VERSION
+            self.data['items'][hint_key(kind, item['id'])] = dict(
+                hint,
+                content_hash=content_hash(kind, item),
+                model=model,
+                version=self.data['version'],
+                generated_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            )
+            self.save()
+
+    def prune(self, valid_keys):
+        """Bỏ gợi ý của các mục đã bị xóa khỏi catalog; trả về số mục đã bỏ"""
+        with self.lock:
+            removed = [key for key in self.data['items'] if key not in valid_keys]
+            for key in removed:
+                del self.data['items'][key]
+            if removed:
+                self.save()
+            return len(removed)
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_path, self.path)
+
+
+def generate_one(gateway, kind, item, model, retries):
+    """Sinh gợi ý cho một mục, thử lại khi AI lỗi hoặc trả sai định dạng"""
+    prompt = build_prompt(kind, item)
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt, 30))
+        try:
+            text, _, _ = gateway.complete(prompt, model=model, use_cache=False, temperature=0.3, max_tokens=600)
+            return parse_hint(text)
+        except (AIGatewayError, ValueError) as e:
+            error = e
+    raise error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sinh sẵn gợi ý AI cho catalog CodeQuest')
+    parser.add_argument('--data-dir', default=os.environ.get('CATALOG_DIR', DATA_DIR))
+    parser.add_argument('--out', help=f'file kết quả (mặc định <data-dir>/{HINTS_FILE})')
+    parser.add_argument('--kind', choices=sorted(HINT_KINDS), action='append', help='chỉ sinh cho loại này (lặp lại được)')
+    parser.add_argument('--model', default=os.environ.get('AI_DEFAULT_MODEL', 'openai/gpt-4o-mini'))
+    parser.add_argument('--upstream', default=os.environ.get('AI_UPSTREAM_URL', 'https://openrouter.ai/api/v1'))
+    parser.add_argument('--api-key', default=os.environ.get('AI_API_KEY', os.environ.get('OPENROUTER_API_KEY', '')))
+    parser.add_argument('--concurrency', type=int, default=4, help='số request AI đồng thời')
+    parser.add_argument('--retries', type=int, default=2, help='số lần thử lại mỗi mục')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--force', action='store_true', help='sinh lại cả các mục đã có')
+    parser.add_argument('--dry-run', action='store_true', help='chỉ liệt kê các mục sẽ sinh')
+    args = parser.parse_args()
+
+    snapshot = Catalog(args.data_dir, check_interval=-1).reload()
+    kinds = args.kind or sorted(HINT_KINDS)
+    hint_file = HintFile(args.out or os.path.join(args.data_dir, HINTS_FILE))
+
+    all_items = [(kind, item) for kind in sorted(HINT_KINDS) for item in getattr(snapshot, HINT_KINDS[kind][0])]
+    pruned = hint_file.prune({hint_key(kind, item['id']) for kind, item in all_items})
+    pending = [
+        (kind, item) for kind, item in all_items
+        if kind in kinds and (args.force or not hint_file.is_fresh(kind, item))
+    ]
+    print(f"📚 {len(all_items)} mục, {len(pending)} cần sinh gợi ý" + (f", bỏ {pruned} mục đã xóa" if pruned else ''))
+    if args.dry_run or not pending:
+        for kind, item in pending:
+            print(f"   {hint_key(kind, item['id'])}")
+        return 0
+    if not args.api_key:
+        print("❌ Thiếu API key (--api-key hoặc OPENROUTER_API_KEY)")
+        return 2
+
+    gateway = AIGateway(
+        upstream_url=args.upstream.rstrip('/'),
+        api_key=args.api_key,
+        default_model=args.model,
+        models=(args.model,),
+        model_concurrency=args.concurrency,
+        queue_timeout=args.timeout,
+        timeout=args.timeout
+    )
+    started = time.monotonic()
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {
+            executor.submit(generate_one, gateway, kind, item, args.model, args.retries): (kind, item)
+            for kind, item in pending
+        }
+        try:
+            for future in as_completed(futures):
+                kind, item = futures[future]
+                key = hint_key(kind, item['id'])
+                try:
+                    hint_file.put(kind, item, future.result(), args.model)
+                    print(f"✅ {key}")
+                except Exception as e:
+                    failed.append(key)
+                    print(f"❌ {key}: {e}")
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("⏹️  Đã dừng; chạy lại để tiếp tục các mục còn thiếu")
+            return 130
+
+    done = len(pending) - len(failed)
+    print(f"📦 {done}/{len(pending)} mục trong {time.monotonic() - started:.1f}s -> {hint_file.path} "
+          f"(phiên bản {hint_file.data['version']})")
+    if failed:
+        print(f"⚠️  {len(failed)} mục lỗi, chạy lại để thử tiếp: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
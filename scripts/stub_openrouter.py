@@ -0,0 +1,152 @@
+"""Upstream giả lập OpenRouter để chạy thử /api/ai/* mà không cần API key thật.
+
+Trả lời POST /v1/chat/completions (stream và không stream) bằng một câu
+cố định có nhắc lại prompt, chia thành nhiều đoạn cách nhau `--delay` giây,
+và GET /v1/models. GET /stats cho biết đã nhận bao nhiêu request và số
+request đồng thời lớn nhất theo model, để kiểm tra cache/gộp request/giới
+hạn đồng thời của utils/ai_gateway.py.
+
+Dùng:
+    python scripts/stub_openrouter.py --port 8765 --delay 0.2
+    AI_UPSTREAM_URL=http://127.0.0.1:8765/v1 AI_API_KEY=stub python app.py
+
+Prompt chứa "[status=429]" (hoặc mã khác) nhận lỗi HTTP đó. Prompt chấm
+bài của utils/ai_evaluator.py nhận kết quả JSON (một object, hoặc một
+array khi chấm cả batch); prompt của scripts/pregenerate_hints.py nhận
+{hint, explanation}.
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUS_MARKER = re.compile(r'\[status=(\d{3})\]')
+SUBMISSION_MARKER = re.compile(r'^<<<BÀI NỘP #(\d+) [0-9a-f]+>>>$', re.MULTILINE)
+
+
+def stub_reply(model, prompt):
+    """Câu trả lời giả: kết quả chấm dạng JSON cho prompt chấm bài, còn lại nhắc lại prompt"""
+    verdict = {'score': 80, 'evaluation': ['✅ Stub: code chạy đúng'], 'comment': 'Stub', 'correct': True}
+    submissions = SUBMISSION_MARKER.findall(prompt)
+    if submissions:
+        return json.dumps([dict(verdict, id=int(index)) for index in submissions], ensure_ascii=False)
+    if 'CODE CỦA HỌC SINH' in prompt:
+        return json.dumps(verdict, ensure_ascii=False)
+    if '"explanation"' in prompt:
+        return json.dumps({'hint': 'Stub: gợi ý', 'explanation': 'Stub: giải thích'}, ensure_ascii=False)
+    return f'[stub {model}] Trả lời cho: {prompt[:60]}'
+
+
+class StubState:
+    def __init__(self, delay, chunks):
+        self.delay = delay
+        self.chunks = chunks
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = {}
+        self.max_active = {}
+
+    def enter(self, model):
+        with self.lock:
+            self.requests += 1
+            self.active[model] = self.active.get(model, 0) + 1
+            self.max_active[model] = max(self.max_active.get(model, 0), self.active[model])
+
+    def leave(self, model):
+        with self.lock:
+            self.active[model] -= 1
+
+    def snapshot(self):
+        with self.lock:
+            return {'requests': self.requests, 'active': dict(self.active), 'max_active': dict(self.max_active)}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/v1/models':
+                self.send_json(200, {'data': [{'id': 'openai/gpt-4o-mini'}, {'id': 'openai/gpt-4o'}]})
+            elif self.path == '/stats':
+                self.send_json(200, state.snapshot())
+            else:
+                self.send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self.send_json(404, {'error': {'message': 'not found'}})
+                return
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                self.send_json(401, {'error': {'message': 'missing key'}})
+                return
+
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            model = body.get('model', '')
+            prompt = ''.join(m.get('content', '') for m in body.get('messages', []))
+            marker = STATUS_MARKER.search(prompt)
+            if marker:
+                self.send_json(int(marker.group(1)), {'error': {'message': 'stub error'}})
+                return
+
+            words = stub_reply(model, prompt).split(' ')
+            size = max(1, -(-len(words) // state.chunks))
+            parts = [' '.join(words[i:i + size]) + ' ' for i in range(0, len(words), size)]
+
+            state.enter(model)
+            try:
+                if body.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    self.wfile.write(b': STUB PROCESSING\n\n')
+                    for part in parts:
+                        time.sleep(state.delay)
+                        event = {'choices': [{'delta': {'content': part}}]}
+                        self.wfile.write(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                        self.wfile.flush()
+                    self.wfile.write(b'data: [DONE]\n\n')
+                    self.close_connection = True
+                else:
+                    time.sleep(state.delay * len(parts))
+                    self.send_json(200, {'choices': [{'message': {'role': 'assistant', 'content': ''.join(parts)}}]})
+            finally:
+                state.leave(model)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upstream giả lập OpenRouter')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.2, help='giây giữa hai đoạn text')
+    parser.add_argument('--chunks', type=int, default=4, help='số đoạn mỗi câu trả lời')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(args.delay, args.chunks)))
+    print(f"🧪 Stub OpenRouter: http://{args.host}:{args.port}/v1 (thống kê: /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
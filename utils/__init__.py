@@ -1,3 +1,3 @@
-from .helpers import login_required, format_response
+from .helpers import login_required, format_response, sse_event
 
-__all__ = ['login_required', 'format_response']
\ No newline at end of file
+__all__ = ['login_required', 'format_response', 'sse_event']
\ No newline at end of file
@@ -0,0 +1,375 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+
+DEFAULT_MODELS = (
+    'openai/gpt-4o',
+    'openai/gpt-4o-mini',
+    'google/gemini-2.0-flash-exp:free',
+    'google/gemini-pro',
+    'anthropic/claude-3-haiku',
+    'meta-llama/llama-3.1-8b-instruct:free',
+)
+
+# Tham số sinh mặc định (giống dashboard.js trước đây)
+DEFAULT_PARAMS = {'temperature': 0.7, 'max_tokens': 1024, 'top_p': 0.95}
+
+_TRAILING_SPACE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+
+class AIGatewayError(Exception):
+    """Lỗi khi gọi model upstream; `status` là mã HTTP trả cho client"""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+class AIGatewayBusy(AIGatewayError):
+    """Model đã đủ số request đồng thời và hàng đợi chờ quá lâu"""
+
+    def __init__(self, message):
+        super().__init__(message, status=503)
+
+
+def normalize_prompt(prompt):
+    """Chuẩn hóa prompt cho khóa cache: xuống dòng kiểu \\n, bỏ khoảng trắng cuối dòng và hai đầu"""
+    prompt = prompt.replace('\r\n', '\n').replace('\r', '\n')
+    return _TRAILING_SPACE.sub('', prompt).strip()
+
+
+class _Flight:
+    """Một lần gọi upstream; mọi request cùng khóa đọc chung các đoạn text của nó"""
+
+    __slots__ = ('cond', 'chunks', 'done', 'error')
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def push(self, text):
+        with self.cond:
+            self.chunks.append(text)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def follow(self, timeout):
+        """Lần lượt trả các đoạn text (kể cả các đoạn đã có trước khi bắt đầu đọc)"""
+        index = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.cond:
+                while index >= len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AIGatewayError('AI phản hồi quá lâu', status=504)
+                    self.cond.wait(remaining)
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class AIGateway:
+    """Gateway phía server cho các API chat completion kiểu OpenAI (mặc định OpenRouter).
+
+    - API key chỉ nằm ở server (AI_API_KEY / OPENROUTER_API_KEY), được chuyển
+      vào app.config và xóa khỏi os.environ khi init_app
+    - cache câu trả lời theo (model, prompt đã chuẩn hóa, tham số), LRU + TTL
+    - request trùng khóa với một lần gọi đang chạy không gọi upstream lần
+      nữa mà đọc chung kết quả (single-flight), kể cả khi đang stream
+    - mỗi model có tối đa `model_concurrency` lần gọi upstream đồng thời;
+      chờ quá `queue_timeout` giây thì báo AIGatewayBusy
+
+    Lần gọi upstream chạy trên thread riêng và luôn dùng stream=True, nên
+    client ngắt kết nối giữa chừng không làm hỏng kết quả của các request
+    đang đọc chung, và câu trả lời vẫn được cache.
+    """
+
+    def __init__(self, upstream_url='https://openrouter.ai/api/v1', api_key='', default_model='openai/gpt-4o-mini',
+                 models=DEFAULT_MODELS, model_concurrency=4, queue_timeout=10, timeout=60,
+                 cache_ttl=86400, cache_max_entries=5000, max_tokens=2048):
+        self.upstream_url = upstream_url
+        self.api_key = api_key
+        self.default_model = default_model
+        self.models = tuple(models)
+        self.model_concurrency = model_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self.max_tokens = max_tokens
+        self.headers = {}
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # key -> (text, expires_at)
+        self._flights = {}  # key -> _Flight
+        self._semaphores = {}  # model -> BoundedSemaphore
+        self._active = {}  # model -> số lần gọi upstream đang chạy
+
+        self._requests = 0
+        self._hits = 0
+        self._coalesced = 0
+        self._upstream_calls = 0
+        self._upstream_errors = 0
+        self._busy = 0
+        self._evictions = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình AI_* từ Flask app"""
+        app.config.setdefault('AI_UPSTREAM_URL', os.environ.get('AI_UPSTREAM_URL', 'https://openrouter.ai/api/v1'))
+        # Lấy key ra khỏi os.environ (không chỉ đọc) để không tiến trình con nào kế thừa được nó;
+        # init_app lần sau trong cùng process dùng lại key đã lấy
+        env_keys = [os.environ.pop(name, '') for name in ('AI_API_KEY', 'OPENROUTER_API_KEY')]
+        env_key = next((key for key in env_keys if key), '')
+        app.config.setdefault('AI_API_KEY', env_key or self.api_key)
+        app.config.setdefault('AI_DEFAULT_MODEL', os.environ.get('AI_DEFAULT_MODEL', 'openai/gpt-4o-mini'))
+        app.config.setdefault('AI_MODELS', os.environ.get('AI_MODELS', ','.join(DEFAULT_MODELS)))
+        app.config.setdefault('AI_MODEL_CONCURRENCY', int(os.environ.get('AI_MODEL_CONCURRENCY', 4)))
+        app.config.setdefault('AI_QUEUE_TIMEOUT', float(os.environ.get('AI_QUEUE_TIMEOUT', 10)))
+        app.config.setdefault('AI_TIMEOUT', float(os.environ.get('AI_TIMEOUT', 60)))
+        app.config.setdefault('AI_CACHE_TTL', int(os.environ.get('AI_CACHE_TTL', 86400)))
+        app.config.setdefault('AI_CACHE_MAX_ENTRIES', int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000)))
+        app.config.setdefault('AI_MAX_TOKENS', int(os.environ.get('AI_MAX_TOKENS', 2048)))
+        app.config.setdefault('AI_REFERER', os.environ.get('AI_REFERER', 'https://codequest-ai.vercel.app'))
+        app.config.setdefault('AI_TITLE', os.environ.get('AI_TITLE', 'CodeQuest AI Learning Platform'))
+
+        self.upstream_url = app.config['AI_UPSTREAM_URL'].rstrip('/')
+        self.api_key = app.config['AI_API_KEY']
+        models = app.config['AI_MODELS']
+        if isinstance(models, str):
+            models = [model.strip() for model in models.split(',') if model.strip()]
+        self.models = tuple(models)
+        self.default_model = app.config['AI_DEFAULT_MODEL']
+        if self.default_model not in self.models:
+            self.models = (self.default_model,) + self.models
+        self.model_concurrency = app.config['AI_MODEL_CONCURRENCY']
+        self.queue_timeout = app.config['AI_QUEUE_TIMEOUT']
+        self.timeout = app.config['AI_TIMEOUT']
+        self.cache_ttl = app.config['AI_CACHE_TTL']
+        self.cache_max_entries = app.config['AI_CACHE_MAX_ENTRIES']
+        self.max_tokens = app.config['AI_MAX_TOKENS']
+        self.headers = {'HTTP-Referer': app.config['AI_REFERER'], 'X-Title': app.config['AI_TITLE']}
+        with self._lock:
+            self._semaphores.clear()
+        app.extensions['ai_gateway'] = self
+
+    def resolve_params(self, model=None, temperature=None, max_tokens=None, top_p=None):
+        """Kiểm tra và chuẩn hóa model + tham số sinh; sai thì ValueError"""
+        model = model or self.default_model
+        if model not in self.models:
+            raise ValueError(f'Model không được hỗ trợ: {model}')
+        params = {
+            'temperature': DEFAULT_PARAMS['temperature'] if temperature is None else float(temperature),
+            'max_tokens': DEFAULT_PARAMS['max_tokens'] if max_tokens is None else int(max_tokens),
+            'top_p': DEFAULT_PARAMS['top_p'] if top_p is None else float(top_p),
+        }
+        if not 0 <= params['temperature'] <= 2 or not 0 < params['top_p'] <= 1:
+            raise ValueError('temperature/top_p không hợp lệ')
+        params['max_tokens'] = max(1, min(params['max_tokens'], self.max_tokens))
+        params['temperature'] = round(params['temperature'], 2)
+        params['top_p'] = round(params['top_p'], 2)
+        return model, params
+
+    @staticmethod
+    def make_key(model, prompt, params):
+        raw = json.dumps([model, normalize_prompt(prompt), sorted(params.items())], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def complete(self, prompt, model=None, use_cache=True, **params):
+        """Sinh câu trả lời đầy đủ; trả về (text, model, cached)"""
+        chunks, model, cached = self.stream(prompt, model=model, use_cache=use_cache, **params)
+        return ''.join(chunks), model, cached
+
+    def stream(self, prompt, model=None, use_cache=True, **params):
+        """Trả về (iterator các đoạn text, model, cached).
+
+        Hết lượt gọi upstream của model thì báo AIGatewayBusy ngay tại đây,
+        trước khi route bắt đầu trả response.
+        """
+        model, params = self.resolve_params(model, **params)
+        key = self.make_key(model, prompt, params)
+        with self._lock:
+            self._requests += 1
+
+        if use_cache:
+            text = self._cache_get(key)
+            if text is not None:
+                return iter((text,)), model, True
+
+        flight = self._join_or_start(key, model, prompt, params, use_cache)
+        return flight.follow(self.timeout + self.queue_timeout), model, False
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._requests
+            return {
+                'configured': bool(self.api_key),
+                'upstream': self.upstream_url,
+                'entries': len(self._cache),
+                'requests': self._requests,
+                'hits': self._hits,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'coalesced': self._coalesced,
+                'upstream_calls': self._upstream_calls,
+                'upstream_errors': self._upstream_errors,
+                'busy': self._busy,
+                'in_flight': len(self._flights),
+                'active': {model: count for model, count in self._active.items() if count},
+                'evictions': self._evictions
+            }
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            text, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return text
+
+    def _cache_put(self, key, text):
+        with self._lock:
+            self._cache[key] = (text, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+                self._evictions += 1
+
+    def _semaphore(self, model):
+        with self._lock:
+            semaphore = self._semaphores.get(model)
+            if semaphore is None:
+                semaphore = self._semaphores[model] = threading.BoundedSemaphore(self.model_concurrency)
+            return semaphore
+
+    def _join_or_start(self, key, model, prompt, params, use_cache):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight
+
+        if not self.api_key:
+            raise AIGatewayError('Server chưa cấu hình AI_API_KEY', status=503)
+
+        semaphore = self._semaphore(model)
+        if not semaphore.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._busy += 1
+            raise AIGatewayBusy(f'Model {model} đang quá tải, vui lòng thử lại sau')
+
+        with self._lock:
+            # Trong lúc chờ semaphore có thể đã có request khác bắt đầu cùng khóa
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                semaphore.release()
+                return flight
+            flight = self._flights[key] = _Flight()
+            self._upstream_calls += 1
+            self._active[model] = self._active.get(model, 0) + 1
+
+        thread = threading.Thread(
+            target=self._run_upstream,
+            args=(key, flight, semaphore, model, prompt, params, use_cache),
+            name='ai-upstream',
+            daemon=True
+        )
+        thread.start()
+        return flight
+
+    def _run_upstream(self, key, flight, semaphore, model, prompt, params, use_cache):
+        parts, error = [], None
+        try:
+            for text in self._call_upstream(model, prompt, params):
+                parts.append(text)
+                flight.push(text)
+            if not parts:
+                raise AIGatewayError('AI trả về câu trả lời rỗng')
+        except AIGatewayError as e:
+            error = e
+        except Exception as e:
+            error = AIGatewayError(f'Lỗi gọi AI: {e}')
+        finally:
+            semaphore.release()
+
+        # Ghi cache trước khi gỡ flight để request mới luôn thấy một trong hai
+        if error is None and use_cache:
+            self._cache_put(key, ''.join(parts))
+        with self._lock:
+            self._flights.pop(key, None)
+            self._active[model] -= 1
+            if error is not None:
+                self._upstream_errors += 1
+        if error is not None:
+            print(f"AI gateway error ({model}): {error}")
+        flight.finish(error)
+
+    def _call_upstream(self, model, prompt, params):
+        """Gọi /chat/completions với stream=True, trả lần lượt các đoạn text"""
+        body = dict(params, model=model, stream=True, messages=[{'role': 'user', 'content': prompt}])
+        upstream_request = urllib.request.Request(
+            self.upstream_url + '/chat/completions',
+            data=json.dumps(body).encode('utf-8'),
+            headers=dict(self.headers, **{
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'Authorization': f'Bearer {self.api_key}'
+            }),
+            method='POST'
+        )
+        try:
+            response = urllib.request.urlopen(upstream_request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read(300).decode('utf-8', 'replace')
+            # 402/429 (hết credit/quota) giữ nguyên để client hiển thị đúng lỗi
+            raise AIGatewayError(f'Upstream HTTP {e.code}: {detail}', status=e.code if e.code in (402, 429) else 502)
+        except (urllib.error.URLError, TimeoutError, OSError) as e:
+            raise AIGatewayError(f'Không kết nối được AI upstream: {e}', status=504)
+
+        with response:
+            for raw in response:
+                line = raw.decode('utf-8').strip()
+                # Dòng trống và comment SSE (": OPENROUTER PROCESSING") bỏ qua
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return
+                event = json.loads(data)
+                if event.get('error'):
+                    raise AIGatewayError(f"Upstream error: {event['error'].get('message', event['error'])}")
+                choices = event.get('choices') or [{}]
+                text = (choices[0].get('delta') or {}).get('content')
+                if text:
+                    yield text
+
+
+ai_gateway = AIGateway()
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from database.models import User, Session as UserSession
+
+
+class CachedUser:
+    """Thông tin user đã xác thực, giữ trong cache thay cho đối tượng ORM"""
+
+    __slots__ = ('id', 'full_name', 'email', 'is_active', 'is_verified', '_data')
+
+    def __init__(self, data):
+        self.id = data['id']
+        self.full_name = data['full_name']
+        self.email = data['email']
+        self.is_active = data['is_active']
+        self.is_verified = data['is_verified']
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class SessionValidationCache:
+    """Cache kết quả kiểm tra session token (UserSession + User).
+
+    - token hợp lệ được nhớ `ttl` giây (không quá thời điểm session hết hạn)
+    - token không hợp lệ được nhớ `negative_ttl` giây để request lặp lại
+      (vd. trang gọi check-session nhiều lần) không chạm database
+    - logout, đổi mật khẩu, khóa tài khoản hay xóa session thì bỏ cache ngay
+      (qua SQLAlchemy event hoặc gọi invalidate_* trực tiếp)
+
+    Cache nằm trong từng process; với nhiều worker, thay đổi ở worker khác
+    có hiệu lực ở đây chậm nhất sau `ttl` giây.
+    """
+
+    def __init__(self, ttl=30, negative_ttl=5, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token -> (user_id, CachedUser | lý do từ chối, hết hạn cache)
+        self._tokens_by_user = {}
+
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình AUTH_CACHE_* từ Flask app"""
+        app.config.setdefault('AUTH_CACHE_TTL', int(os.environ.get('AUTH_CACHE_TTL', 30)))
+        app.config.setdefault('AUTH_CACHE_NEGATIVE_TTL', int(os.environ.get('AUTH_CACHE_NEGATIVE_TTL', 5)))
+        app.config.setdefault('AUTH_CACHE_MAX_ENTRIES', int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 10000)))
+
+        self.ttl = app.config['AUTH_CACHE_TTL']
+        self.negative_ttl = app.config['AUTH_CACHE_NEGATIVE_TTL']
+        self.max_entries = app.config['AUTH_CACHE_MAX_ENTRIES']
+        app.extensions['auth_cache'] = self
+
+    def validate(self, user_id, session_token):
+        """Trả về (CachedUser, None) nếu (user_id, token) hợp lệ, ngược lại
+        (None, lý do) với lý do là 'expired' hoặc 'inactive'"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_token)
+            if entry is not None and entry[2] > now and entry[0] == user_id:
+                self._entries.move_to_end(session_token)
+                if isinstance(entry[1], str):
+                    self._negative_hits += 1
+                    return None, entry[1]
+                self._hits += 1
+                return entry[1], None
+            self._misses += 1
+
+        user, reason, remaining = self._load(user_id, session_token)
+        with self._lock:
+            if user is None:
+                self._put(session_token, user_id, reason, now + self.negative_ttl)
+            else:
+                self._put(session_token, user_id, user, now + min(self.ttl, remaining))
+        return user, reason
+
+    def invalidate_token(self, session_token):
+        with self._lock:
+            entry = self._entries.pop(session_token, None)
+            if entry is not None:
+                self._invalidations += 1
+                tokens = self._tokens_by_user.get(entry[0])
+                if tokens:
+                    tokens.discard(session_token)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in self._tokens_by_user.pop(user_id, ()):
+                if self._entries.pop(token, None) is not None:
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._negative_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'negative_hits': self._negative_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._hits + self._negative_hits) / lookups, 4) if lookups else 0.0,
+                'invalidations': self._invalidations
+            }
+
+    def _load(self, user_id, session_token):
+        """Hai truy vấn như trước đây; trả về (CachedUser, lý do, số giây session còn hạn)"""
+        user_session = UserSession.query.filter_by(
+            user_id=user_id,
+            session_token=session_token
+        ).first()
+        if not user_session or user_session.is_expired():
+            return None, 'expired', 0
+
+        user = User.query.get(user_id)
+        if not user or not user.is_active:
+            return None, 'inactive', 0
+        remaining = (user_session.expires_at - datetime.utcnow()).total_seconds()
+        return CachedUser(user.to_dict()), None, remaining
+
+    def _put(self, token, user_id, user, expires_at):
+        # Gọi khi đang giữ lock
+        self._entries[token] = (user_id, user, expires_at)
+        self._entries.move_to_end(token)
+        self._tokens_by_user.setdefault(user_id, set()).add(token)
+        while len(self._entries) > self.max_entries:
+            old_token, (old_user_id, _, _) = self._entries.popitem(last=False)
+            tokens = self._tokens_by_user.get(old_user_id)
+            if tokens:
+                tokens.discard(old_token)
+                if not tokens:
+                    del self._tokens_by_user[old_user_id]
+
+
+auth_cache = SessionValidationCache()
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    # Đổi mật khẩu hoặc khóa tài khoản: bỏ mọi session đã cache của user
+    state = inspect(target)
+    if state.attrs.password_hash.history.has_changes() or state.attrs.is_active.history.has_changes():
+        auth_cache.invalidate_user(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    auth_cache.invalidate_user(target.id)
+
+
+@event.listens_for(UserSession, 'after_delete')
+def _session_deleted(mapper, connection, target):
+    auth_cache.invalidate_token(target.session_token)
@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class BattleEventsFull(Exception):
+    """Đã đạt số kết nối nhận sự kiện tối đa"""
+
+
+class _Channel:
+    """Sự kiện gần nhất của một room; subscriber chờ trên `cond`"""
+
+    __slots__ = ('events', 'seq', 'cond', 'subscribers', 'last_activity')
+
+    def __init__(self, buffer_size):
+        self.events = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.subscribers = 0
+        self.last_activity = time.monotonic()
+
+
+class EventStream:
+    """Iterator sự kiện của một room cho một kết nối SSE.
+
+    Trả về dict sự kiện, hoặc None khi đến lúc gửi heartbeat; kết thúc khi
+    room không có sự kiện nào trong `idle_timeout` giây (client tự kết nối
+    lại với Last-Event-ID). close() (Werkzeug gọi khi client ngắt kết nối)
+    luôn trả lại slot kết nối, kể cả khi stream chưa được đọc lần nào.
+    """
+
+    def __init__(self, hub, battle_id, after):
+        self._hub = hub
+        self._battle_id = battle_id
+        self._after = after
+        self._last_event = time.monotonic()
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        if time.monotonic() - self._last_event >= self._hub.idle_timeout:
+            self.close()
+            raise StopIteration
+
+        event = self._hub.next_event(self._battle_id, self._after, timeout=self._hub.heartbeat)
+        if event is None:
+            return None
+        self._after = event['seq']
+        self._last_event = time.monotonic()
+        return event
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._hub._release(self._battle_id)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class BattleEventHub:
+    """Kênh đẩy sự kiện battle (player_joined, countdown, submission, result)
+    tới client qua SSE hoặc long-poll.
+
+    Mỗi room giữ `buffer_size` sự kiện gần nhất, đánh số tăng dần, để client
+    kết nối lại không bị mất sự kiện. Khi có `transport` (store của battle
+    registry), seq do store cấp và lưu cùng sự kiện nên mọi worker process
+    đánh số giống nhau: store chỉ báo (battle_id, seq), worker đang có client
+    theo dõi room đó tự đọc các sự kiện còn thiếu; kênh mới mở (hoặc kết nối
+    LISTEN vừa nối lại) cũng đọc bù từ store.
+
+    Mỗi kết nối SSE/long-poll đang chờ giữ một luồng của WSGI server (sync/
+    gthread) trong suốt thời gian chờ, nên tổng số kết nối SSE và long-poll
+    đang chờ bị chặn bởi `max_subscribers`. Mặc định là 3/4 số luồng mỗi
+    process (WSGI_THREADS, phải khớp với cấu hình server, vd. gunicorn
+    --threads), phần còn lại để phục vụ request thường; vượt mức thì trả
+    BattleEventsFull thay vì chiếm hết luồng của server.
+    """
+
+    def __init__(self, buffer_size=100, heartbeat=15, idle_timeout=300,
+                 max_subscribers=24, channel_ttl=1800, transport=None):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.max_subscribers = max_subscribers
+        self.channel_ttl = channel_ttl
+        self.transport = None
+        self._attached = False
+
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._subscribers = 0
+        self._last_sweep = 0.0
+
+        self._published = 0
+        self._failed = 0
+        self._delivered = 0
+        self._rejected = 0
+        self._resyncs = 0
+
+        if transport is not None:
+            self.attach(transport)
+
+    def init_app(self, app, transport=None):
+        """Đọc cấu hình BATTLE_EVENTS_* từ Flask app"""
+        app.config.setdefault('BATTLE_EVENTS_BUFFER', int(os.environ.get('BATTLE_EVENTS_BUFFER', 100)))
+        app.config.setdefault('BATTLE_EVENTS_HEARTBEAT', int(os.environ.get('BATTLE_EVENTS_HEARTBEAT', 15)))
+        app.config.setdefault('BATTLE_EVENTS_IDLE_TIMEOUT', int(os.environ.get('BATTLE_EVENTS_IDLE_TIMEOUT', 300)))
+        # Số luồng xử lý request của mỗi worker process WSGI (vd. gunicorn -k gthread --threads)
+        app.config.setdefault('WSGI_THREADS', int(os.environ.get('WSGI_THREADS', 32)))
+        app.config.setdefault('BATTLE_EVENTS_MAX_SUBSCRIBERS', int(os.environ.get(
+            'BATTLE_EVENTS_MAX_SUBSCRIBERS', max(1, app.config['WSGI_THREADS'] * 3 // 4))))
+
+        self.buffer_size = app.config['BATTLE_EVENTS_BUFFER']
+        self.heartbeat = app.config['BATTLE_EVENTS_HEARTBEAT']
+        self.idle_timeout = app.config['BATTLE_EVENTS_IDLE_TIMEOUT']
+        self.max_subscribers = app.config['BATTLE_EVENTS_MAX_SUBSCRIBERS']
+        if transport is not None:
+            self.attach(transport)
+        app.extensions['battle_events'] = self
+
+    def attach(self, transport):
+        """Phát/nhận sự kiện qua transport (có publish_event/subscribe_events);
+        chỉ subscribe khi room đầu tiên được theo dõi hoặc có sự kiện đầu tiên"""
+        self.transport = transport
+        self._attached = False
+
+    def publish(self, battle_id, event, data=None):
+        """Phát một sự kiện tới mọi client đang theo dõi room"""
+        self._published += 1
+        if self.transport is None:
+            self._deliver(battle_id, event, data or {})
+            return
+        self._ensure_attached()
+        try:
+            # Store lưu sự kiện và báo lại qua _on_event, kể cả cho process này
+            self.transport.publish_event(battle_id, event, data or {})
+        except Exception as e:
+            # Không tự đánh số trong process: seq sẽ lệch với seq do store cấp.
+            # Client vẫn đọc được trạng thái room qua GET /api/games/battle/<id>
+            self._failed += 1
+            print(f"Battle event publish error: {e}")
+
+    def events_after(self, battle_id, after=0):
+        """Các sự kiện có seq > after; báo 'resync' nếu buffer đã trôi qua mốc đó"""
+        channel = self._channel(battle_id)
+        with channel.cond:
+            return self._collect(channel, after)
+
+    def wait(self, battle_id, after=0, timeout=25):
+        """Long-poll: chờ tới khi có sự kiện mới hơn `after` hoặc hết timeout;
+        BattleEventsFull nếu phải chờ mà đã đủ kết nối"""
+        channel = self._channel(battle_id)
+        with channel.cond:
+            if channel.seq > after or timeout <= 0:
+                return self._collect(channel, after)
+        with self.slot():
+            deadline = time.monotonic() + timeout
+            with channel.cond:
+                while channel.seq <= after:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return []
+                    channel.cond.wait(remaining)
+                return self._collect(channel, after)
+
+    @contextmanager
+    def slot(self):
+        """Giữ một chỗ trong giới hạn `max_subscribers` cho một long-poll đang chờ
+        (cả long-poll ngoài hub, vd. ghép trận); BattleEventsFull nếu đã đủ"""
+        self._acquire()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._subscribers -= 1
+
+    def next_event(self, battle_id, after, timeout):
+        events = self.wait(battle_id, after, timeout)
+        return events[0] if events else None
+
+    def stream(self, battle_id, after=0):
+        """Mở một stream SSE; BattleEventsFull nếu đã đủ kết nối"""
+        self._acquire()
+        channel = self._channel(battle_id)
+        with channel.cond:
+            channel.subscribers += 1
+        return EventStream(self, battle_id, after)
+
+    def stats(self):
+        with self._lock:
+            channels = list(self._channels.values())
+            return {
+                'channels': len(channels),
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'published': self._published,
+                'publish_failed': self._failed,
+                'delivered': self._delivered,
+                'rejected': self._rejected,
+                'resyncs': self._resyncs
+            }
+
+    def _acquire(self):
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                self._rejected += 1
+                raise BattleEventsFull('Quá nhiều kết nối, vui lòng thử lại sau')
+            self._subscribers += 1
+
+    def _ensure_attached(self):
+        if not self._attached and self.transport is not None:
+            with self._lock:
+                if not self._attached:
+                    self.transport.subscribe_events(self._on_event)
+                    self._attached = True
+
+    def _channel(self, battle_id):
+        channel = self._channels.get(battle_id)
+        if channel is None:
+            self._ensure_attached()
+            created = False
+            with self._lock:
+                self._sweep()
+                channel = self._channels.get(battle_id)
+                if channel is None:
+                    channel = self._channels[battle_id] = _Channel(self.buffer_size)
+                    created = True
+            if created and self.transport is not None:
+                # Đọc bù các sự kiện đã phát trước khi process này theo dõi room
+                self._fetch(battle_id, channel)
+        return channel
+
+    def _on_event(self, battle_id, seq):
+        """Store báo room có sự kiện mới `seq` (battle_id None: đọc bù mọi kênh)"""
+        if battle_id is None:
+            with self._lock:
+                channels = list(self._channels.items())
+            for channel_id, channel in channels:
+                self._fetch(channel_id, channel)
+            return
+        channel = self._channels.get(battle_id)
+        # Không ai trong process theo dõi room thì không cần đọc; kênh mở sau sẽ tự đọc bù
+        if channel is not None and channel.seq < seq:
+            self._fetch(battle_id, channel)
+
+    def _fetch(self, battle_id, channel):
+        try:
+            events = self.transport.load_events(battle_id, after=channel.seq, limit=self.buffer_size)
+        except Exception as e:
+            print(f"Battle event load error: {e}")
+            return
+        with channel.cond:
+            for event in events:
+                if event['seq'] > channel.seq:
+                    channel.events.append(event)
+                    channel.seq = event['seq']
+                    self._delivered += 1
+            channel.last_activity = time.monotonic()
+            channel.cond.notify_all()
+
+    def _collect(self, channel, after):
+        events = [event for event in channel.events if event['seq'] > after]
+        if after and channel.events and channel.events[0]['seq'] > after + 1:
+            # Client đã lỡ sự kiện bị đẩy khỏi buffer: cần tải lại trạng thái room
+            self._resyncs += 1
+            events.insert(0, {'seq': channel.events[0]['seq'] - 1, 'event': 'resync', 'data': {}, 'time': time.time()})
+        return events
+
+    def _deliver(self, battle_id, event, data):
+        # Chỉ dùng khi không có transport: seq đánh trong process
+        channel = self._channel(battle_id)
+        with channel.cond:
+            channel.seq += 1
+            channel.events.append({'seq': channel.seq, 'event': event, 'data': data, 'time': time.time()})
+            channel.last_activity = time.monotonic()
+            self._delivered += 1
+            channel.cond.notify_all()
+
+    def _release(self, battle_id):
+        with self._lock:
+            self._subscribers -= 1
+            channel = self._channels.get(battle_id)
+        if channel is not None:
+            with channel.cond:
+                channel.subscribers -= 1
+                channel.last_activity = time.monotonic()
+
+    def _sweep(self):
+        # Gọi khi đang giữ self._lock
+        now = time.monotonic()
+        if now - self._last_sweep < 1:
+            return
+        self._last_sweep = now
+        cutoff = now - self.channel_ttl
+        for battle_id, channel in list(self._channels.items()):
+            if channel.subscribers == 0 and channel.last_activity < cutoff:
+                del self._channels[battle_id]
+
+
+battle_events = BattleEventHub()
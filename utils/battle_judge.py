@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+
+from .battles import battle_registry, BattleError
+from .battle_events import battle_events
+from .catalog import catalog
+from .grading import grading_engine, truncate_error
+from .jobs import job_scheduler, JobQueueFull
+
+
+def pick_challenge():
+    """Chọn ngẫu nhiên một thử thách speed coding có test case cho battle"""
+    challenges = [c for c in catalog.snapshot.speed_challenges if c.get('test_cases')]
+    return random.choice(challenges)['id'] if challenges else None
+
+
+class BattleJudge:
+    """Chấm bài của mọi người chơi trong một trận CÙNG LÚC.
+
+    Mỗi bài nộp được gửi tới một sandbox worker riêng trên một luồng riêng,
+    tất cả dùng chung một hạn chót `time_limit` giây. Thời gian chạy và thời
+    gian CPU được đo trong worker nên không phụ thuộc việc bài nào phải chờ
+    worker lâu hơn. Kết quả gộp được lưu vào room và phát qua sự kiện 'result'.
+    """
+
+    def __init__(self, registry=None, events=None, engine=None, scheduler=None, time_limit=10):
+        self.registry = registry or battle_registry
+        self.events = events or battle_events
+        self.engine = engine or grading_engine
+        self.scheduler = scheduler or job_scheduler
+        self.time_limit = time_limit
+
+        self._lock = threading.Lock()
+        self._judged = 0
+        self._failed = 0
+        self._duration_total = 0.0
+
+    def schedule(self, battle_id):
+        """Đưa việc chấm trận vào job scheduler (hàng đợi đầy thì chấm ngay)"""
+        try:
+            return self.scheduler.submit(lambda: self.judge(battle_id), kind='battle-judge', priority=1)
+        except JobQueueFull:
+            return self.judge(battle_id)
+
+    def judge(self, battle_id):
+        started = time.monotonic()
+        try:
+            room = self.registry.get(battle_id)
+            if room is None:
+                return None
+            challenge = catalog.snapshot.speed_by_id.get(room.challenge_id)
+
+            if challenge is None or not challenge.get('test_cases'):
+                result = {'winner': None, 'players': [], 'error': 'Trận đấu không có thử thách để chấm'}
+            else:
+                result = self._grade_all(room, challenge)
+        except Exception as e:
+            # Lỗi bất ngờ (vd. không đọc được room) vẫn phải kết thúc trận,
+            # nếu không người chơi sẽ chờ sự kiện 'result' mãi
+            print(f"Battle judge error: {e}")
+            result = {'winner': None, 'players': [], 'error': truncate_error(f'Không chấm được trận đấu: {e}')}
+
+        result['judged_in'] = round(time.monotonic() - started, 6)
+        with self._lock:
+            self._judged += 1
+            self._duration_total += result['judged_in']
+            if result.get('error'):
+                self._failed += 1
+        try:
+            self.registry.finish(battle_id, result)
+        except Exception as e:
+            print(f"Battle judge error: {e}")
+        self.events.publish(battle_id, 'result', result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'judged': self._judged,
+                'failed': self._failed,
+                'judge_avg': round(self._duration_total / self._judged, 6) if self._judged else 0.0
+            }
+
+    def _grade_all(self, room, challenge):
+        # Chạy lời giải mẫu trước (được cache) để không bài nộp nào phải chờ nó
+        try:
+            self.engine.reference_outputs(challenge['expected_code'], challenge['test_cases'])
+        except Exception as e:
+            return {'winner': None, 'players': [], 'error': truncate_error(str(e))}
+
+        submissions = list(room.submissions.items())
+        reports = {}
+        deadline = time.monotonic() + self.time_limit
+        start_together = threading.Barrier(max(len(submissions), 1))
+
+        def grade(user_id, code):
+            wall_started = time.monotonic()
+            try:
+                start_together.wait(max(deadline - wall_started, 0))
+                wall_started = time.monotonic()
+                # Hạn chót tính cả thời gian chờ sandbox worker: bài nào chạy quá
+                # hạn thì worker của nó bị kill, không chạy tiếp sau khi có kết quả
+                report = self.engine.grade(code, challenge['expected_code'], challenge['test_cases'],
+                                           timeout=self.time_limit, deadline=deadline)
+                entry = (report.to_dict(), time.monotonic() - wall_started)
+            except Exception as e:
+                entry = ({'passed': False, 'passed_count': 0, 'error': truncate_error(str(e))},
+                         time.monotonic() - wall_started)
+            with lock:
+                if not closed:
+                    reports[user_id] = entry
+
+        lock = threading.Lock()
+        closed = False
+        threads = [threading.Thread(target=grade, args=(user_id, submission['code']), daemon=True)
+                   for user_id, submission in submissions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # Hạn chót chung; cộng thêm một chút cho thời gian kill worker quá giờ
+            thread.join(max(deadline - time.monotonic(), 0) + 1)
+        with lock:
+            # Luồng về muộn không được sửa kết quả đã công bố
+            closed = True
+
+        players = []
+        for user_id, submission in submissions:
+            report, wall_time = reports.get(user_id, ({'passed': False, 'passed_count': 0,
+                                                       'error': 'Quá thời gian chấm'}, None))
+            players.append({
+                'user_id': user_id,
+                'passed': report['passed'],
+                'passed_count': report['passed_count'],
+                'total': len(challenge['test_cases']),
+                'submitted_at': submission['submitted_at'],
+                'exec_time': report.get('exec_time'),
+                'cpu_time': report.get('cpu_time'),
+                'wall_time': round(wall_time, 6) if wall_time is not None else None,
+                'error': truncate_error(report.get('error'))
+            })
+
+        # Đúng nhiều test hơn thắng; bằng nhau thì nộp sớm hơn, rồi tốn ít CPU hơn
+        def rank_key(player):
+            return (-player['passed_count'], player['submitted_at'],
+                    player['cpu_time'] if player['cpu_time'] is not None else float('inf'))
+
+        players.sort(key=rank_key)
+        winner = None
+        if players and players[0]['passed_count'] > 0:
+            if len(players) == 1 or rank_key(players[0]) != rank_key(players[1]):
+                winner = players[0]['user_id']
+        return {'winner': winner, 'players': players, 'challenge_id': room.challenge_id}
+
+
+battle_judge = BattleJudge()
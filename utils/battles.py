@@ -0,0 +1,614 @@
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions, sql
+
+from database.pool import db_pool
+
+
+class BattleError(Exception):
+    """Lỗi thao tác với battle room"""
+
+
+class BattleNotFound(BattleError):
+    """Không có battle room (hoặc room đã hết hạn)"""
+
+
+class BattleFull(BattleError):
+    """Battle room đã đủ người chơi"""
+
+
+class BattleStoreError(BattleError):
+    """Không đọc/ghi được battle room ở tầng lưu trữ"""
+
+
+# Số sự kiện gần nhất của mỗi room mà LocalBattleStore giữ lại
+EVENT_HISTORY = 200
+
+
+class BattleRoom:
+    """Một battle room; trạng thái: waiting -> ready -> judging -> finished.
+
+    Room đã công bố trong cache thì không bị sửa tại chỗ: mỗi thay đổi tạo
+    bản sao với `version` tăng thêm 1, nên đọc không cần khóa.
+    """
+
+    __slots__ = ('id', 'creator', 'players', 'status', 'max_players', 'challenge_id',
+                 'submissions', 'result', 'version', 'created_at', 'updated_at')
+
+    def __init__(self, battle_id, creator, max_players=2, challenge_id=None):
+        now = time.time()
+        self.id = battle_id
+        self.creator = creator
+        self.players = [creator]
+        self.status = 'waiting'
+        self.max_players = max_players
+        self.challenge_id = challenge_id
+        self.submissions = {}  # user_id -> {'code', 'submitted_at'}
+        self.result = None
+        self.version = 1
+        self.created_at = now
+        self.updated_at = now
+
+    def copy(self):
+        room = BattleRoom.__new__(BattleRoom)
+        for name in BattleRoom.__slots__:
+            setattr(room, name, getattr(self, name))
+        room.players = list(self.players)
+        room.submissions = dict(self.submissions)
+        return room
+
+    def to_dict(self):
+        # Không trả code bài nộp cho client, chỉ cho biết ai đã nộp
+        return {
+            'id': self.id,
+            'creator': self.creator,
+            'players': list(self.players),
+            'status': self.status,
+            'challenge_id': self.challenge_id,
+            'submitted': list(self.submissions),
+            'result': self.result,
+            'version': self.version,
+            'created_at': self.created_at
+        }
+
+    def to_record(self):
+        return {name: getattr(self, name) for name in BattleRoom.__slots__}
+
+    @classmethod
+    def from_record(cls, record):
+        room = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(room, name, record[name])
+        room.players = list(room.players)
+        room.submissions = dict(room.submissions or {})
+        return room
+
+
+class LocalBattleStore:
+    """Tầng lưu trữ trong bộ nhớ, thay thế Postgres khi chạy một process
+    (dev/test). Cùng ngữ nghĩa với PostgresBattleStore: ghi theo version
+    (optimistic) và báo thay đổi cho mọi registry đã subscribe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}
+        self._events = {}  # battle_id -> deque sự kiện, seq tăng dần theo room
+        self._callbacks = []
+        self._event_callbacks = []
+
+    def insert(self, room):
+        with self._lock:
+            if room.id in self._records:
+                return False
+            self._records[room.id] = room.to_record()
+        self._notify(room.id, room.version)
+        return True
+
+    def load(self, battle_id):
+        with self._lock:
+            record = self._records.get(battle_id)
+        return BattleRoom.from_record(record) if record else None
+
+    def save(self, room, expected_version):
+        with self._lock:
+            record = self._records.get(room.id)
+            if record is None or record['version'] != expected_version:
+                return False
+            self._records[room.id] = room.to_record()
+        self._notify(room.id, room.version)
+        return True
+
+    def purge(self, cutoff):
+        with self._lock:
+            expired = [battle_id for battle_id, record in self._records.items()
+                       if record['updated_at'] < cutoff]
+            for battle_id in expired:
+                del self._records[battle_id]
+                self._events.pop(battle_id, None)
+        return len(expired)
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def publish_event(self, battle_id, event, data):
+        with self._lock:
+            events = self._events.get(battle_id)
+            if events is None:
+                events = self._events[battle_id] = deque(maxlen=EVENT_HISTORY)
+            seq = events[-1]['seq'] + 1 if events else 1
+            events.append({'seq': seq, 'event': event, 'data': data, 'time': time.time()})
+        for callback in list(self._event_callbacks):
+            callback(battle_id, seq)
+        return seq
+
+    def load_events(self, battle_id, after=0, limit=100):
+        with self._lock:
+            events = [event for event in self._events.get(battle_id, ()) if event['seq'] > after]
+        return events[-limit:]
+
+    def subscribe_events(self, callback):
+        with self._lock:
+            self._event_callbacks.append(callback)
+
+    def close(self):
+        pass
+
+    def _notify(self, battle_id, version):
+        for callback in list(self._callbacks):
+            callback(battle_id, version)
+
+
+class PostgresBattleStore:
+    """Lưu battle room trong bảng battle_rooms để mọi worker process dùng chung.
+
+    Mỗi lần ghi gửi NOTIFY '<battle_id>:<version>' trên `channel` (trong cùng
+    transaction, nên chỉ được phát khi commit). Một luồng LISTEN riêng nhận
+    thông báo và báo cho registry bỏ bản cache cũ.
+
+    Sự kiện battle được ghi vào bảng battle_events với seq tăng dần theo room
+    (battle_rooms.event_seq, cấp trong transaction ghi sự kiện nên các sự kiện
+    của một room commit đúng thứ tự seq). NOTIFY chỉ mang {"battle_id", "seq"}
+    vì payload của pg_notify giới hạn 8000 byte; worker nhận thông báo tự đọc
+    nội dung sự kiện từ bảng.
+    """
+
+    COLUMNS = ('id', 'creator', 'players', 'status', 'max_players', 'challenge_id',
+               'submissions', 'result', 'version', 'created_at', 'updated_at')
+    JSON_COLUMNS = ('players', 'submissions', 'result')
+
+    def __init__(self, pool=None, channel='battle_rooms', poll_interval=5.0):
+        self.pool = pool or db_pool
+        self.channel = channel
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._event_callbacks = []
+        self._thread = None
+        self._closed = False
+        self._notifications = 0
+        self._reconnects = 0
+
+    def insert(self, room):
+        record = self._to_row(room)
+        return self._write(
+            'INSERT INTO battle_rooms ({}) VALUES ({}) ON CONFLICT (id) DO NOTHING'.format(
+                ', '.join(self.COLUMNS), ', '.join(['%s'] * len(self.COLUMNS))),
+            record, room)
+
+    def load(self, battle_id):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT {} FROM battle_rooms WHERE id = %s'.format(', '.join(self.COLUMNS)),
+                               (battle_id,))
+                row = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise BattleStoreError(f'Không đọc được battle room: {e}') from e
+        if row is None:
+            return None
+        record = dict(zip(self.COLUMNS, row))
+        for column in self.JSON_COLUMNS:
+            record[column] = json.loads(record[column]) if record[column] else None
+        return BattleRoom.from_record(record)
+
+    def save(self, room, expected_version):
+        record = self._to_row(room)
+        return self._write(
+            'UPDATE battle_rooms SET {} WHERE id = %s AND version = %s'.format(
+                ', '.join(f'{column} = %s' for column in self.COLUMNS[1:])),
+            record[1:] + (room.id, expected_version), room)
+
+    def purge(self, cutoff):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM battle_events
+                    WHERE battle_id IN (SELECT id FROM battle_rooms WHERE updated_at < %s)
+                ''', (cutoff,))
+                cursor.execute('DELETE FROM battle_rooms WHERE updated_at < %s', (cutoff,))
+                deleted = cursor.rowcount
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise BattleStoreError(f'Không dọn được battle room: {e}') from e
+        return deleted
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+            self._ensure_listener()
+
+    def publish_event(self, battle_id, event, data):
+        """Ghi sự kiện vào battle_events rồi NOTIFY (battle_id, seq); trả về seq"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                # Giữ khóa dòng của room tới khi commit: seq của một room liên tục và commit theo thứ tự
+                cursor.execute('UPDATE battle_rooms SET event_seq = event_seq + 1 WHERE id = %s RETURNING event_seq',
+                               (battle_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    conn.rollback()
+                    cursor.close()
+                    raise BattleNotFound('Không tìm thấy battle room')
+                seq = row[0]
+                cursor.execute('''
+                    INSERT INTO battle_events (battle_id, seq, event, data, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', (battle_id, seq, event, json.dumps(data, ensure_ascii=False), time.time()))
+                cursor.execute('SELECT pg_notify(%s, %s)',
+                               (self.channel, json.dumps({'battle_id': battle_id, 'seq': seq})))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise BattleStoreError(f'Không phát được sự kiện battle: {e}') from e
+        return seq
+
+    def load_events(self, battle_id, after=0, limit=100):
+        """Tối đa `limit` sự kiện mới nhất có seq > after, theo thứ tự seq"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT seq, event, data, created_at FROM battle_events
+                    WHERE battle_id = %s AND seq > %s
+                    ORDER BY seq DESC LIMIT %s
+                ''', (battle_id, after, limit))
+                rows = cursor.fetchall()
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise BattleStoreError(f'Không đọc được sự kiện battle: {e}') from e
+        return [{'seq': seq, 'event': event, 'data': json.loads(data) if data else {}, 'time': created_at}
+                for seq, event, data, created_at in reversed(rows)]
+
+    def subscribe_events(self, callback):
+        with self._lock:
+            self._event_callbacks.append(callback)
+            self._ensure_listener()
+
+    def close(self):
+        self._closed = True
+
+    def stats(self):
+        return {
+            'listening': self._thread is not None and self._thread.is_alive(),
+            'notifications': self._notifications,
+            'reconnects': self._reconnects
+        }
+
+    def _to_row(self, room):
+        record = room.to_record()
+        for column in self.JSON_COLUMNS:
+            record[column] = json.dumps(record[column], ensure_ascii=False) if record[column] is not None else None
+        return tuple(record[column] for column in self.COLUMNS)
+
+    def _write(self, query, params, room):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                written = cursor.rowcount == 1
+                if written:
+                    cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, f'{room.id}:{room.version}'))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise BattleStoreError(f'Không lưu được battle room: {e}') from e
+        return written
+
+    def _ensure_listener(self):
+        # Gọi khi đang giữ self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name='battle-listener', daemon=True)
+            self._thread.start()
+
+    def _dispatch_event(self, battle_id, seq):
+        for callback in list(self._event_callbacks):
+            try:
+                callback(battle_id, seq)
+            except Exception as e:
+                print(f"Battle event callback error: {e}")
+
+    def _dispatch(self, battle_id, version):
+        for callback in list(self._callbacks):
+            try:
+                callback(battle_id, version)
+            except Exception as e:
+                print(f"Battle listener callback error: {e}")
+
+    def _listen(self):
+        delay = 1
+        while not self._closed:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.pool.connect_kwargs)
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.channel)))
+                # Có thể đã lỡ thông báo trong lúc mất kết nối: bỏ toàn bộ cache,
+                # các kênh sự kiện tự đọc lại phần còn thiếu
+                self._reconnects += 1
+                self._dispatch(None, None)
+                self._dispatch_event(None, None)
+                delay = 1
+
+                while not self._closed:
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._notifications += 1
+                        if notify.payload.startswith('{'):
+                            message = json.loads(notify.payload)
+                            self._dispatch_event(message['battle_id'], int(message['seq']))
+                            continue
+                        battle_id, _, version = notify.payload.partition(':')
+                        self._dispatch(battle_id, int(version or 0))
+            except Exception as e:
+                print(f"Battle listener error: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+class BattleRegistry:
+    """Cache battle room của process, đứng trước một tầng lưu trữ dùng chung.
+
+    Tra cứu theo battle_id là một lần đọc dict (O(1)); room chưa có trong
+    cache được đọc từ store. Thao tác thay đổi một room chỉ khóa một trong
+    `stripes` lock (chọn theo hash của battle_id) và ghi xuống store theo
+    version; worker khác sửa room thì store báo về để bỏ bản cache cũ. Room
+    không có hoạt động quá `ttl` giây sẽ bị loại bỏ.
+    """
+
+    def __init__(self, ttl=1800, max_players=2, stripes=16, store=None):
+        self.ttl = ttl
+        self.max_players = max_players
+        self.store = store or LocalBattleStore()
+        # RLock: LocalBattleStore báo thay đổi đồng bộ, ngay trong lúc đang giữ lock
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        self._rooms = {}
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._last_purge = 0.0
+        self._subscribed = False
+
+        self._created = 0
+        self._joins = 0
+        self._evicted = 0
+        self._conflicts = 0
+        self._invalidations = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình BATTLE_* từ Flask app"""
+        app.config.setdefault('BATTLE_ROOM_TTL', int(os.environ.get('BATTLE_ROOM_TTL', 1800)))
+        app.config.setdefault('BATTLE_MAX_PLAYERS', int(os.environ.get('BATTLE_MAX_PLAYERS', 2)))
+        # 'postgres': dùng chung giữa các worker process; 'local': chỉ trong process
+        app.config.setdefault('BATTLE_STORE', os.environ.get('BATTLE_STORE', 'postgres'))
+        app.config.setdefault('BATTLE_NOTIFY_CHANNEL', os.environ.get('BATTLE_NOTIFY_CHANNEL', 'battle_rooms'))
+
+        self.ttl = app.config['BATTLE_ROOM_TTL']
+        self.max_players = app.config['BATTLE_MAX_PLAYERS']
+        if app.config['BATTLE_STORE'] == 'postgres':
+            self.store = PostgresBattleStore(channel=app.config['BATTLE_NOTIFY_CHANNEL'])
+        else:
+            self.store = LocalBattleStore()
+        self._rooms = {}
+        self._subscribed = False
+        app.extensions['battle_registry'] = self
+
+    def lock_for(self, battle_id):
+        return self._stripes[hash(battle_id) % len(self._stripes)]
+
+    def create(self, user_id, challenge_id=None):
+        """Tạo room mới với user_id là người tạo"""
+        self._ensure_subscribed()
+        self._sweep()
+        while True:
+            room = BattleRoom(uuid.uuid4().hex[:8], user_id, self.max_players, challenge_id)
+            with self.lock_for(room.id):
+                if room.id not in self._rooms and self.store.insert(room):
+                    self._rooms[room.id] = room
+                    self._created += 1
+                    return room
+
+    def get(self, battle_id):
+        """Room theo battle_id, None nếu không có hoặc đã hết hạn"""
+        self._ensure_subscribed()
+        room = self._rooms.get(battle_id)
+        if room is None:
+            with self.lock_for(battle_id):
+                room = self._rooms.get(battle_id)
+                if room is None:
+                    room = self.store.load(battle_id)
+                    if room is None:
+                        return None
+                    self._rooms[battle_id] = room
+        if time.time() - room.updated_at > self.ttl:
+            self._evict(battle_id, room)
+            return None
+        return room
+
+    def join(self, battle_id, user_id):
+        """Thêm user vào room; trả về (snapshot dict của room, True nếu user mới vào)"""
+        def apply(room):
+            if user_id in room.players:
+                return False
+            if len(room.players) >= room.max_players:
+                raise BattleFull('Battle room đã đủ người chơi')
+            room.players.append(user_id)
+            if len(room.players) >= room.max_players:
+                room.status = 'ready'
+            return True
+
+        battle, joined = self._update(battle_id, apply)
+        if joined:
+            self._joins += 1
+        return battle, joined
+
+    def submit(self, battle_id, user_id, code):
+        """Ghi bài nộp của user; khi mọi người đã nộp thì room chuyển sang 'judging'"""
+        def apply(room):
+            if user_id not in room.players:
+                raise BattleError('Bạn không ở trong battle room này')
+            if room.status == 'waiting':
+                raise BattleError('Trận đấu chưa bắt đầu')
+            if room.status != 'ready':
+                raise BattleError('Trận đấu đã kết thúc')
+            if user_id in room.submissions:
+                raise BattleError('Bạn đã nộp bài rồi')
+            room.submissions[user_id] = {'code': code, 'submitted_at': time.time()}
+            if len(room.submissions) >= len(room.players):
+                room.status = 'judging'
+            return True
+
+        return self._update(battle_id, apply)[0]
+
+    def finish(self, battle_id, result):
+        """Lưu kết quả chấm và kết thúc trận"""
+        def apply(room):
+            room.status = 'finished'
+            room.result = result
+            return True
+
+        return self._update(battle_id, apply)[0]
+
+    def _update(self, battle_id, apply):
+        """Sửa room theo kiểu copy-on-write rồi ghi xuống store theo version.
+
+        `apply(bản sao)` sửa bản sao và trả về True nếu có thay đổi (hoặc raise
+        BattleError); trả về (snapshot dict, có thay đổi hay không).
+        """
+        self._sweep()
+        for _ in range(3):
+            room = self.get(battle_id)
+            if room is None:
+                raise BattleNotFound('Không tìm thấy battle room')
+
+            with self.lock_for(battle_id):
+                # Room có thể vừa bị thay/loại bỏ trong lúc chờ lock
+                if self._rooms.get(battle_id) is not room:
+                    continue
+                updated = room.copy()
+                if not apply(updated):
+                    return room.to_dict(), False
+                updated.version += 1
+                updated.updated_at = time.time()
+
+                if self.store.save(updated, room.version):
+                    self._rooms[battle_id] = updated
+                    return updated.to_dict(), True
+
+                # Worker khác đã ghi trước: đọc lại từ store rồi thử lại
+                self._conflicts += 1
+                self._rooms.pop(battle_id, None)
+        raise BattleError('Battle room đang được cập nhật, vui lòng thử lại')
+
+    def snapshot(self, battle_id):
+        room = self.get(battle_id)
+        return room.to_dict() if room else None
+
+    def stats(self):
+        rooms = list(self._rooms.values())
+        by_status = {}
+        for room in rooms:
+            by_status[room.status] = by_status.get(room.status, 0) + 1
+        data = {
+            'store': type(self.store).__name__,
+            'rooms': len(rooms),
+            'by_status': by_status,
+            'created': self._created,
+            'joins': self._joins,
+            'evicted': self._evicted,
+            'conflicts': self._conflicts,
+            'invalidations': self._invalidations
+        }
+        if hasattr(self.store, 'stats'):
+            data['listener'] = self.store.stats()
+        return data
+
+    def _ensure_subscribed(self):
+        if not self._subscribed:
+            with self._sweep_lock:
+                if not self._subscribed:
+                    self.store.subscribe(self._on_change)
+                    self._subscribed = True
+
+    def _on_change(self, battle_id, version):
+        """Store báo room đã đổi (battle_id None = bỏ toàn bộ cache)"""
+        if battle_id is None:
+            self._invalidations += len(self._rooms)
+            self._rooms = {}
+            return
+        room = self._rooms.get(battle_id)
+        if room is not None and room.version < version:
+            with self.lock_for(battle_id):
+                if self._rooms.get(battle_id) is room:
+                    del self._rooms[battle_id]
+                    self._invalidations += 1
+
+    def _evict(self, battle_id, room):
+        with self.lock_for(battle_id):
+            if self._rooms.get(battle_id) is room:
+                del self._rooms[battle_id]
+                self._evicted += 1
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < 1 or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            cutoff = now - self.ttl
+            for battle_id, room in list(self._rooms.items()):
+                if room.updated_at < cutoff:
+                    self._evict(battle_id, room)
+            # Dọn bản ghi hết hạn ở store thưa hơn (mọi worker đều làm việc này)
+            if now - self._last_purge >= 60:
+                self._last_purge = now
+                try:
+                    self.store.purge(cutoff)
+                except BattleStoreError as e:
+                    print(f"Battle purge error: {e}")
+        finally:
+            self._sweep_lock.release()
+
+
+battle_registry = BattleRegistry()
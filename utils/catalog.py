@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+
+from .normalize import code_normalizer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+CATALOG_FILES = {
+    'quiz_questions': 'quiz_questions.json',
+    'speed_coding_challenges': 'speed_coding_challenges.json',
+    'debugging_challenges': 'debugging_challenges.json',
+    'code_art_templates': 'code_art_templates.json'
+}
+
+REQUIRED_FIELDS = {
+    'quiz_questions': ('id', 'question', 'options', 'correct', 'difficulty'),
+    'speed_coding_challenges': ('id', 'title', 'expected_code'),
+    'debugging_challenges': ('id', 'title', 'buggy_code', 'correct_code'),
+    'code_art_templates': ('id', 'name', 'code')
+}
+
+
+class CatalogError(Exception):
+    """Dữ liệu catalog không hợp lệ"""
+
+
+class CatalogSnapshot:
+    """Một phiên bản bất biến của catalog, đã được đánh index sẵn.
+
+    Request nên lấy snapshot một lần rồi dùng suốt, để không bị lẫn dữ liệu
+    cũ/mới khi catalog được reload giữa chừng.
+    """
+
+    def __init__(self, version, data):
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.quiz_questions = data['quiz_questions']
+        self.speed_challenges = data['speed_coding_challenges']
+        self.debugging_challenges = data['debugging_challenges']
+        self.art_templates = data['code_art_templates']
+
+        self.quiz_by_id = {q['id']: q for q in self.quiz_questions}
+        self.speed_by_id = {c['id']: c for c in self.speed_challenges}
+        self.debugging_by_id = {c['id']: c for c in self.debugging_challenges}
+        self.art_by_id = {t['id']: t for t in self.art_templates}
+
+        self.quiz_by_difficulty = {}
+        for question in self.quiz_questions:
+            self.quiz_by_difficulty.setdefault(question['difficulty'], []).append(question)
+
+        # Dạng AST chuẩn hóa của đáp án, tính một lần cho mỗi phiên bản catalog
+        self.speed_canonical = code_normalizer.build_index(self.speed_challenges, 'expected_code')
+        self.debugging_canonical = code_normalizer.build_index(self.debugging_challenges, 'correct_code')
+
+    def quiz_bucket(self, difficulty):
+        """Danh sách câu hỏi theo độ khó ('all' = toàn bộ)"""
+        if difficulty == 'all':
+            return self.quiz_questions
+        return self.quiz_by_difficulty.get(difficulty, [])
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'quiz_questions': len(self.quiz_questions),
+            'speed_coding_challenges': len(self.speed_challenges),
+            'debugging_challenges': len(self.debugging_challenges),
+            'code_art_templates': len(self.art_templates)
+        }
+
+
+class Catalog:
+    """Catalog câu hỏi/thử thách đọc từ các file JSON trong `data_dir`.
+
+    File thay đổi (theo mtime, kiểm tra tối đa mỗi `check_interval` giây)
+    thì catalog được load lại thành snapshot mới và hoán đổi nguyên khối;
+    dữ liệu lỗi thì giữ nguyên snapshot cũ.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=2.0):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+
+        self._reload_lock = threading.Lock()
+        self._snapshot = None
+        self._mtimes = None
+        self._last_check = 0.0
+        self._reloads = 0
+        self._reload_errors = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình CATALOG_* từ Flask app"""
+        app.config.setdefault('CATALOG_DIR', os.environ.get('CATALOG_DIR', DATA_DIR))
+        app.config.setdefault('CATALOG_CHECK_INTERVAL', float(os.environ.get('CATALOG_CHECK_INTERVAL', 2)))
+
+        self.data_dir = app.config['CATALOG_DIR']
+        self.check_interval = app.config['CATALOG_CHECK_INTERVAL']
+        self._snapshot = None
+        app.extensions['catalog'] = self
+
+    @property
+    def snapshot(self):
+        """Snapshot hiện tại (tự load lại nếu file dữ liệu đã đổi)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload()
+        if self.check_interval >= 0 and time.monotonic() - self._last_check >= self.check_interval:
+            self._maybe_reload()
+        return self._snapshot
+
+    def reload(self, force=True):
+        """Load lại toàn bộ catalog và hoán đổi snapshot; trả về snapshot đang dùng"""
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            mtimes = self._read_mtimes()
+            if not force and mtimes == self._mtimes and self._snapshot is not None:
+                return self._snapshot
+
+            try:
+                data = {name: self._load_file(name, filename) for name, filename in CATALOG_FILES.items()}
+                version = (self._snapshot.version + 1) if self._snapshot else 1
+                snapshot = CatalogSnapshot(version, data)
+            except (OSError, ValueError, CatalogError) as e:
+                self._reload_errors += 1
+                print(f"❌ Catalog reload error: {e}")
+                if self._snapshot is None:
+                    raise
+                self._mtimes = mtimes
+                return self._snapshot
+
+            # Hoán đổi nguyên tử: request đang chạy vẫn giữ snapshot cũ của nó
+            self._snapshot = snapshot
+            self._mtimes = mtimes
+            self._reloads += 1
+            return snapshot
+
+    def stats(self):
+        snapshot = self._snapshot
+        data = snapshot.info() if snapshot else {'version': 0}
+        data.update({'reloads': self._reloads, 'reload_errors': self._reload_errors})
+        return data
+
+    def _maybe_reload(self):
+        if self._reload_lock.locked():
+            return
+        self.reload(force=False)
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for filename in CATALOG_FILES.values():
+            try:
+                mtimes[filename] = os.stat(os.path.join(self.data_dir, filename)).st_mtime_ns
+            except OSError:
+                mtimes[filename] = None
+        return mtimes
+
+    def _load_file(self, name, filename):
+        with open(os.path.join(self.data_dir, filename), encoding='utf-8') as f:
+            items = json.load(f)
+        if not isinstance(items, list):
+            raise CatalogError(f'{filename}: phải là một danh sách')
+
+        seen = set()
+        for item in items:
+            missing = [field for field in REQUIRED_FIELDS[name] if field not in item]
+            if missing:
+                raise CatalogError(f'{filename}: mục {item.get("id")} thiếu {", ".join(missing)}')
+            if item['id'] in seen:
+                raise CatalogError(f'{filename}: trùng id {item["id"]}')
+            seen.add(item['id'])
+        return items
+
+
+catalog = Catalog()
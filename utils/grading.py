@@ -0,0 +1,257 @@
+import hashlib
+import json
+import secrets
+import threading
+import time
+
+from .sandbox import sandbox_pool
+
+RESULT_MARKER = '__CODEQUEST_GRADING__'
+# stderr của bài nộp có thể tới SANDBOX_MAX_OUTPUT (1 MiB); báo lỗi chỉ giữ phần đầu
+MAX_ERROR_CHARS = 2000
+
+
+class GradingError(RuntimeError):
+    """Không chấm được bài (lời giải mẫu của thử thách chạy lỗi)"""
+
+# Script chạy trong một sandbox worker: exec bài làm một lần rồi chạy lần lượt
+# mọi test case, in kết quả (JSON) sau RESULT_MARKER + nonce ở dòng cuối cùng.
+# Nonce sinh mới cho từng lần chạy và được gửi qua stdin (không nằm trong mã
+# harness), harness đọc nó trước khi chạy bài nộp: bài nộp in giả RESULT_MARKER
+# rồi thoát ngang không được tính là kết quả.
+HARNESS_TEMPLATE = '''
+import io as _io
+import json as _json
+import sys as _sys
+import time as _time
+
+
+def _cq_main(payload):
+    out = _sys.stdout
+    marker = MARKER + _sys.stdin.readline().strip() + ':'
+    limit = payload['output_limit']
+    try:
+        compiled = compile(payload['code'], '<submission>', 'exec')
+        compile_error = None
+    except SyntaxError as e:
+        compiled = None
+        compile_error = 'SyntaxError: ' + str(e.msg)
+
+    def run(fn, stdin):
+        buffer = _io.StringIO()
+        _sys.stdin = _io.StringIO(stdin or '')
+        _sys.stdout = buffer
+        value = error = None
+        started = _time.perf_counter()
+        try:
+            value = fn()
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = 'SystemExit: ' + str(e.code)
+        except BaseException as e:
+            error = type(e).__name__ + ': ' + str(e)
+        finally:
+            elapsed = _time.perf_counter() - started
+            _sys.stdout = out
+        return {
+            'stdout': buffer.getvalue()[:limit],
+            'result': None if value is None else repr(value)[:limit],
+            'error': error,
+            'time': elapsed
+        }
+
+    results = []
+    namespace = None
+    setup_error = None
+    for case in payload['cases']:
+        if compiled is None:
+            results.append({'stdout': '', 'result': None, 'error': compile_error, 'time': 0.0})
+            continue
+
+        if 'call' not in case:
+            program_namespace = {'__name__': '__main__'}
+            results.append(run(lambda: exec(compiled, program_namespace), case.get('stdin', '')))
+            continue
+
+        if namespace is None:
+            namespace = {'__name__': '__main__'}
+            setup_error = run(lambda: exec(compiled, namespace), '')['error']
+        if setup_error:
+            results.append({'stdout': '', 'result': None, 'error': setup_error, 'time': 0.0})
+            continue
+
+        try:
+            expression = compile(case['call'], '<test>', 'eval')
+        except SyntaxError as e:
+            results.append({'stdout': '', 'result': None, 'error': 'SyntaxError: ' + str(e.msg), 'time': 0.0})
+            continue
+        results.append(run(lambda: eval(expression, namespace), case.get('stdin', '')))
+
+    out.write('\\n' + marker + _json.dumps(results) + '\\n')
+
+
+MARKER = __MARKER__
+_cq_main(_json.loads(__PAYLOAD__))
+'''
+
+
+def build_harness(code, test_cases, output_limit=10000):
+    payload = json.dumps({'code': code, 'cases': test_cases, 'output_limit': output_limit})
+    return (HARNESS_TEMPLATE
+            .replace('__MARKER__', repr(RESULT_MARKER))
+            .replace('__PAYLOAD__', repr(payload)))
+
+
+def _normalize_output(text):
+    return '\n'.join(line.rstrip() for line in (text or '').splitlines()).rstrip('\n')
+
+
+def truncate_error(error, limit=MAX_ERROR_CHARS):
+    """Cắt thông báo lỗi quá dài trước khi trả về client / lưu vào trận đấu"""
+    if not error or len(error) <= limit:
+        return error
+    return error[:limit] + f'\n... (đã cắt {len(error) - limit} ký tự)'
+
+
+def _error_type(error):
+    return error.split(':', 1)[0] if error else None
+
+
+class GradeReport:
+    """Kết quả chấm một bài nộp trên toàn bộ test case"""
+
+    __slots__ = ('cases', 'duration', 'timed_out', 'error', 'exec_time', 'cpu_time')
+
+    def __init__(self, cases, duration=0.0, timed_out=False, error=None, exec_time=None, cpu_time=None):
+        self.cases = cases
+        self.duration = duration
+        # Thời gian chạy và thời gian CPU đo trong sandbox worker (không tính thời gian chờ worker)
+        self.exec_time = exec_time
+        self.cpu_time = cpu_time
+        self.timed_out = timed_out
+        self.error = error
+
+    @property
+    def passed(self):
+        return bool(self.cases) and all(case['passed'] for case in self.cases)
+
+    def to_dict(self):
+        return {
+            'passed': self.passed,
+            'passed_count': sum(1 for case in self.cases if case['passed']),
+            'total': len(self.cases),
+            'duration': self.duration,
+            'exec_time': self.exec_time,
+            'cpu_time': self.cpu_time,
+            'timed_out': self.timed_out,
+            'error': self.error,
+            'cases': self.cases
+        }
+
+
+class GradingEngine:
+    """Chấm bài bằng cách chạy bài nộp MỘT lần trong một sandbox worker cho
+    cả loạt test case, so sánh với output của lời giải mẫu.
+
+    Output của lời giải mẫu được cache theo (code mẫu, test case) nên mỗi
+    thử thách chỉ phải chạy lời giải mẫu một lần.
+    """
+
+    def __init__(self, pool=None, timeout=5, output_limit=10000):
+        self.pool = pool or sandbox_pool
+        self.timeout = timeout
+        self.output_limit = output_limit
+
+        self._lock = threading.Lock()
+        self._references = {}
+        self._reference_hits = 0
+        self._reference_misses = 0
+        self._gradings = 0
+
+    def run_cases(self, code, test_cases, timeout=None, deadline=None):
+        """Chạy code trên toàn bộ test case; trả về (danh sách kết quả | None, ExecutionResult)"""
+        nonce = secrets.token_hex(16)
+        result = self.pool.run(build_harness(code, test_cases, self.output_limit),
+                               timeout=timeout or self.timeout, stdin=nonce + '\n', deadline=deadline)
+        marker = f'{RESULT_MARKER}{nonce}:'
+        marker_at = result.stdout.rfind(marker)
+        if result.timed_out or marker_at < 0:
+            return None, result
+        try:
+            outputs = json.loads(result.stdout[marker_at + len(marker):].strip())
+        except ValueError:
+            return None, result
+        if not isinstance(outputs, list) or len(outputs) != len(test_cases):
+            return None, result
+        return outputs, result
+
+    def reference_outputs(self, reference_code, test_cases):
+        """Output của lời giải mẫu (chỉ chạy lần đầu, sau đó lấy từ cache)"""
+        key = hashlib.sha256(json.dumps([reference_code, test_cases]).encode('utf-8')).hexdigest()
+        with self._lock:
+            outputs = self._references.get(key)
+            if outputs is not None:
+                self._reference_hits += 1
+                return outputs
+            self._reference_misses += 1
+
+        outputs, result = self.run_cases(reference_code, test_cases)
+        if outputs is None:
+            raise GradingError(truncate_error(f'Lời giải mẫu chạy lỗi: {result.stderr or "timed out"}'))
+        with self._lock:
+            self._references[key] = outputs
+        return outputs
+
+    def grade(self, code, reference_code, test_cases, timeout=None, deadline=None):
+        """Chấm bài nộp, trả về GradeReport với kết quả pass/fail và thời gian từng case.
+
+        `deadline` (time.monotonic()) giới hạn cả thời gian chờ sandbox worker.
+        """
+        expected = self.reference_outputs(reference_code, test_cases)
+        started = time.monotonic()
+        actual, result = self.run_cases(code, test_cases, timeout, deadline)
+        duration = time.monotonic() - started
+        with self._lock:
+            self._gradings += 1
+
+        if actual is None:
+            error = 'Code execution timed out' if result.timed_out else (result.stderr or 'Execution failed')
+            cases = [{
+                'name': case.get('name') or case.get('call') or f'Test {index + 1}',
+                'passed': False,
+                'time': None
+            } for index, case in enumerate(test_cases)]
+            return GradeReport(cases, duration, timed_out=result.timed_out, error=truncate_error(error),
+                               exec_time=result.duration, cpu_time=result.cpu_time)
+
+        cases = []
+        for index, (case, want, got) in enumerate(zip(test_cases, expected, actual)):
+            passed = (
+                _normalize_output(want['stdout']) == _normalize_output(got['stdout'])
+                and want['result'] == got['result']
+                and _error_type(want['error']) == _error_type(got['error'])
+            )
+            report = {
+                'name': case.get('name') or case.get('call') or f'Test {index + 1}',
+                'passed': passed,
+                'time': round(got['time'], 6)
+            }
+            if not passed:
+                report['expected'] = want['result'] if 'call' in case else want['stdout']
+                report['actual'] = got['result'] if 'call' in case else got['stdout']
+                if got['error']:
+                    report['error'] = truncate_error(got['error'])
+            cases.append(report)
+        return GradeReport(cases, duration, exec_time=result.duration, cpu_time=result.cpu_time)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'gradings': self._gradings,
+                'reference_cache_entries': len(self._references),
+                'reference_cache_hits': self._reference_hits,
+                'reference_cache_misses': self._reference_misses
+            }
+
+
+grading_engine = GradingEngine()
@@ -1,6 +1,8 @@
+import json
+import math
 from functools import wraps
 from flask import session, jsonify, request
-from database.models import User, Session as UserSession
+from .auth_cache import auth_cache
 
 def login_required(f):
     """Decorator kiểm tra đăng nhập"""
@@ -12,19 +14,12 @@ def login_required(f):
         if not user_id or not session_token:
             return jsonify({'success': False, 'message': 'Vui lòng đăng nhập'}), 401
         
-        # Kiểm tra session
-        user_session = UserSession.query.filter_by(
-            user_id=user_id,
-            session_token=session_token
-        ).first()
-        
-        if not user_session or user_session.is_expired():
+        # Kiểm tra session (qua cache, chỉ chạm database khi cache hết hạn)
+        user, reason = auth_cache.validate(user_id, session_token)
+        if reason == 'expired':
             session.clear()
             return jsonify({'success': False, 'message': 'Phiên làm việc đã hết hạn'}), 401
-        
-        # Kiểm tra user
-        user = User.query.get(user_id)
-        if not user or not user.is_active:
+        if user is None:
             session.clear()
             return jsonify({'success': False, 'message': 'Tài khoản không hợp lệ'}), 401
         
@@ -44,4 +39,46 @@ def format_response(success=True, message='', data=None, status_code=200):
     if data is not None:
         response['data'] = data
     
-    return jsonify(response), status_code
\ No newline at end of file
+    return jsonify(response), status_code
+
+def sse_event(event, data, event_id=None):
+    """Định dạng một sự kiện Server-Sent Events"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def parse_bool(value, default=False):
+    """Đọc cờ true/false từ JSON/query string ("false", "0", "no", "off" là False)"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('', '0', 'false', 'no', 'off'):
+            return False
+        return default
+    return bool(value)
+
+def parse_number(value, default, minimum=None, maximum=None, integer=False):
+    """Đọc số từ JSON/query string; ValueError nếu không phải số hữu hạn
+    (hoặc số nguyên khi integer=True) hay nằm ngoài [minimum, maximum]"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError('phải là số')
+    try:
+        if integer:
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError
+            number = int(value)
+        else:
+            number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('phải là số nguyên' if integer else 'phải là số') from None
+    if not math.isfinite(number):
+        raise ValueError('phải là số hữu hạn')
+    if minimum is not None and number < minimum:
+        raise ValueError(f'phải >= {minimum}')
+    if maximum is not None and number > maximum:
+        raise ValueError(f'phải <= {maximum}')
+    return number
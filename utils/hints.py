@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .catalog import DATA_DIR
+
+HINTS_FILE = 'hints.json'
+# Đổi prompt thì tăng số này: mọi gợi ý cũ thành lỗi thời và được sinh lại
+PROMPT_VERSION = 1
+
+# Loại nội dung -> (thuộc tính danh sách trong CatalogSnapshot, các trường dùng để sinh gợi ý)
+HINT_KINDS = {
+    'quiz': ('quiz_questions', ('question', 'options', 'correct')),
+    'speed': ('speed_challenges', ('title', 'description', 'expected_code')),
+    'debugging': ('debugging_challenges', ('title', 'buggy_code', 'correct_code', 'error_type')),
+}
+
+HINT_FORMAT = """Trả về JSON format:
+{
+  "hint": "Gợi ý ngắn (1-2 câu), KHÔNG nói thẳng đáp án",
+  "explanation": "Giải thích đầy đủ đáp án/lời giải (tối đa 5 câu)"
+}"""
+
+
+def hint_key(kind, item_id):
+    return f'{kind}:{item_id}'
+
+
+def content_hash(kind, item):
+    """Hash các trường của mục catalog mà gợi ý phụ thuộc vào"""
+    fields = HINT_KINDS[kind][1]
+    raw = json.dumps([PROMPT_VERSION] + [item.get(field) for field in fields], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def build_prompt(kind, item):
+    """Prompt sinh gợi ý + lời giải thích cho một mục catalog"""
+    intro = 'Bạn là trợ giảng lập trình Python của CodeQuest. Trả lời bằng tiếng Việt.\n\n'
+    if kind == 'quiz':
+        options = '\n'.join(f'{chr(65 + i)}. {option}' for i, option in enumerate(item['options']))
+        body = (
+            f'CÂU HỎI TRẮC NGHIỆM:\n{item["question"]}\n{options}\n\n'
+            f'ĐÁP ÁN ĐÚNG: {chr(65 + item["correct"])}. {item["options"][item["correct"]]}'
+        )
+    elif kind == 'speed':
+        body = (
+            f'THỬ THÁCH: {item["title"]}\n{item.get("description", "")}\n\n'
+            f'LỜI GIẢI MẪU:\n```\n{item["expected_code"]}\n```'
+        )
+    else:
+        body = (
+            f'BÀI TÌM LỖI: {item["title"]} (loại lỗi: {item.get("error_type", "không rõ")})\n\n'
+            f'CODE LỖI:\n```\n{item["buggy_code"]}\n```\n\n'
+            f'CODE ĐÚNG:\n```\n{item["correct_code"]}\n```'
+        )
+    return f'{intro}{body}\n\n{HINT_FORMAT}'
+
+
+def parse_hint(text):
+    """Đọc {hint, explanation} từ câu trả lời của AI; sai định dạng thì ValueError"""
+    match = re.search(r'\{[\s\S]*\}', text or '')
+    if not match:
+        raise ValueError('Không tìm thấy JSON trong câu trả lời')
+    data = json.loads(match.group(0))
+    hint = str(data.get('hint') or '').strip()
+    explanation = str(data.get('explanation') or '').strip()
+    if not hint or not explanation:
+        raise ValueError('Thiếu hint hoặc explanation')
+    return {'hint': hint, 'explanation': explanation}
+
+
+class HintStore:
+    """Gợi ý/lời giải thích sinh sẵn bởi scripts/pregenerate_hints.py (data/hints.json).
+
+    Mỗi mục lưu hash nội dung của câu hỏi/thử thách lúc sinh; nội dung đã
+    sửa (hoặc PROMPT_VERSION đã đổi) thì mục đó bị coi là chưa có. File được
+    load lại khi mtime đổi (kiểm tra tối đa mỗi `check_interval` giây).
+    """
+
+    def __init__(self, path=None, check_interval=2.0):
+        self.path = path or os.path.join(DATA_DIR, HINTS_FILE)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = 0
+        self._mtime = None
+        self._last_check = 0.0
+
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình HINTS_* từ Flask app"""
+        app.config.setdefault('HINTS_PATH', os.environ.get('HINTS_PATH', os.path.join(app.config.get('CATALOG_DIR', DATA_DIR), HINTS_FILE)))
+        app.config.setdefault('HINTS_CHECK_INTERVAL', float(os.environ.get('HINTS_CHECK_INTERVAL', 2)))
+
+        self.path = app.config['HINTS_PATH']
+        self.check_interval = app.config['HINTS_CHECK_INTERVAL']
+        self._mtime = None
+        self._last_check = 0.0
+        app.extensions['hints'] = self
+
+    def get(self, kind, item):
+        """Gợi ý sinh sẵn còn khớp nội dung hiện tại của `item`, hoặc None"""
+        self._maybe_reload()
+        with self._lock:
+            entry = self._entries.get(hint_key(kind, item['id']))
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.get('content_hash') != content_hash(kind, item):
+                self._stale += 1
+                return None
+            self._hits += 1
+            return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale': self._stale
+            }
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        if mtime == self._mtime:
+            return
+
+        entries, version = {}, 0
+        if mtime:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                entries, version = data['items'], data['version']
+            except (OSError, ValueError, KeyError) as e:
+                # Giữ gợi ý cũ, không đọc lại file lỗi cho tới khi nó đổi tiếp
+                print(f"❌ Hints reload error: {e}")
+                self._mtime = mtime
+                return
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._mtime = mtime
+
+
+hint_store = HintStore()
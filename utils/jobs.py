@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+
+
+class JobQueueFull(Exception):
+    """Hàng đợi job đã đầy"""
+
+
+class Job:
+    """Một job chạy nền; trạng thái: queued -> running -> done | failed"""
+
+    __slots__ = ('id', 'kind', 'priority', 'status', 'result', 'error',
+                 'created_at', 'started_at', 'finished_at', '_fn', '_done')
+
+    def __init__(self, fn, kind='job', priority=5):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._fn = fn
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Chờ job xong (long-poll); trả về True nếu đã xong"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'priority': self.priority,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_wait': (self.started_at - self.created_at) if self.started_at else None
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobScheduler:
+    """Scheduler job có giới hạn: `concurrency` luồng chạy, hàng đợi ưu tiên
+    (priority nhỏ chạy trước, cùng priority thì FIFO) dài tối đa `max_queue`.
+    Job đã xong được giữ `result_ttl` giây để client lấy kết quả.
+    """
+
+    def __init__(self, concurrency=4, max_queue=256, result_ttl=300):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._threads = []
+        self._running = 0
+        self._closed = False
+        self._last_purge = 0.0
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def init_app(self, app):
+        """Đọc cấu hình JOBS_* từ Flask app"""
+        # Mặc định chạy song song đúng bằng số sandbox worker (khi đã cấu hình SANDBOX_POOL_SIZE)
+        app.config.setdefault('JOBS_CONCURRENCY', int(os.environ.get(
+            'JOBS_CONCURRENCY', app.config.get('SANDBOX_POOL_SIZE', 4))))
+        app.config.setdefault('JOBS_MAX_QUEUE', int(os.environ.get('JOBS_MAX_QUEUE', 256)))
+        app.config.setdefault('JOBS_RESULT_TTL', int(os.environ.get('JOBS_RESULT_TTL', 300)))
+
+        self.concurrency = app.config['JOBS_CONCURRENCY']
+        self.max_queue = app.config['JOBS_MAX_QUEUE']
+        self.result_ttl = app.config['JOBS_RESULT_TTL']
+        app.extensions['job_scheduler'] = self
+
+    def submit(self, fn, kind='job', priority=5):
+        """Đưa job vào hàng đợi, trả về Job ngay lập tức"""
+        job = Job(fn, kind=kind, priority=priority)
+        with self._cond:
+            if self._closed:
+                raise JobQueueFull('Scheduler đã dừng')
+            self._purge_expired()
+            if len(self._heap) >= self.max_queue:
+                self._rejected += 1
+                raise JobQueueFull('Hàng đợi đang đầy, vui lòng thử lại sau')
+
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._submitted += 1
+            self._ensure_threads()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            oldest = min((job.created_at for _, _, job in self._heap), default=None)
+            started = self._completed + self._failed + self._running
+            return {
+                'concurrency': self.concurrency,
+                'queued': len(self._heap),
+                'running': self._running,
+                'max_queue': self.max_queue,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'wait_avg': round(self._wait_total / started, 6) if started else 0.0,
+                'wait_max': round(self._wait_max, 6),
+                'oldest_queued_age': round(now - oldest, 6) if oldest else 0.0
+            }
+
+    def _ensure_threads(self):
+        while len(self._threads) < self.concurrency:
+            thread = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f'job-worker-{len(self._threads)}')
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                job.status = 'running'
+                job.started_at = time.time()
+                wait = job.started_at - job.created_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._running += 1
+
+            try:
+                result = job._fn()
+                status, error = 'done', None
+            except Exception as e:
+                result, status, error = None, 'failed', str(e)
+
+            with self._cond:
+                job.result = result
+                job.error = error
+                job.status = status
+                job.finished_at = time.time()
+                job._fn = None
+                self._running -= 1
+                if status == 'done':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            job._done.set()
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < 1:
+            return
+        self._last_purge = now
+        cutoff = now - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_scheduler = JobScheduler()
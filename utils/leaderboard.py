@@ -0,0 +1,518 @@
+import heapq
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from database.pool import db_pool
+
+GAMES = ('quiz', 'speed_coding', 'debugging')
+
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400}
+
+# Cửa sổ thời gian -> (loại bucket, số bucket gần nhất được gộp, tính cả bucket hiện tại)
+WINDOWS = {
+    'daily': ('hour', 24),
+    'weekly': ('day', 7),
+    'monthly': ('day', 30)
+}
+
+# Số bucket giữ lại cho mỗi loại, bucket cũ hơn bị loại khỏi bộ nhớ
+BUCKET_RETENTION = {
+    unit: max(span for window_unit, span in WINDOWS.values() if window_unit == unit)
+    for unit in BUCKET_SECONDS
+}
+
+# Database lỗi lúc dựng bảng xếp hạng thì chờ chừng này giây rồi mới thử lại
+REBUILD_RETRY_SECONDS = 5
+
+# id của game_scores bị nhảy cóc (transaction ghi chưa commit, hoặc đã rollback) được
+# đồng bộ thử lại trong chừng này giây, quá hạn coi như không tồn tại
+SYNC_GAP_SECONDS = 30
+# Số id gần nhất được theo dõi khi tìm id bị nhảy cóc
+SYNC_GAP_WINDOW = 256
+SYNC_BATCH_SIZE = 1000
+
+
+def bucket_index(unit, timestamp=None):
+    return int((time.time() if timestamp is None else timestamp) // BUCKET_SECONDS[unit])
+
+
+class LeaderboardEntry:
+    __slots__ = ('user_id', 'score', 'games_played')
+
+    def __init__(self, user_id, score=0.0, games_played=0):
+        self.user_id = user_id
+        self.score = score
+        self.games_played = games_played
+
+    @property
+    def sort_key(self):
+        # Điểm cao đứng trước; cùng điểm thì xếp theo user_id cho ổn định
+        return (-self.score, self.user_id)
+
+    def to_dict(self, rank=None, name=None):
+        data = {
+            'name': name or 'Người chơi ẩn danh',
+            'score': round(self.score),
+            'games_played': self.games_played
+        }
+        if rank is not None:
+            data['rank'] = rank
+        return data
+
+
+class _SkipNode:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, height):
+        self.key = key
+        self.next = [None] * height
+        # width[i]: số vị trí nhảy qua khi đi theo next[i] (next[i] là None thì tính tới cuối danh sách + 1)
+        self.width = [1] * height
+
+
+class _SkipList:
+    """Tập khóa có thứ tự kiểu indexable skip list: thêm, xóa và tìm thứ hạng
+    O(log n) kỳ vọng, duyệt k khóa đầu O(k). Khóa không được trùng nhau.
+    """
+
+    MAX_HEIGHT = 32
+
+    __slots__ = ('head', 'size')
+
+    def __init__(self):
+        self.head = _SkipNode(None, self.MAX_HEIGHT)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _path(self, key):
+        """Node đứng ngay trước `key` ở mỗi tầng và vị trí (0 = head) của node đó"""
+        chain = [None] * self.MAX_HEIGHT
+        steps = [0] * self.MAX_HEIGHT
+        node, position = self.head, 0
+        for level in reversed(range(self.MAX_HEIGHT)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            steps[level] = position
+        return chain, steps
+
+    def add(self, key):
+        chain, steps = self._path(key)
+        position = steps[0] + 1
+        height = 1
+        while height < self.MAX_HEIGHT and random.random() < 0.5:
+            height += 1
+        node = _SkipNode(key, height)
+        for level in range(height):
+            before = chain[level]
+            node.next[level] = before.next[level]
+            before.next[level] = node
+            node.width[level] = before.width[level] - (position - 1 - steps[level])
+            before.width[level] = position - steps[level]
+        for level in range(height, self.MAX_HEIGHT):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._path(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            before = chain[level]
+            before.width[level] += node.width[level] - 1
+            before.next[level] = node.next[level]
+        for level in range(len(node.next), self.MAX_HEIGHT):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """Số khóa nhỏ hơn `key` (tương đương bisect_left trên list đã sắp xếp)"""
+        return self._path(key)[1][0]
+
+    def first(self, limit):
+        keys = []
+        node = self.head.next[0]
+        while node is not None and len(keys) < limit:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class _Ranking:
+    """Tổng điểm theo user, giữ khóa (-điểm, user_id) trong skip list luôn được
+    sắp xếp (tương đương sorted set): cập nhật điểm và tìm thứ hạng O(log n),
+    top-K không cần sắp xếp lại.
+    """
+
+    __slots__ = ('entries', 'order')
+
+    def __init__(self):
+        self.entries = {}
+        self.order = _SkipList()
+
+    def add(self, user_id, score, games_played=1):
+        entry = self.entries.get(user_id)
+        if entry is None:
+            entry = self.entries[user_id] = LeaderboardEntry(user_id)
+        else:
+            self.order.remove(entry.sort_key)
+        entry.score += score
+        entry.games_played += games_played
+        self.order.add(entry.sort_key)
+        return entry
+
+    def top(self, limit):
+        return [(rank, self.entries[user_id])
+                for rank, (_, user_id) in enumerate(self.order.first(limit), start=1)]
+
+    def rank_of(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        return self.order.rank(entry.sort_key) + 1, entry
+
+
+class Leaderboard:
+    """Bảng xếp hạng tổng điểm, cập nhật tăng dần theo từng kết quả game.
+
+    Kết quả được ghi vào bảng game_scores. Trong bộ nhớ giữ:
+    - bảng xếp hạng toàn thời gian (tổng và theo từng game), luôn được sắp xếp
+    - điểm gộp theo bucket giờ/ngày cho các cửa sổ daily/weekly/monthly; truy
+      vấn một cửa sổ chỉ gộp vài bucket, phần bucket đã đóng được cache tới khi
+      sang bucket mới, bucket hết hạn bị loại bỏ
+
+    Mỗi worker process giữ bản riêng trong bộ nhớ. Kết quả do process khác ghi
+    được đọc thêm từ game_scores theo id (chỉ các dòng mới) tối đa mỗi
+    `sync_interval` giây, khi có request đọc/ghi bảng xếp hạng; mỗi dòng chỉ
+    được cộng một lần, kể cả dòng do chính process này ghi.
+    """
+
+    def __init__(self, pool=None, sync_interval=2.0):
+        self.pool = pool or db_pool
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._retry_at = 0.0
+        self._sync_at = 0.0
+        self._synced = 0
+        self._sync_errors = 0
+        self._reset()
+
+    def init_app(self, app):
+        """Đọc cấu hình LEADERBOARD_* từ Flask app"""
+        app.config.setdefault('LEADERBOARD_SYNC_INTERVAL', float(os.environ.get('LEADERBOARD_SYNC_INTERVAL', 2)))
+
+        self.sync_interval = app.config['LEADERBOARD_SYNC_INTERVAL']
+        app.extensions['leaderboard'] = self
+
+    def record(self, user_id, game, score, name=None):
+        """Ghi một kết quả game vào database và cập nhật bảng xếp hạng.
+
+        Trả về False (bảng xếp hạng giữ nguyên) nếu không ghi được vào database.
+        """
+        score = float(score or 0)
+        self.ensure_loaded()
+        if not name:
+            name = self._names.get(user_id)
+        try:
+            name, row_id = self._persist(user_id, game, score, name)
+        except Exception as e:
+            # Không cộng điểm chỉ có trong bộ nhớ: lần rebuild sau sẽ làm nó biến mất
+            print(f"Leaderboard persist error: {e}")
+            return False
+
+        with self._lock:
+            if name:
+                self._names[user_id] = name
+            # Lần đồng bộ chạy song song có thể đã cộng dòng này rồi
+            if self._claim(row_id):
+                self._apply(user_id, game, score, time.time())
+        return True
+
+    def top(self, limit=10, window='all', game=None):
+        """Top `limit` người chơi trong cửa sổ thời gian (và game) cho trước"""
+        self.ensure_loaded()
+        with self._lock:
+            if window == 'all':
+                return [entry.to_dict(rank, self._names.get(entry.user_id))
+                        for rank, entry in self._ranking(game).top(limit)]
+
+            totals = self._window_totals(window, game)
+            best = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1][0], item[0]))
+            return [LeaderboardEntry(user_id, score, games_played).to_dict(rank, self._names.get(user_id))
+                    for rank, (user_id, (score, games_played)) in enumerate(best, start=1)]
+
+    def rank_of(self, user_id, window='all', game=None):
+        """Thứ hạng (bắt đầu từ 1) và thông tin của user, None nếu chưa chơi"""
+        self.ensure_loaded()
+        with self._lock:
+            if window == 'all':
+                found = self._ranking(game).rank_of(user_id)
+                if found is None:
+                    return None
+                rank, entry = found
+                return entry.to_dict(rank, self._names.get(user_id))
+
+            totals = self._window_totals(window, game)
+            if user_id not in totals:
+                return None
+            score, games_played = totals[user_id]
+            key = (-score, user_id)
+            rank = 1 + sum(1 for other, (other_score, _) in totals.items() if (-other_score, other) < key)
+            return LeaderboardEntry(user_id, score, games_played).to_dict(rank, self._names.get(user_id))
+
+    def ensure_loaded(self):
+        """Dựng bảng xếp hạng nếu chưa có (lần trước lỗi thì thử lại sau REBUILD_RETRY_SECONDS),
+        đã có thì đồng bộ kết quả mới của các process khác khi tới hạn"""
+        if not self._loaded and time.monotonic() >= self._retry_at:
+            with self._lock:
+                if not self._loaded and time.monotonic() >= self._retry_at:
+                    self.rebuild()
+        elif self._loaded and time.monotonic() >= self._sync_at:
+            self.sync()
+
+    def sync(self):
+        """Cộng các dòng game_scores mới (thường do process khác ghi) từ lần dựng/đồng bộ
+        trước; trả về số dòng được cộng"""
+        with self._lock:
+            if time.monotonic() < self._sync_at:
+                return 0
+            self._sync_at = time.monotonic() + self.sync_interval
+            after, gaps = self._last_id, sorted(self._gaps)
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT s.id, s.user_id, u.full_name, s.game, s.score,
+                           EXTRACT(EPOCH FROM s.created_at AT TIME ZONE current_setting('TimeZone'))
+                    FROM game_scores s LEFT JOIN users u ON u.id = s.user_id
+                    WHERE s.id > %s OR s.id = ANY(%s::int[])
+                    ORDER BY s.id
+                    LIMIT %s
+                ''', (after, gaps, SYNC_BATCH_SIZE))
+                rows = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            print(f"Leaderboard sync error: {e}")
+            with self._lock:
+                self._sync_errors += 1
+            return 0
+
+        now = time.monotonic()
+        applied = 0
+        with self._lock:
+            for row_id, user_id, name, game, score, created_at in rows:
+                if name:
+                    self._names[user_id] = name
+                if self._claim(row_id):
+                    self._apply(user_id, game, float(score), float(created_at))
+                    applied += 1
+                if row_id > self._last_id:
+                    for missing in range(max(self._last_id + 1, row_id - SYNC_GAP_WINDOW), row_id):
+                        if missing not in self._seen:
+                            self._gaps[missing] = now + SYNC_GAP_SECONDS
+                    self._last_id = row_id
+            self._gaps = {row_id: expires for row_id, expires in self._gaps.items() if expires > now}
+            self._seen = {row_id for row_id in self._seen if row_id > self._last_id}
+            self._synced += applied
+            if len(rows) == SYNC_BATCH_SIZE:
+                # Còn dòng chưa đọc: lần gọi sau đọc tiếp ngay
+                self._sync_at = 0.0
+        return applied
+
+    def rebuild(self):
+        """Dựng lại bảng xếp hạng và các bucket thời gian từ bảng game_scores.
+
+        Database lỗi thì giữ nguyên dữ liệu trong bộ nhớ và trả về None; nếu
+        chưa dựng được lần nào, ensure_loaded sẽ thử lại.
+        """
+        totals, buckets = [], {unit: [] for unit in BUCKET_SECONDS}
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                # Mọi truy vấn dưới đây đọc cùng một snapshot, khớp với last_id
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM game_scores')
+                last_id = cursor.fetchone()[0]
+                # id gần nhất chưa thấy: transaction ghi có thể chưa commit lúc chụp snapshot
+                cursor.execute('SELECT id FROM game_scores WHERE id > %s', (last_id - SYNC_GAP_WINDOW,))
+                recent = {row[0] for row in cursor.fetchall()}
+                cursor.execute('''
+                    SELECT s.user_id, u.full_name, s.game, SUM(s.score), COUNT(*)
+                    FROM game_scores s LEFT JOIN users u ON u.id = s.user_id
+                    GROUP BY s.user_id, u.full_name, s.game
+                ''')
+                totals = cursor.fetchall()
+                # Chỉ đọc phần còn nằm trong các cửa sổ (dùng index created_at)
+                for unit, seconds in BUCKET_SECONDS.items():
+                    cursor.execute('''
+                        SELECT FLOOR(EXTRACT(EPOCH FROM created_at AT TIME ZONE current_setting('TimeZone')) / %s)::BIGINT AS bucket,
+                               user_id, game, SUM(score), COUNT(*)
+                        FROM game_scores
+                        WHERE created_at >= LOCALTIMESTAMP - %s * INTERVAL '1 second'
+                        GROUP BY bucket, user_id, game
+                        ORDER BY bucket
+                    ''', (seconds, seconds * BUCKET_RETENTION[unit]))
+                    buckets[unit] = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            print(f"Leaderboard rebuild error: {e}")
+            self._retry_at = time.monotonic() + REBUILD_RETRY_SECONDS
+            return None
+
+        with self._lock:
+            self._reset()
+            self._last_id = last_id
+            gap_expires = time.monotonic() + SYNC_GAP_SECONDS
+            self._gaps = {row_id: gap_expires for row_id in range(max(1, last_id - SYNC_GAP_WINDOW + 1), last_id)
+                          if row_id not in recent}
+            self._sync_at = time.monotonic() + self.sync_interval
+            for user_id, name, game, score, games_played in totals:
+                if name:
+                    self._names[user_id] = name
+                self._add_total(user_id, game, float(score), games_played)
+            for unit, rows in buckets.items():
+                for index, user_id, game, score, games_played in rows:
+                    self._add_bucket(unit, int(index), user_id, game, float(score), games_played)
+            self._loaded = True
+        return len(self._overall.entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'players': len(self._overall.entries),
+                'loaded': self._loaded,
+                'last_id': self._last_id,
+                'pending_gaps': len(self._gaps),
+                'synced': self._synced,
+                'sync_errors': self._sync_errors,
+                'buckets': {unit: len(buckets) for unit, buckets in self._buckets.items()},
+                'window_cache_hits': self._window_hits,
+                'window_cache_misses': self._window_misses
+            }
+
+    def _reset(self):
+        self._names = {}
+        self._overall = _Ranking()
+        self._by_game = {}
+        self._buckets = {unit: OrderedDict() for unit in BUCKET_SECONDS}
+        self._merged = {}
+        # Dòng game_scores đã cộng vào bộ nhớ: mọi id <= _last_id trừ các id trong
+        # _gaps (id -> hạn chờ theo time.monotonic()), cộng thêm các id trong _seen
+        self._last_id = 0
+        self._gaps = {}
+        self._seen = set()
+        self._window_hits = 0
+        self._window_misses = 0
+
+    def _ranking(self, game):
+        if game is None:
+            return self._overall
+        return self._by_game.get(game) or _Ranking()
+
+    def _claim(self, row_id):
+        """True (và đánh dấu đã cộng) nếu dòng game_scores `row_id` chưa được cộng vào bộ nhớ"""
+        if row_id <= self._last_id:
+            return self._gaps.pop(row_id, None) is not None
+        if row_id in self._seen:
+            return False
+        self._seen.add(row_id)
+        return True
+
+    def _apply(self, user_id, game, score, timestamp):
+        self._add_total(user_id, game, score, 1)
+        for unit in BUCKET_SECONDS:
+            self._add_bucket(unit, bucket_index(unit, timestamp), user_id, game, score, 1)
+
+    def _add_total(self, user_id, game, score, games_played):
+        self._overall.add(user_id, score, games_played)
+        ranking = self._by_game.get(game)
+        if ranking is None:
+            ranking = self._by_game[game] = _Ranking()
+        ranking.add(user_id, score, games_played)
+
+    def _add_bucket(self, unit, index, user_id, game, score, games_played):
+        buckets = self._buckets[unit]
+        bucket = buckets.get(index)
+        if bucket is None:
+            newest = next(reversed(buckets), None)
+            if newest is not None and index < newest:
+                # Kết quả đồng bộ muộn thuộc bucket cũ hơn bucket mới nhất: chèn đúng thứ tự
+                if index <= newest - BUCKET_RETENTION[unit]:
+                    return
+                bucket = buckets[index] = {}
+                for key in sorted(buckets):
+                    buckets.move_to_end(key)
+            else:
+                bucket = buckets[index] = {}
+                self._evict(unit, index)
+        if index < bucket_index(unit):
+            # Bucket đã đóng thay đổi: phần gộp đã cache không còn đúng
+            self._merged.clear()
+        totals = bucket.get((user_id, game))
+        if totals is None:
+            bucket[(user_id, game)] = [score, games_played]
+        else:
+            totals[0] += score
+            totals[1] += games_played
+
+    def _evict(self, unit, current):
+        buckets = self._buckets[unit]
+        oldest = current - BUCKET_RETENTION[unit]
+        while buckets and next(iter(buckets)) <= oldest:
+            buckets.popitem(last=False)
+
+    def _merge(self, buckets, indexes, game, into):
+        for index in indexes:
+            for (user_id, bucket_game), (score, games_played) in buckets.get(index, {}).items():
+                if game is not None and bucket_game != game:
+                    continue
+                old_score, old_games = into.get(user_id, (0.0, 0))
+                into[user_id] = (old_score + score, old_games + games_played)
+        return into
+
+    def _window_totals(self, window, game):
+        """Gộp điểm trong cửa sổ: dict user_id -> (điểm, số lượt chơi)"""
+        unit, span = WINDOWS[window]
+        current = bucket_index(unit)
+        self._evict(unit, current)
+        buckets = self._buckets[unit]
+
+        # Các bucket đã đóng không đổi nữa nên chỉ gộp lại khi sang bucket mới
+        cached = self._merged.get((window, game))
+        if cached is not None and cached[0] == current:
+            self._window_hits += 1
+            closed = cached[1]
+        else:
+            self._window_misses += 1
+            closed = self._merge(buckets, range(current - span + 1, current), game, {})
+            self._merged[(window, game)] = (current, closed)
+
+        return self._merge(buckets, (current,), game, dict(closed))
+
+    def _persist(self, user_id, game, score, name):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO game_scores (user_id, game, score)
+                VALUES (%s, %s, %s)
+                RETURNING id
+            ''', (user_id, game, score))
+            row_id = cursor.fetchone()[0]
+            if not name:
+                cursor.execute('SELECT full_name FROM users WHERE id = %s', (user_id,))
+                row = cursor.fetchone()
+                name = row[0] if row else None
+            conn.commit()
+            cursor.close()
+        return name, row_id
+
+
+leaderboard = Leaderboard()
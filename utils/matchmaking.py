@@ -0,0 +1,579 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+import psycopg2
+
+from database.pool import db_pool
+from .battles import battle_registry
+from .battle_events import battle_events
+from .battle_judge import pick_challenge
+from .leaderboard import leaderboard
+
+# Rating của người chưa chơi game nào (thang điểm trung bình mỗi lượt, 0-100)
+DEFAULT_RATING = 50.0
+
+
+class MatchmakingError(Exception):
+    """Không đọc/ghi được hàng đợi ghép trận ở tầng lưu trữ"""
+
+
+def rating_window(enqueued_at, now, base_window, widen_rate, max_window):
+    """Chênh lệch rating chấp nhận được của vé đã chờ từ `enqueued_at`"""
+    return min(max_window, base_window + widen_rate * (now - enqueued_at))
+
+
+class Ticket:
+    """Vé chờ ghép trận của một user; trạng thái: waiting -> matching -> matched.
+
+    Vé nằm ở 'matching' quá lâu (process tạo trận chết giữa chừng, lỗi khi lưu
+    kết quả...) được purge trả về 'waiting' dựa vào `matching_since`.
+    """
+
+    __slots__ = ('user_id', 'rating', 'enqueued_at', 'last_seen', 'status',
+                 'battle_id', 'opponent', 'matched_at', 'matching_since')
+
+    def __init__(self, user_id, rating):
+        now = time.time()
+        self.user_id = user_id
+        self.rating = rating
+        self.enqueued_at = now
+        self.last_seen = now
+        self.status = 'waiting'
+        self.battle_id = None
+        self.opponent = None
+        self.matched_at = None
+        self.matching_since = None
+
+    @property
+    def key(self):
+        return (self.rating, self.enqueued_at, self.user_id)
+
+    @classmethod
+    def from_row(cls, row):
+        ticket = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, row):
+            setattr(ticket, name, value)
+        return ticket
+
+    def to_dict(self, window=None):
+        data = {
+            'status': self.status,
+            'rating': round(self.rating, 2),
+            'waited': round((self.matched_at or time.time()) - self.enqueued_at, 3)
+        }
+        if window is not None and self.status == 'waiting':
+            data['window'] = round(window, 2)
+        if self.status == 'matched':
+            data['battle_id'] = self.battle_id
+            data['opponent'] = self.opponent
+        return data
+
+
+class LocalMatchmakingStore:
+    """Hàng đợi trong bộ nhớ, thay thế Postgres khi chạy một process (dev/test).
+
+    Vé được giữ trong danh sách luôn sắp xếp theo (rating, thời điểm vào), nên
+    đối thủ gần rating nhất luôn nằm ngay cạnh và tìm bằng bisect (O(log n)).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []
+        self._tickets = {}
+
+    def enqueue(self, user_id, rating):
+        """Vé đang chờ của user (cập nhật last_seen), hoặc vé mới"""
+        with self._cond:
+            ticket = self._tickets.get(user_id)
+            if ticket is not None and ticket.status in ('waiting', 'matching'):
+                ticket.last_seen = time.time()
+                return ticket
+            ticket = self._tickets[user_id] = Ticket(user_id, rating)
+            insort(self._queue, ticket.key)
+            return ticket
+
+    def get(self, user_id):
+        with self._cond:
+            ticket = self._tickets.get(user_id)
+            if ticket is not None:
+                ticket.last_seen = time.time()
+            return ticket
+
+    def find_match(self, user_id, base_window, widen_rate, max_window):
+        """Giữ vé của user và đối thủ gần rating nhất (chuyển sang 'matching'),
+        trả về (người chờ lâu hơn, người còn lại) hoặc None"""
+        now = time.time()
+        with self._cond:
+            ticket = self._tickets.get(user_id)
+            if ticket is None or ticket.status != 'waiting':
+                return None
+            my_window = rating_window(ticket.enqueued_at, now, base_window, widen_rate, max_window)
+            index = bisect_left(self._queue, ticket.key)
+            best = None
+            for neighbour in (index - 1, index + 1):
+                if not 0 <= neighbour < len(self._queue):
+                    continue
+                other = self._tickets[self._queue[neighbour][2]]
+                gap = abs(other.rating - ticket.rating)
+                other_window = rating_window(other.enqueued_at, now, base_window, widen_rate, max_window)
+                if gap <= max(my_window, other_window):
+                    if best is None or gap < abs(best.rating - ticket.rating):
+                        best = other
+            if best is None:
+                return None
+
+            # Người chờ lâu hơn làm chủ room
+            first, second = sorted((best, ticket), key=lambda t: t.enqueued_at)
+            for matched in (first, second):
+                self._remove(matched)
+                matched.status = 'matching'
+                matched.matching_since = now
+            return first, second
+
+    def matched(self, first, second, battle_id, now):
+        with self._cond:
+            for ticket, opponent in ((first, second), (second, first)):
+                ticket.status = 'matched'
+                ticket.battle_id = battle_id
+                ticket.opponent = opponent.user_id
+                ticket.matched_at = now
+            self._cond.notify_all()
+
+    def release(self, first, second):
+        """Trả hai vé đang 'matching' về hàng đợi, giữ nguyên thời gian đã chờ"""
+        with self._cond:
+            for ticket in (first, second):
+                current = self._tickets.get(ticket.user_id)
+                if current is not None and current.status == 'matching':
+                    self._requeue(current)
+            self._cond.notify_all()
+
+    def leave(self, user_id, stale_before):
+        """Rời hàng đợi; vé đang 'matching' chỉ bỏ được khi đã giữ từ trước `stale_before`"""
+        with self._cond:
+            ticket = self._tickets.get(user_id)
+            if ticket is None or (ticket.status == 'matching' and ticket.matching_since >= stale_before):
+                return False
+            del self._tickets[user_id]
+            if ticket.status == 'waiting':
+                self._remove(ticket)
+            return True
+
+    def purge(self, cutoff, stale_before):
+        """Bỏ vé không được hỏi tới từ trước `cutoff`, trả vé 'matching' giữ từ trước
+        `stale_before` về hàng đợi; trả về (số vé đang chờ bị bỏ, số vé được trả lại)"""
+        abandoned = reverted = 0
+        with self._cond:
+            for user_id, ticket in list(self._tickets.items()):
+                if ticket.status == 'waiting' and ticket.last_seen < cutoff:
+                    self._remove(ticket)
+                    del self._tickets[user_id]
+                    abandoned += 1
+                elif ticket.status == 'matching' and ticket.matching_since < stale_before:
+                    self._requeue(ticket)
+                    reverted += 1
+                elif ticket.status == 'matched' and ticket.matched_at < cutoff:
+                    del self._tickets[user_id]
+            if reverted:
+                self._cond.notify_all()
+        return abandoned, reverted
+
+    def queue_stats(self):
+        """(số vé đang chờ, thời điểm vào của vé chờ lâu nhất hoặc None)"""
+        with self._cond:
+            waiting = [ticket.enqueued_at for ticket in self._tickets.values() if ticket.status == 'waiting']
+            return len(waiting), min(waiting, default=None)
+
+    def wait(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def _requeue(self, ticket):
+        # Gọi khi đang giữ lock
+        ticket.status = 'waiting'
+        ticket.matching_since = None
+        insort(self._queue, ticket.key)
+
+    def _remove(self, ticket):
+        # Gọi khi đang giữ lock
+        index = bisect_left(self._queue, ticket.key)
+        if index < len(self._queue) and self._queue[index] == ticket.key:
+            del self._queue[index]
+
+
+class PostgresMatchmakingStore:
+    """Hàng đợi ghép trận trong bảng matchmaking_tickets, dùng chung giữa các
+    worker process.
+
+    Tìm đối thủ khóa cả hai vé bằng SELECT ... FOR UPDATE SKIP LOCKED rồi chuyển
+    chúng sang 'matching' trong cùng transaction: hai worker tìm cùng lúc không
+    bao giờ lấy trùng một vé và không phải chờ nhau. Không có thông báo giữa
+    các process nên long-poll đọc lại vé mỗi `poll_interval` giây.
+    """
+
+    COLUMNS = Ticket.__slots__
+
+    def __init__(self, pool=None, poll_interval=0.5):
+        self.pool = pool or db_pool
+        self.poll_interval = poll_interval
+
+    def enqueue(self, user_id, rating):
+        now = time.time()
+        columns = ', '.join(self.COLUMNS)
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    UPDATE matchmaking_tickets SET last_seen = %s
+                    WHERE user_id = %s AND status IN ('waiting', 'matching')
+                    RETURNING {columns}
+                ''', (now, user_id))
+                row = cursor.fetchone()
+                if row is None:
+                    # Chưa có vé, hoặc vé của trận trước: vào hàng đợi lại từ đầu
+                    cursor.execute(f'''
+                        INSERT INTO matchmaking_tickets (user_id, rating, enqueued_at, last_seen, status)
+                        VALUES (%s, %s, %s, %s, 'waiting')
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            rating = EXCLUDED.rating, enqueued_at = EXCLUDED.enqueued_at,
+                            last_seen = EXCLUDED.last_seen, status = 'waiting',
+                            battle_id = NULL, opponent = NULL, matched_at = NULL, matching_since = NULL
+                        WHERE matchmaking_tickets.status = 'matched'
+                        RETURNING {columns}
+                    ''', (user_id, rating, now, now))
+                    row = cursor.fetchone()
+                if row is None:
+                    # Request khác của cùng user vừa tạo vé
+                    cursor.execute(f'SELECT {columns} FROM matchmaking_tickets WHERE user_id = %s', (user_id,))
+                    row = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không vào được hàng đợi ghép trận: {e}') from e
+        return Ticket.from_row(row)
+
+    def get(self, user_id):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    UPDATE matchmaking_tickets SET last_seen = %s WHERE user_id = %s
+                    RETURNING {', '.join(self.COLUMNS)}
+                ''', (time.time(), user_id))
+                row = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không đọc được vé ghép trận: {e}') from e
+        return Ticket.from_row(row) if row else None
+
+    def find_match(self, user_id, base_window, widen_rate, max_window):
+        now = time.time()
+        columns = ', '.join(self.COLUMNS)
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                # Vé của chính mình đang bị worker khác khóa (đang ghép) thì thôi
+                cursor.execute(f'''
+                    SELECT {columns} FROM matchmaking_tickets
+                    WHERE user_id = %s AND status = 'waiting'
+                    FOR UPDATE SKIP LOCKED
+                ''', (user_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    conn.commit()
+                    cursor.close()
+                    return None
+                ticket = Ticket.from_row(row)
+                params = {
+                    'user_id': user_id,
+                    'rating': ticket.rating,
+                    'window': rating_window(ticket.enqueued_at, now, base_window, widen_rate, max_window),
+                    'base': base_window,
+                    'rate': widen_rate,
+                    'max': max_window,
+                    'now': now
+                }
+                cursor.execute(f'''
+                    SELECT {columns} FROM matchmaking_tickets
+                    WHERE status = 'waiting' AND user_id <> %(user_id)s
+                      AND ABS(rating - %(rating)s) <= GREATEST(
+                          %(window)s, LEAST(%(max)s, %(base)s + %(rate)s * (%(now)s - enqueued_at)))
+                    ORDER BY ABS(rating - %(rating)s), enqueued_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                ''', params)
+                row = cursor.fetchone()
+                if row is None:
+                    conn.commit()
+                    cursor.close()
+                    return None
+                other = Ticket.from_row(row)
+                cursor.execute('''
+                    UPDATE matchmaking_tickets SET status = 'matching', matching_since = %s
+                    WHERE user_id IN (%s, %s)
+                ''', (now, ticket.user_id, other.user_id))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không ghép được trận: {e}') from e
+
+        for matched in (ticket, other):
+            matched.status = 'matching'
+            matched.matching_since = now
+        return tuple(sorted((other, ticket), key=lambda t: t.enqueued_at))
+
+    def matched(self, first, second, battle_id, now):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                for ticket, opponent in ((first, second), (second, first)):
+                    cursor.execute('''
+                        UPDATE matchmaking_tickets
+                        SET status = 'matched', battle_id = %s, opponent = %s, matched_at = %s
+                        WHERE user_id = %s
+                    ''', (battle_id, opponent.user_id, now, ticket.user_id))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không lưu được kết quả ghép trận: {e}') from e
+
+    def release(self, first, second):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE matchmaking_tickets SET status = 'waiting', matching_since = NULL
+                    WHERE user_id IN (%s, %s) AND status = 'matching'
+                ''', (first.user_id, second.user_id))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không trả được vé về hàng đợi: {e}') from e
+
+    def leave(self, user_id, stale_before):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM matchmaking_tickets
+                    WHERE user_id = %s AND (status <> 'matching' OR COALESCE(matching_since, 0) < %s)
+                ''', (user_id, stale_before))
+                deleted = cursor.rowcount == 1
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không rời được hàng đợi ghép trận: {e}') from e
+        return deleted
+
+    def purge(self, cutoff, stale_before):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM matchmaking_tickets WHERE status = 'waiting' AND last_seen < %s
+                ''', (cutoff,))
+                abandoned = cursor.rowcount
+                # Vé 'matching' không có matching_since là vé tạo trước khi có cột này
+                cursor.execute('''
+                    UPDATE matchmaking_tickets SET status = 'waiting', matching_since = NULL
+                    WHERE status = 'matching' AND COALESCE(matching_since, 0) < %s
+                ''', (stale_before,))
+                reverted = cursor.rowcount
+                cursor.execute('''
+                    DELETE FROM matchmaking_tickets WHERE status = 'matched' AND matched_at < %s
+                ''', (cutoff,))
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không dọn được hàng đợi ghép trận: {e}') from e
+        return abandoned, reverted
+
+    def queue_stats(self):
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*), MIN(enqueued_at) FROM matchmaking_tickets WHERE status = 'waiting'
+                ''')
+                depth, oldest = cursor.fetchone()
+                conn.commit()
+                cursor.close()
+        except psycopg2.Error as e:
+            raise MatchmakingError(f'Không đọc được hàng đợi ghép trận: {e}') from e
+        return depth, oldest
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.poll_interval))
+
+
+class Matchmaker:
+    """Hàng đợi ghép trận Code Battle theo rating.
+
+    Hai người được ghép khi chênh lệch rating nằm trong cửa sổ của người chờ
+    lâu hơn; cửa sổ bắt đầu từ `base_window` và nới thêm `widen_rate` mỗi giây
+    chờ, tối đa `max_window`. Vé không được hỏi trạng thái quá `idle_timeout`
+    giây coi như người chơi đã rời đi; vé bị giữ ở 'matching' quá
+    `matching_timeout` giây (tạo trận lỗi giữa chừng) được trả về hàng đợi. Vé nằm trong `store` (Postgres để mọi
+    worker process dùng chung một hàng đợi, hoặc bộ nhớ khi chạy một process);
+    số liệu matches/wait_* trong stats() là của process hiện tại.
+    """
+
+    def __init__(self, registry=None, events=None, base_window=10, widen_rate=2,
+                 max_window=100, idle_timeout=30, countdown=3, store=None, matching_timeout=15):
+        self.registry = registry or battle_registry
+        self.events = events or battle_events
+        self.base_window = base_window
+        self.widen_rate = widen_rate
+        self.max_window = max_window
+        self.idle_timeout = idle_timeout
+        self.matching_timeout = matching_timeout
+        self.countdown = countdown
+        self.store = store or LocalMatchmakingStore()
+
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+        self._matches = 0
+        self._abandoned = 0
+        self._failed = 0
+        self._reverted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def init_app(self, app):
+        """Đọc cấu hình MATCHMAKING_* từ Flask app"""
+        app.config.setdefault('MATCHMAKING_BASE_WINDOW', float(os.environ.get('MATCHMAKING_BASE_WINDOW', 10)))
+        app.config.setdefault('MATCHMAKING_WIDEN_RATE', float(os.environ.get('MATCHMAKING_WIDEN_RATE', 2)))
+        app.config.setdefault('MATCHMAKING_MAX_WINDOW', float(os.environ.get('MATCHMAKING_MAX_WINDOW', 100)))
+        app.config.setdefault('MATCHMAKING_IDLE_TIMEOUT', int(os.environ.get('MATCHMAKING_IDLE_TIMEOUT', 30)))
+        app.config.setdefault('MATCHMAKING_MATCHING_TIMEOUT', float(os.environ.get('MATCHMAKING_MATCHING_TIMEOUT', 15)))
+        # 'postgres': một hàng đợi chung cho mọi worker process; 'local': chỉ trong process
+        app.config.setdefault('MATCHMAKING_STORE', os.environ.get('MATCHMAKING_STORE', app.config.get('BATTLE_STORE', 'postgres')))
+
+        self.base_window = app.config['MATCHMAKING_BASE_WINDOW']
+        self.widen_rate = app.config['MATCHMAKING_WIDEN_RATE']
+        self.max_window = app.config['MATCHMAKING_MAX_WINDOW']
+        self.idle_timeout = app.config['MATCHMAKING_IDLE_TIMEOUT']
+        self.matching_timeout = app.config['MATCHMAKING_MATCHING_TIMEOUT']
+        if app.config['MATCHMAKING_STORE'] == 'postgres':
+            self.store = PostgresMatchmakingStore()
+        else:
+            self.store = LocalMatchmakingStore()
+        app.extensions['matchmaker'] = self
+
+    def rating_for(self, user_id):
+        """Rating = điểm trung bình mỗi lượt chơi trên bảng xếp hạng"""
+        me = leaderboard.rank_of(user_id)
+        if not me or not me['games_played']:
+            return DEFAULT_RATING
+        return me['score'] / me['games_played']
+
+    def window(self, ticket, now=None):
+        return rating_window(ticket.enqueued_at, now or time.time(),
+                             self.base_window, self.widen_rate, self.max_window)
+
+    def enqueue(self, user_id, rating=None):
+        """Vào hàng đợi (hoặc giữ vé đang chờ); trả về trạng thái vé"""
+        if rating is None:
+            rating = self.rating_for(user_id)
+        self._purge()
+        ticket = self.store.enqueue(user_id, float(rating))
+        if ticket.status == 'waiting' and self._try_match(user_id):
+            ticket = self.store.get(user_id) or ticket
+        return ticket.to_dict(self.window(ticket))
+
+    def status(self, user_id, timeout=0):
+        """Trạng thái vé; long-poll tới `timeout` giây chờ được ghép trận"""
+        deadline = time.monotonic() + timeout
+        self._purge()
+        while True:
+            ticket = self.store.get(user_id)
+            if ticket is None:
+                return None
+            if ticket.status == 'matched':
+                return ticket.to_dict()
+            # Cửa sổ rating nới dần theo thời gian chờ nên thử ghép lại
+            if ticket.status == 'waiting' and self._try_match(user_id):
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ticket.to_dict(self.window(ticket))
+            self.store.wait(min(1.0, remaining))
+
+    def leave(self, user_id):
+        return self.store.leave(user_id, time.time() - self.matching_timeout)
+
+    def stats(self):
+        now = time.time()
+        try:
+            depth, oldest = self.store.queue_stats()
+        except MatchmakingError as e:
+            print(f"Matchmaking stats error: {e}")
+            depth, oldest = None, None
+        with self._lock:
+            matched_players = self._matches * 2
+            return {
+                'store': type(self.store).__name__,
+                'queue_depth': depth,
+                'oldest_wait': round(now - oldest, 3) if oldest else 0.0,
+                'matches': self._matches,
+                'abandoned': self._abandoned,
+                'failed': self._failed,
+                'reverted': self._reverted,
+                'wait_avg': round(self._wait_total / matched_players, 3) if matched_players else 0.0,
+                'wait_max': round(self._wait_max, 3)
+            }
+
+    def _try_match(self, user_id):
+        pair = self.store.find_match(user_id, self.base_window, self.widen_rate, self.max_window)
+        if pair is None:
+            return False
+        return self._start_battle(*pair)
+
+    def _start_battle(self, first, second):
+        """Tạo room cho hai vé đang 'matching'; lỗi bất kỳ thì trả vé về hàng đợi"""
+        try:
+            room = self.registry.create(first.user_id, challenge_id=pick_challenge())
+            battle, _ = self.registry.join(room.id, second.user_id)
+            now = time.time()
+            self.store.matched(first, second, battle['id'], now)
+        except Exception as e:
+            print(f"Matchmaking error: {e}")
+            with self._lock:
+                self._failed += 1
+            try:
+                self.store.release(first, second)
+            except MatchmakingError as e:
+                # Vé còn kẹt ở 'matching' sẽ được purge trả lại sau matching_timeout
+                print(f"Matchmaking release error: {e}")
+            return False
+
+        with self._lock:
+            for ticket in (first, second):
+                waited = now - ticket.enqueued_at
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            self._matches += 1
+
+        self.events.publish(battle['id'], 'countdown', {
+            'seconds': self.countdown,
+            'starts_at': now + self.countdown
+        })
+        return True
+
+    def _purge(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge < 1:
+                return
+            self._last_purge = now
+        abandoned, reverted = self.store.purge(now - self.idle_timeout, now - self.matching_timeout)
+        with self._lock:
+            self._abandoned += abandoned
+            self._reverted += reverted
+
+
+matchmaker = Matchmaker()
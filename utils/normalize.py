@@ -0,0 +1,207 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def _strip_docstring(body):
+    if (body and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)):
+        body = body[1:] or [ast.Pass()]
+    return body
+
+
+# Function dùng tới các hàm này đọc được tên biến lúc chạy: không đổi tên biến của nó
+NAME_INTROSPECTION = {'locals', 'vars', 'dir', 'eval', 'exec'}
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    """Đổi tên biến cục bộ của mỗi function thành _v<tầng>_<thứ tự>, bỏ
+    docstring và type annotation. Tên ở cấp module (vd. tên function mà
+    test gọi tới) được giữ nguyên.
+
+    Tên tham số KHÔNG bị đổi: test (hoặc chính bài nộp) có thể gọi
+    function bằng keyword argument, đổi tên sẽ làm hai bài chạy khác
+    nhau bị coi là giống nhau.
+    """
+
+    def __init__(self):
+        self.scopes = [{}]
+
+    @staticmethod
+    def _parameters(node):
+        args = node.args
+        names = [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs]
+        names += [a.arg for a in (args.vararg, args.kwarg) if a is not None]
+        return names
+
+    @staticmethod
+    def _local_names(node):
+        names = []
+        declared = set()
+        introspects = False
+        body = node.body if isinstance(node.body, list) else [node.body]
+        stack = list(reversed(body))
+        while stack:
+            child = stack.pop()
+            if isinstance(child, (ast.Global, ast.Nonlocal)):
+                declared.update(child.names)
+            elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                names.append(child.id)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # Tên function/class lồng nhau là biến cục bộ; thân của nó là scope khác
+                names.append(child.name)
+                continue
+            elif isinstance(child, ast.Lambda):
+                continue
+            elif isinstance(child, ast.ExceptHandler) and child.name:
+                names.append(child.name)
+            elif (isinstance(child, ast.Call) and isinstance(child.func, ast.Name)
+                    and child.func.id in NAME_INTROSPECTION):
+                introspects = True
+            stack.extend(reversed(list(ast.iter_child_nodes(child))))
+
+        ordered = []
+        for name in names:
+            if name not in declared and name not in ordered:
+                ordered.append(name)
+        return ordered, declared, introspects
+
+    def _enter(self, node):
+        mapping = dict(self.scopes[-1])
+        local_names, declared, introspects = self._local_names(node)
+        depth = len(self.scopes)
+        for name in declared:
+            mapping.pop(name, None)
+        parameters = self._parameters(node)
+        for name in parameters:
+            mapping[name] = name
+        index = 0
+        for name in local_names:
+            if name in parameters:
+                continue
+            if introspects:
+                mapping[name] = name
+                continue
+            mapping[name] = f'_v{depth}_{index}'
+            index += 1
+        self.scopes.append(mapping)
+        return mapping
+
+    @staticmethod
+    def _strip_annotations(args):
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None:
+                arg.annotation = None
+
+    def visit_Module(self, node):
+        node.body = [self.visit(stmt) for stmt in _strip_docstring(node.body)]
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.scopes[-1].get(node.name, node.name)
+        node.decorator_list = [self.visit(d) for d in node.decorator_list]
+        node.args.defaults = [self.visit(d) for d in node.args.defaults]
+        node.args.kw_defaults = [self.visit(d) if d is not None else None for d in node.args.kw_defaults]
+        node.returns = None
+
+        self._enter(node)
+        self._strip_annotations(node.args)
+        node.body = [self.visit(stmt) for stmt in _strip_docstring(node.body)]
+        self.scopes.pop()
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        node.args.defaults = [self.visit(d) for d in node.args.defaults]
+        self._enter(node)
+        self._strip_annotations(node.args)
+        node.body = self.visit(node.body)
+        self.scopes.pop()
+        return node
+
+    def visit_ClassDef(self, node):
+        node.name = self.scopes[-1].get(node.name, node.name)
+        node.bases = [self.visit(b) for b in node.bases]
+        node.decorator_list = [self.visit(d) for d in node.decorator_list]
+        node.body = [self.visit(stmt) for stmt in _strip_docstring(node.body)]
+        return node
+
+    def visit_AnnAssign(self, node):
+        # x: int = 1  ->  x = 1
+        if node.value is None:
+            return None
+        return ast.copy_location(ast.Assign(targets=[self.visit(node.target)],
+                                            value=self.visit(node.value)), node)
+
+    def visit_Name(self, node):
+        node.id = self.scopes[-1].get(node.id, node.id)
+        return node
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            node.name = self.scopes[-1].get(node.name, node.name)
+        return self.generic_visit(node)
+
+
+class CodeNormalizer:
+    """Chuẩn hóa source Python về dạng so sánh được: bỏ khoảng trắng, comment,
+    kiểu dấu nháy, docstring, annotation và đặt lại tên biến cục bộ (trừ
+    tham số).
+
+    Kết quả được memo hóa theo hash của source (LRU tối đa `max_entries`).
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def normalize(self, source):
+        """Trả về dạng chuẩn (str) hoặc None nếu source không parse được"""
+        key = hashlib.sha256(source.encode('utf-8')).digest()
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self._hits += 1
+                return self._memo[key]
+            self._misses += 1
+
+        try:
+            tree = _Canonicalizer().visit(ast.parse(source))
+            normalized = ast.dump(tree)
+        except (SyntaxError, ValueError, RecursionError):
+            normalized = None
+
+        with self._lock:
+            self._memo[key] = normalized
+            if len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return normalized
+
+    def equivalent(self, source, canonical):
+        """So khớp source với dạng chuẩn đã tính sẵn"""
+        if canonical is None:
+            return False
+        return self.normalize(source) == canonical
+
+    def build_index(self, items, field):
+        """Tính sẵn dạng chuẩn của items[field], trả về dict id -> dạng chuẩn"""
+        return {item['id']: self.normalize(item[field]) for item in items}
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._memo),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+
+code_normalizer = CodeNormalizer()
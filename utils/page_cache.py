@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, render_template, request
+
+EXPORT_INDEX = 'pages.json'
+
+
+class _RenderedPage:
+    """HTML đã render của một template cùng mtime của file nguồn lúc render"""
+
+    __slots__ = ('body', 'etag', 'filename', 'mtime', 'checked_at')
+
+    def __init__(self, body, filename, mtime):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.filename = filename
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+
+
+class PageCache:
+    """Cache HTML đã render của các trang không phụ thuộc user.
+
+    - mỗi template được render một lần (lần truy cập đầu hoặc lúc warm-up),
+      render lại khi mtime của file template đổi (kiểm tra tối đa mỗi
+      `check_interval` giây)
+    - ETag mạnh là hash nội dung; If-None-Match khớp nhận 304, trình duyệt
+      luôn hỏi lại (Cache-Control: no-cache) nên sửa trang có hiệu lực ngay
+    - export() ghi toàn bộ trang ra thư mục để proxy phía trước phục vụ
+      trực tiếp bằng sendfile
+
+    Route được đăng ký bằng `add_url_rule(path, endpoint,
+    page_cache.view('<template>'))`; chỉ dùng cho template không đọc
+    session/request.
+    """
+
+    def __init__(self, enabled=True, check_interval=1.0):
+        self.enabled = enabled
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._pages = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._reloads = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình PAGE_CACHE_* từ Flask app"""
+        app.config.setdefault('PAGE_CACHE_ENABLED', os.environ.get('PAGE_CACHE_ENABLED', '1') == '1')
+        app.config.setdefault('PAGE_CACHE_CHECK_INTERVAL', float(os.environ.get('PAGE_CACHE_CHECK_INTERVAL', 1.0)))
+        app.config.setdefault('PAGE_CACHE_WARM', os.environ.get('PAGE_CACHE_WARM', '1') == '1')
+
+        self.enabled = app.config['PAGE_CACHE_ENABLED']
+        self.check_interval = app.config['PAGE_CACHE_CHECK_INTERVAL']
+        app.extensions['page_cache'] = self
+
+    def view(self, template_name):
+        """View function trả về nguyên template `template_name` (qua cache)"""
+        def view():
+            return self.render(template_name)
+        view.page_template = template_name
+        return view
+
+    def render(self, template_name):
+        """Response HTML của template (qua cache), trả 304 nếu ETag khớp"""
+        if not self.enabled:
+            return render_template(template_name)
+
+        page = self._get(template_name)
+        response = current_app.response_class(page.body, mimetype='text/html')
+        response.set_etag(page.etag)
+        if page.mtime:
+            response.last_modified = page.mtime
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self._not_modified += 1
+        return response
+
+    def pages(self, app):
+        """Các cặp (đường dẫn, template) của route dùng page_cache.view"""
+        result = []
+        for rule in app.url_map.iter_rules():
+            template_name = getattr(app.view_functions.get(rule.endpoint), 'page_template', None)
+            if template_name and not rule.arguments and 'GET' in rule.methods:
+                result.append((rule.rule, template_name))
+        return sorted(result)
+
+    def warm(self, app):
+        """Render sẵn mọi trang; trả về số trang đã render"""
+        count = 0
+        for path, template_name in self.pages(app):
+            try:
+                with app.test_request_context(path):
+                    self._get(template_name)
+                count += 1
+            except Exception as e:
+                print(f"Page cache warm-up error ({template_name}): {e}")
+        return count
+
+    def export(self, app, out_dir):
+        """Ghi HTML của mọi trang ra `out_dir` (/games/code-quiz -> games/code-quiz.html)
+        kèm pages.json (đường dẫn -> file, etag); trả về số trang"""
+        index = {}
+        for path, template_name in self.pages(app):
+            with app.test_request_context(path):
+                page = self._get(template_name)
+            filename = (path.strip('/') or 'index') + '.html'
+            target = os.path.join(out_dir, *filename.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(page.body)
+            index[path] = {'file': filename, 'etag': page.etag}
+
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, EXPORT_INDEX), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        return len(index)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pages': len(self._pages),
+                'bytes': sum(len(page.body) for page in self._pages.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'not_modified': self._not_modified,
+                'reloads': self._reloads
+            }
+
+    def _get(self, template_name):
+        with self._lock:
+            page = self._pages.get(template_name)
+            if page is not None and time.monotonic() - page.checked_at < self.check_interval:
+                self._hits += 1
+                return page
+
+        if page is not None:
+            try:
+                mtime = os.path.getmtime(page.filename) if page.filename else page.mtime
+            except OSError:
+                mtime = None
+            if mtime == page.mtime:
+                with self._lock:
+                    page.checked_at = time.monotonic()
+                    self._hits += 1
+                return page
+
+        # Render ngoài lock; hai request cùng render lần đầu chỉ tốn thêm một lần render
+        template = current_app.jinja_env.get_template(template_name)
+        mtime = os.path.getmtime(template.filename) if template.filename else 0
+        body = render_template(template).encode('utf-8')
+        rendered = _RenderedPage(body, template.filename, mtime)
+        with self._lock:
+            if page is None:
+                self._misses += 1
+            else:
+                self._reloads += 1
+            self._pages[template_name] = rendered
+        return rendered
+
+
+page_cache = PageCache()
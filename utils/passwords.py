@@ -0,0 +1,235 @@
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash SHA-256 không salt do hash_password() cũ trong app.py tạo ra
+LEGACY_HASH = re.compile(r'^[0-9a-f]{64}$')
+PBKDF2_HASH = re.compile(r'^pbkdf2:(\w+):(\d+)\$')
+
+
+class PasswordHasherError(Exception):
+    """Lỗi chung của password hasher"""
+
+
+class PasswordHasherBusy(PasswordHasherError):
+    """Đã có quá nhiều yêu cầu hash mật khẩu đang chờ"""
+
+
+def _hash_worker(password, method):
+    started = time.time()
+    return generate_password_hash(password, method=method), started
+
+
+def _verify_worker(stored_hash, password):
+    started = time.time()
+    return check_password_hash(stored_hash, password), started
+
+
+class PasswordHasher:
+    """Hash/kiểm tra mật khẩu (PBKDF2) trên một process pool riêng.
+
+    PBKDF2 tốn CPU và giữ GIL suốt thời gian chạy, nên chạy ngay trong luồng
+    request thì một loạt đăng nhập cùng lúc sẽ làm mọi request khác của
+    process đứng chờ. Ở đây việc hash chạy trong `workers` process riêng:
+
+    - iterations: số vòng PBKDF2-SHA256 (hash cũ yếu hơn được hash lại khi
+      đăng nhập thành công)
+    - max_pending: số yêu cầu tối đa đang chạy + chờ; vượt quá thì ném
+      PasswordHasherBusy thay vì xếp hàng vô hạn
+    - timeout: số giây tối đa chờ một kết quả; job chưa chạy thì bị hủy, job
+      đang chạy vẫn giữ chỗ trong max_pending tới khi xong
+    Worker process chết (OOM, bị kill) làm hỏng cả pool: pool được dựng lại và
+    yêu cầu được gửi lại một lần. workers = 0 thì hash ngay trong process hiện tại.
+    """
+
+    def __init__(self, workers=2, iterations=600000, max_pending=64, timeout=10.0):
+        self.workers = workers
+        self.iterations = iterations
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+
+        self._hashed = 0
+        self._verified = 0
+        self._rehashed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._pending_max = 0
+        self._queue_wait = 0.0
+        self._duration = 0.0
+
+    def init_app(self, app):
+        """Đọc cấu hình PASSWORD_HASH_* từ Flask app"""
+        app.config.setdefault('PASSWORD_HASH_WORKERS', int(os.environ.get('PASSWORD_HASH_WORKERS', min(os.cpu_count() or 1, 4))))
+        app.config.setdefault('PASSWORD_HASH_ITERATIONS', int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000)))
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64)))
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10)))
+
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.iterations = app.config['PASSWORD_HASH_ITERATIONS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        app.extensions['password_hasher'] = self
+
+    @property
+    def method(self):
+        return f'pbkdf2:sha256:{self.iterations}'
+
+    def hash(self, password):
+        """Hash mật khẩu với cấu hình hiện tại"""
+        result = self._run(_hash_worker, password, self.method)
+        with self._lock:
+            self._hashed += 1
+        return result
+
+    def verify(self, password, stored_hash):
+        """Kiểm tra mật khẩu; trả về (đúng hay sai, hash mới hoặc None).
+
+        Hash mới khác None khi mật khẩu đúng nhưng hash đang lưu là SHA-256
+        cũ hoặc PBKDF2 ít vòng hơn cấu hình: người gọi nên lưu lại hash mới.
+        """
+        if not stored_hash:
+            return False, None
+        if LEGACY_HASH.match(stored_hash):
+            # SHA-256 một vòng: rẻ, kiểm tra ngay không cần qua pool
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+        else:
+            ok = self._run(_verify_worker, stored_hash, password)
+        with self._lock:
+            self._verified += 1
+
+        if not ok or not self.needs_rehash(stored_hash):
+            return ok, None
+        new_hash = self.hash(password)
+        with self._lock:
+            self._rehashed += 1
+        return True, new_hash
+
+    def needs_rehash(self, stored_hash):
+        if LEGACY_HASH.match(stored_hash):
+            return True
+        match = PBKDF2_HASH.match(stored_hash)
+        return bool(match) and int(match.group(2)) < self.iterations
+
+    def stats(self):
+        with self._lock:
+            runs = self._hashed + self._verified
+            return {
+                'workers': self.workers,
+                'iterations': self.iterations,
+                'pending': self._pending,
+                'pending_max': self._pending_max,
+                'max_pending': self.max_pending,
+                'hashed': self._hashed,
+                'verified': self._verified,
+                'rehashed': self._rehashed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'pool_restarts': self._restarts,
+                'queue_wait_avg': round(self._queue_wait / runs, 6) if runs else 0.0,
+                'duration_avg': round(self._duration / runs, 6) if runs else 0.0
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy('Máy chủ đang bận, vui lòng thử lại sau')
+            self._pending += 1
+            self._pending_max = max(self._pending_max, self._pending)
+
+        submitted = time.time()
+        if self.workers > 0:
+            result, started = self._run_in_pool(fn, args)
+        else:
+            try:
+                result, started = fn(*args)
+            finally:
+                self._release()
+        finished = time.time()
+        with self._lock:
+            self._queue_wait += max(started - submitted, 0.0)
+            self._duration += finished - max(started, submitted)
+        return result
+
+    def _run_in_pool(self, fn, args):
+        # Chỗ đã giữ trong _pending chỉ được trả khi job thật sự xong (done-callback)
+        retried = False
+        while True:
+            with self._lock:
+                executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # RuntimeError: executor vừa bị shutdown ở luồng khác
+                future, error = None, e
+            else:
+                future.add_done_callback(self._release)
+                try:
+                    return future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    # Còn trong hàng đợi thì hủy; đang chạy thì để chạy nốt, chỗ được trả khi xong
+                    future.cancel()
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PasswordHasherBusy('Hash mật khẩu quá lâu, vui lòng thử lại sau')
+                except BrokenProcessPool as e:
+                    error = e
+
+            # Worker process chết (OOM, bị kill...): pool không dùng lại được nữa
+            print(f"Password hasher pool error: {error}")
+            self._discard(executor)
+            if retried:
+                if future is None:
+                    self._release()
+                raise PasswordHasherError('Không xử lý được mật khẩu, vui lòng thử lại sau')
+            retried = True
+            if future is not None:
+                # Lần gửi hỏng đã trả chỗ qua callback: giữ lại chỗ cho lần gửi lại
+                with self._lock:
+                    self._pending += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _discard(self, executor):
+        """Bỏ executor đã hỏng; lần gọi sau _get_executor tạo pool mới"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self):
+        # Gọi khi đang giữ lock. Không fork process đang chạy nhiều luồng:
+        # dùng forkserver (POSIX) hoặc spawn (Windows)
+        if self._executor is None:
+            # Import khi cần: phần lớn process không bao giờ hash mật khẩu
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,93 @@
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import session, jsonify
+
+
+class RateLimiter:
+    """Giới hạn số request theo user bằng token bucket.
+
+    Mỗi user có tối đa `burst` lượt, hồi lại `per_minute` lượt mỗi phút. Bộ
+    đếm nằm trong process nên chạy nhiều worker process thì giới hạn thực tế
+    là per_minute × số process. Bucket đã đầy lại và không dùng tới được dọn
+    định kỳ.
+    """
+
+    def __init__(self, prefix, per_minute=20, burst=10):
+        self.prefix = prefix
+        self.per_minute = per_minute
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._buckets = {}  # user_id -> [số lượt còn lại, thời điểm cập nhật]
+        self._last_sweep = time.monotonic()
+
+        self._allowed = 0
+        self._limited = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình <prefix>_RATE_LIMIT (lượt/phút) và <prefix>_RATE_BURST từ Flask app"""
+        limit_key, burst_key = f'{self.prefix}_RATE_LIMIT', f'{self.prefix}_RATE_BURST'
+        app.config.setdefault(limit_key, float(os.environ.get(limit_key, self.per_minute)))
+        app.config.setdefault(burst_key, int(os.environ.get(burst_key, self.burst)))
+
+        self.per_minute = app.config[limit_key]
+        self.burst = app.config[burst_key]
+        app.extensions[f'{self.prefix.lower()}_rate_limiter'] = self
+
+    def acquire(self, key):
+        """Lấy một lượt; trả về 0 nếu được phép, ngược lại số giây phải chờ"""
+        now = time.monotonic()
+        rate = self.per_minute / 60.0
+        with self._lock:
+            self._sweep(now, rate)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self._allowed += 1
+                return 0
+            self._limited += 1
+            return (1 - bucket[0]) / rate if rate > 0 else 60.0
+
+    def limited(self, view):
+        """Decorator cho view cần đăng nhập: quá giới hạn thì trả 429 kèm Retry-After"""
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            retry_after = self.acquire(session.get('user_id'))
+            if retry_after:
+                response = jsonify({'success': False, 'error': 'Bạn gửi quá nhiều yêu cầu, vui lòng thử lại sau'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            return view(*args, **kwargs)
+        return decorated_function
+
+    def stats(self):
+        with self._lock:
+            return {
+                'per_minute': self.per_minute,
+                'burst': self.burst,
+                'users': len(self._buckets),
+                'allowed': self._allowed,
+                'limited': self._limited
+            }
+
+    def _sweep(self, now, rate):
+        # Gọi khi đang giữ lock
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= self.burst:
+                del self._buckets[key]
+
+
+ai_rate_limiter = RateLimiter('AI')
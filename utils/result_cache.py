@@ -0,0 +1,198 @@
+import ast
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .sandbox import sandbox_pool
+
+# Worker chạy cùng interpreter với server (sys.executable)
+INTERPRETER_VERSION = sys.version
+
+# Các mức timeout; cùng mức thì dùng chung kết quả cache
+TIMEOUT_CLASSES = (1, 2, 5, 10, 30)
+
+# Code dùng tới thời gian, ngẫu nhiên hoặc môi trường thì không cache
+NONDETERMINISTIC_MODULES = {
+    'time', 'datetime', 'random', 'secrets', 'uuid', 'os', 'sys', 'socket',
+    'subprocess', 'threading', 'multiprocessing', 'asyncio', 'tempfile',
+    'urllib', 'http', 'requests', 'numpy', 'calendar', 'zoneinfo', 'importlib', 'builtins'
+}
+NONDETERMINISTIC_BUILTINS = {'id', 'open', 'hash', 'object', 'globals', 'locals', 'vars', 'dir'}
+# Chạy code sinh động thì không phân tích được; chỉ cần nhắc tới tên (kể cả
+# gán sang biến khác như `f = eval`) là coi như không tất định
+DYNAMIC_CODE_NAMES = {'exec', 'eval', 'compile', '__import__', '__builtins__', 'getattr'}
+
+
+def timeout_class(timeout):
+    """Làm tròn timeout lên mức gần nhất trong TIMEOUT_CLASSES"""
+    try:
+        timeout = float(timeout)
+    except (TypeError, ValueError):
+        timeout = 5
+    for limit in TIMEOUT_CLASSES:
+        if timeout <= limit:
+            return limit
+    return TIMEOUT_CLASSES[-1]
+
+
+def is_deterministic(code):
+    """Kiểm tra (bảo thủ) code có cho cùng kết quả mỗi lần chạy không"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # Lỗi cú pháp luôn cho cùng một kết quả
+        return True
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or '']
+        elif isinstance(node, ast.Name):
+            if node.id in DYNAMIC_CODE_NAMES:
+                return False
+            continue
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id in NONDETERMINISTIC_BUILTINS:
+                return False
+            continue
+        else:
+            continue
+        if any(name.split('.')[0] in NONDETERMINISTIC_MODULES for name in names):
+            return False
+    return True
+
+
+class ResultCache:
+    """Cache kết quả chạy code, khóa là hash của
+    (code, stdin, phiên bản interpreter, mức timeout).
+
+    Loại bỏ theo LRU khi tổng dung lượng vượt `max_bytes`; mỗi mục sống
+    tối đa `ttl` giây. Không cache kết quả quá giờ hoặc worker bị crash.
+    Cùng mức timeout nhưng timeout yêu cầu nhỏ hơn thời gian chạy đã lưu
+    thì không dùng lại (lần chạy đó lẽ ra đã bị quá giờ).
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=3600, max_entry_bytes=256 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, size, expires_at)
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._too_slow = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình RESULT_CACHE_* từ Flask app"""
+        app.config.setdefault('RESULT_CACHE_MAX_BYTES', int(os.environ.get('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+        app.config.setdefault('RESULT_CACHE_TTL', int(os.environ.get('RESULT_CACHE_TTL', 3600)))
+
+        self.max_bytes = app.config['RESULT_CACHE_MAX_BYTES']
+        self.ttl = app.config['RESULT_CACHE_TTL']
+        app.extensions['result_cache'] = self
+
+    @staticmethod
+    def make_key(code, stdin='', timeout=5):
+        raw = json.dumps([code, stdin or '', INTERPRETER_VERSION, timeout_class(timeout)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key, timeout=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            result, size, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                return None
+            if timeout is not None and result.duration >= timeout:
+                self._misses += 1
+                self._too_slow += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, key, result):
+        if result.timed_out or result.returncode is None or result.returncode < 0:
+            return
+        size = len(result.stdout.encode('utf-8')) + len(result.stderr.encode('utf-8')) + 128
+        if size > self.max_entry_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'bypassed': self._bypassed,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'too_slow': self._too_slow
+            }
+
+
+result_cache = ResultCache()
+
+
+def run_cached(code, timeout=5, stdin='', use_cache=True):
+    """Chạy code qua sandbox pool, dùng lại kết quả đã cache nếu code tất định.
+
+    use_cache=False: bỏ qua cache (client tự opt-out).
+    """
+    if not use_cache or not is_deterministic(code):
+        result_cache.record_bypass()
+        return sandbox_pool.run(code, timeout=timeout, stdin=stdin)
+
+    key = result_cache.make_key(code, stdin, timeout)
+    try:
+        limit = float(timeout)
+    except (TypeError, ValueError):
+        limit = None
+    result = result_cache.get(key, timeout=limit)
+    if result is not None:
+        return result
+
+    result = sandbox_pool.run(code, timeout=timeout, stdin=stdin)
+    result_cache.put(key, result)
+    return result
@@ -0,0 +1,69 @@
+import random
+import threading
+from collections import OrderedDict
+
+MAX_QUIZ_COUNT = 50
+
+
+def partial_shuffle_sample(population, k, rng, skip=None):
+    """Lấy k phần tử ngẫu nhiên không lặp bằng Fisher–Yates từng phần.
+
+    Không copy population: các hoán vị được ghi vào một dict thưa nên chi
+    phí là O(k) (cộng thêm số phần tử bị bỏ qua vì nằm trong `skip`).
+    """
+    n = len(population)
+    swaps = {}
+    selected = []
+    i = 0
+    while len(selected) < k and i < n:
+        j = rng.randrange(i, n)
+        picked = swaps.get(j, j)
+        swaps[j] = swaps.get(i, i)
+        i += 1
+        item = population[picked]
+        if skip and item['id'] in skip:
+            continue
+        selected.append(item)
+    return selected
+
+
+class QuizSampler:
+    """Chọn câu hỏi quiz từ bucket theo độ khó của catalog.
+
+    - seed: cùng seed cho cùng kết quả (vd. đề chung cho cả lớp)
+    - user_key: không lặp lại câu đã ra cho user đó cho tới khi dùng hết
+      bucket; lịch sử giữ cho tối đa `max_users` user gần nhất
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._history = OrderedDict()  # (user_key, difficulty) -> set(id)
+
+    def sample(self, bucket, count, seed=None, user_key=None, difficulty='all'):
+        count = max(0, min(count, MAX_QUIZ_COUNT, len(bucket)))
+        rng = random.Random(seed) if seed is not None else random
+
+        if user_key is None:
+            return partial_shuffle_sample(bucket, count, rng)
+
+        key = (user_key, difficulty)
+        with self._lock:
+            seen = self._history.pop(key, set())
+            # Không đủ câu mới thì bắt đầu vòng mới
+            if len(bucket) - len(seen) < count:
+                seen = set()
+            selected = partial_shuffle_sample(bucket, count, rng, skip=seen)
+            seen.update(question['id'] for question in selected)
+            self._history[key] = seen
+            while len(self._history) > self.max_users:
+                self._history.popitem(last=False)
+        return selected
+
+    def forget(self, user_key):
+        with self._lock:
+            for key in [key for key in self._history if key[0] == user_key]:
+                del self._history[key]
+
+
+quiz_sampler = QuizSampler()
@@ -0,0 +1,467 @@
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .sandbox_worker import read_message, write_message
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# Biến môi trường duy nhất được chuyển từ app sang worker: code người dùng đọc
+# được os.environ của worker nên không được lọt SECRET_KEY, DATABASE_URL, AI_API_KEY...
+SANDBOX_ENV_ALLOWLIST = ('PATH', 'LANG', 'LC_ALL', 'LC_CTYPE', 'TZ', 'SYSTEMROOT')
+
+
+def sandbox_env():
+    """Môi trường tối thiểu cho worker, không kế thừa môi trường của app"""
+    env = {name: os.environ[name] for name in SANDBOX_ENV_ALLOWLIST if name in os.environ}
+    env.setdefault('PATH', os.defpath)
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    # Hash cố định để thứ tự set/dict của str giống nhau giữa các worker
+    env['PYTHONHASHSEED'] = '0'
+    return env
+
+
+class SandboxError(Exception):
+    """Lỗi chung của sandbox pool"""
+
+
+class SandboxBusy(SandboxError):
+    """Hàng đợi của sandbox pool đã đầy"""
+
+
+class ExecutionResult:
+    """Kết quả một lần chạy code trong sandbox"""
+
+    __slots__ = ('returncode', 'stdout', 'stderr', 'timed_out', 'truncated', 'duration', 'cpu_time')
+
+    def __init__(self, returncode=0, stdout='', stderr='', timed_out=False,
+                 truncated=False, duration=0.0, cpu_time=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.truncated = truncated
+        self.duration = duration
+        # Thời gian CPU đo trong worker (None nếu worker bị kill giữa chừng)
+        self.cpu_time = cpu_time
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+    def to_dict(self):
+        return {
+            'returncode': self.returncode,
+            'stdout': self.stdout,
+            'stderr': self.stderr,
+            'timed_out': self.timed_out,
+            'truncated': self.truncated,
+            'duration': self.duration,
+            'cpu_time': self.cpu_time
+        }
+
+
+class SandboxWorker:
+    """Một tiến trình Python khởi động sẵn, nhận code qua pipe.
+
+    Mỗi lần chạy diễn ra trong một tiến trình con fork mới từ worker (xem
+    sandbox_worker.py), nên không có trạng thái nào sót lại giữa các lần chạy.
+    """
+
+    def __init__(self, boot_timeout=10.0):
+        self.runs = 0
+        # Worker không fork được thì chỉ dùng một lần (worker tự báo `recycle`)
+        self.spent = False
+        self.boot_timeout = boot_timeout
+        self.workdir = tempfile.mkdtemp(prefix='codequest-sandbox-')
+        self._ready = False
+        self._messages = queue.Queue()
+
+        self.proc = subprocess.Popen(
+            [sys.executable, '-u', WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.workdir,
+            env=sandbox_env(),
+            # Process group riêng: kill() giết cả tiến trình con đang chạy code
+            start_new_session=os.name == 'posix'
+        )
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def _read_loop(self):
+        try:
+            while True:
+                message = read_message(self.proc.stdout)
+                if message is None:
+                    break
+                self._messages.put(message)
+        except Exception:
+            pass
+        finally:
+            self._messages.put(None)
+
+    def _wait_ready(self):
+        if self._ready:
+            return
+        try:
+            message = self._messages.get(timeout=self.boot_timeout)
+        except queue.Empty:
+            raise SandboxError('Sandbox worker khởi động quá lâu')
+        if not message or message.get('type') != 'ready':
+            raise SandboxError('Sandbox worker bị lỗi khi khởi động')
+        self._ready = True
+
+    def execute(self, code, timeout, stdin='', max_output=None):
+        """Chạy code; trả về ExecutionResult. Worker hỏng/quá giờ thì alive = False"""
+        for event in self.execute_iter(code, timeout, stdin, max_output):
+            if event[0] == 'exit':
+                return event[1]
+
+    def execute_iter(self, code, timeout, stdin='', max_output=None, stream=False):
+        """Generator: ('stdout'|'stderr', text) cho từng chunk (khi stream=True),
+        cuối cùng là ('exit', ExecutionResult)"""
+        self._wait_ready()
+        self.runs += 1
+        started = time.monotonic()
+        deadline = started + timeout
+        request = {'code': code, 'stdin': stdin, 'stream': stream}
+        if max_output is not None:
+            request['max_output'] = max_output
+        try:
+            write_message(self.proc.stdin, request)
+        except (BrokenPipeError, OSError):
+            self.kill()
+            raise SandboxError('Sandbox worker đã dừng')
+
+        while True:
+            try:
+                message = self._messages.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.kill()
+                yield 'exit', ExecutionResult(returncode=None, timed_out=True,
+                                              duration=time.monotonic() - started)
+                return
+
+            if message is None:
+                self.kill()
+                yield 'exit', ExecutionResult(returncode=-1, stderr='Sandbox worker crashed',
+                                              duration=time.monotonic() - started)
+                return
+
+            if message.get('type') == 'chunk':
+                yield message['stream'], message['data']
+                continue
+
+            if message.get('recycle'):
+                self.spent = True
+            yield 'exit', ExecutionResult(
+                returncode=message['returncode'],
+                stdout=message['stdout'],
+                stderr=message['stderr'],
+                truncated=message.get('truncated', False),
+                duration=message['duration'],
+                cpu_time=message.get('cpu_time')
+            )
+            return
+
+    def kill(self):
+        try:
+            if os.name == 'posix':
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            elif self.alive:
+                self.proc.kill()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class ExecutionStream:
+    """Iterator các sự kiện output của một lần chạy dạng stream.
+
+    close() (Werkzeug gọi khi client ngắt kết nối) luôn trả worker về pool,
+    kể cả khi stream chưa được đọc lần nào.
+    """
+
+    def __init__(self, pool, worker, events, max_output):
+        # Hạn mức output thực tế của lần chạy này (sau khi kẹp theo pool)
+        self.max_output = max_output
+        self._pool = pool
+        self._worker = worker
+        self._events = events
+        self._finished = False
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            event = next(self._events)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception:
+            self.close()
+            raise
+        if event[0] == 'exit':
+            self._finished = True
+            self._pool._record(self._worker, event[1])
+        return event
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._events.close()
+        if not self._finished:
+            # Code còn đang chạy dở trong worker: không dùng lại được
+            self._worker.kill()
+        self._pool._release(self._worker)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SandboxPool:
+    """Pool các worker Python khởi động sẵn cho /api/execute-python.
+
+    - size: số worker tối đa chạy song song
+    - max_runs: worker (zygote, mỗi lần chạy là một tiến trình con mới)
+      được thay mới sau từng ấy lần chạy
+    - max_queue: số request tối đa được xếp hàng chờ worker rảnh
+    - queue_timeout: số giây tối đa chờ worker rảnh
+    - max_output: số byte output (stdout + stderr) tối đa mỗi lần chạy,
+      phần vượt quá bị cắt ngay trong worker
+    Worker bị thay mới ngay nếu chạy quá giờ hoặc bị crash.
+    """
+
+    def __init__(self, size=4, max_runs=50, max_queue=32, queue_timeout=10.0, max_timeout=30.0,
+                 max_output=1024 * 1024):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_timeout = max_timeout
+        self.max_output = max_output
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._count = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._runs = 0
+        self._timeouts = 0
+        self._crashes = 0
+        self._recycled = 0
+        self._rejected = 0
+        self._truncated = 0
+        self._queue_wait = 0.0
+
+    def init_app(self, app):
+        """Đọc cấu hình SANDBOX_* từ Flask app"""
+        app.config.setdefault('SANDBOX_POOL_SIZE', int(os.environ.get('SANDBOX_POOL_SIZE', 4)))
+        app.config.setdefault('SANDBOX_MAX_RUNS', int(os.environ.get('SANDBOX_MAX_RUNS', 50)))
+        app.config.setdefault('SANDBOX_MAX_QUEUE', int(os.environ.get('SANDBOX_MAX_QUEUE', 32)))
+        app.config.setdefault('SANDBOX_QUEUE_TIMEOUT', float(os.environ.get('SANDBOX_QUEUE_TIMEOUT', 10)))
+        app.config.setdefault('SANDBOX_MAX_TIMEOUT', float(os.environ.get('SANDBOX_MAX_TIMEOUT', 30)))
+        app.config.setdefault('SANDBOX_MAX_OUTPUT', int(os.environ.get('SANDBOX_MAX_OUTPUT', 1024 * 1024)))
+
+        self.size = app.config['SANDBOX_POOL_SIZE']
+        self.max_runs = app.config['SANDBOX_MAX_RUNS']
+        self.max_queue = app.config['SANDBOX_MAX_QUEUE']
+        self.queue_timeout = app.config['SANDBOX_QUEUE_TIMEOUT']
+        self.max_timeout = app.config['SANDBOX_MAX_TIMEOUT']
+        self.max_output = app.config['SANDBOX_MAX_OUTPUT']
+        app.extensions['sandbox_pool'] = self
+
+    def start(self):
+        """Khởi động sẵn đủ `size` worker"""
+        with self._cond:
+            missing = max(self.size - self._count, 0)
+            self._count += missing
+        for _ in range(missing):
+            # Khởi động ngoài lock: request khác vẫn mượn/trả worker được trong lúc chờ
+            try:
+                worker = SandboxWorker()
+            except Exception as e:
+                print(f"Sandbox worker spawn error: {e}")
+                worker = None
+            self._add(worker)
+
+    def run(self, code, timeout=5, stdin='', max_output=None, deadline=None):
+        """Chạy code trên một worker rảnh; ném SandboxBusy nếu hàng đợi đầy.
+
+        `deadline` (theo time.monotonic()) là hạn chót của cả lần chạy, tính cả
+        thời gian chờ worker: quá hạn thì worker đang chạy bị kill như quá giờ.
+        """
+        timeout = min(float(timeout), self.max_timeout)
+        max_output = self._output_limit(max_output)
+        worker = self._acquire(deadline)
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                # Hết hạn ngay khi vừa có worker: không gửi code đi nữa
+                self._release(worker)
+                return ExecutionResult(returncode=None, timed_out=True)
+        try:
+            result = worker.execute(code, timeout, stdin, max_output)
+        except Exception:
+            self._release(worker)
+            raise
+
+        self._record(worker, result)
+        self._release(worker)
+        return result
+
+    def stream(self, code, timeout=5, stdin='', max_output=None):
+        """Như run() nhưng trả về ExecutionStream các chunk output trong lúc code chạy:
+        ('stdout'|'stderr', text)... rồi ('exit', ExecutionResult).
+
+        Worker được mượn ngay (SandboxBusy ném ra trước khi bắt đầu stream);
+        nếu client bỏ ngang, worker đang chạy dở sẽ bị thay mới.
+        """
+        timeout = min(float(timeout), self.max_timeout)
+        max_output = self._output_limit(max_output)
+        worker = self._acquire()
+        return ExecutionStream(self, worker, worker.execute_iter(
+            code, timeout, stdin, max_output, stream=True), max_output)
+
+    def _output_limit(self, max_output):
+        if max_output is None:
+            return self.max_output
+        return max(min(int(max_output), self.max_output), 0)
+
+    def _record(self, worker, result):
+        with self._cond:
+            self._runs += 1
+            if result.timed_out:
+                self._timeouts += 1
+            elif not worker.alive:
+                self._crashes += 1
+            if result.truncated:
+                self._truncated += 1
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.kill()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'workers': self._count,
+                'idle': len(self._idle),
+                'queued': self._waiting,
+                'max_queue': self.max_queue,
+                'runs': self._runs,
+                'timeouts': self._timeouts,
+                'crashes': self._crashes,
+                'recycled': self._recycled,
+                'rejected': self._rejected,
+                'truncated': self._truncated,
+                'queue_wait_total': round(self._queue_wait, 6)
+            }
+
+    def _acquire(self, run_deadline=None):
+        deadline = time.monotonic() + self.queue_timeout
+        if run_deadline is not None:
+            deadline = min(deadline, run_deadline)
+        started = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise SandboxError('Sandbox pool đã dừng')
+            if not self._idle and self._count >= self.size and self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise SandboxBusy('Hệ thống đang bận, vui lòng thử lại sau')
+
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        worker = self._idle.pop()
+                        break
+                    if self._count < self.size:
+                        self._count += 1
+                        worker = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise SandboxBusy('Hệ thống đang bận, vui lòng thử lại sau')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+                self._queue_wait += time.monotonic() - started
+
+        if worker is None:
+            try:
+                worker = SandboxWorker()
+            except Exception:
+                with self._cond:
+                    self._count -= 1
+                    self._cond.notify()
+                raise
+        return worker
+
+    def _release(self, worker):
+        recycle = not worker.alive or worker.spent or worker.runs >= self.max_runs
+        if recycle:
+            worker.kill()
+            with self._cond:
+                self._recycled += 1
+            worker = None
+            if not self._closed:
+                # Thay worker mới ngay để pool luôn "ấm"; khởi động ngoài lock
+                try:
+                    worker = SandboxWorker()
+                except Exception as e:
+                    print(f"Sandbox worker spawn error: {e}")
+        self._add(worker)
+
+    def _add(self, worker):
+        """Đưa worker (đã được tính trong _count) về danh sách rảnh; None: bỏ chỗ của nó"""
+        with self._cond:
+            if worker is not None and not self._closed:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._count -= 1
+            self._cond.notify()
+        if worker is not None:
+            worker.kill()
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,310 @@
+"""Tiến trình worker của sandbox pool (xem utils/sandbox.py).
+
+File này được chạy trực tiếp bằng `python sandbox_worker.py`, không import
+qua package utils, nên chỉ được dùng thư viện chuẩn.
+
+Giao thức: mỗi message là 4 byte độ dài (big-endian) + JSON UTF-8, đi qua
+stdin/stdout gốc của tiến trình. Ngay khi khởi động, worker giữ lại hai fd đó
+cho giao thức và trỏ fd 0/1/2 về devnull để code người dùng không thể ghi
+lẫn vào kênh giao thức.
+
+Worker là một "zygote": import sẵn các module hay dùng rồi fork một tiến
+trình con mới cho mỗi lần chạy. Code người dùng chỉ sửa được bộ nhớ của
+tiến trình con (kể cả monkey-patch module đã import, thread tự tạo), tất cả
+mất khi con thoát, nên lần chạy sau (có thể của user khác) luôn bắt đầu từ
+trạng thái sạch. Tiến trình con đóng kênh giao thức trước khi chạy code và
+gửi output/kết quả qua một pipe riêng của lần chạy; zygote kiểm tra từng
+message rồi mới chuyển cho pool, thời gian chạy và CPU do zygote tự đo. Nền
+tảng không có os.fork chạy code ngay trong worker và báo `recycle` để pool
+thay worker mới sau mỗi lần chạy.
+"""
+import builtins
+import io
+import json
+import os
+import struct
+import sys
+import time
+import traceback
+
+# Import sẵn trong zygote để tiến trình con không phải import lại
+PRELOAD_MODULES = (
+    'collections', 'functools', 'itertools', 'math', 'random', 're', 'string',
+    'heapq', 'bisect', 'datetime', 'decimal', 'fractions', 'statistics', 'copy'
+)
+
+_HEADER = struct.Struct('>I')
+# Giữ tham chiếu lúc import: code người dùng sửa json.dumps/json.loads không ảnh hưởng giao thức
+_dumps = json.dumps
+_loads = json.loads
+DEFAULT_MAX_OUTPUT = 1024 * 1024
+
+
+def read_message(stream, max_size=None):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if max_size is not None and length > max_size:
+        raise ValueError(f'message {length} byte vượt giới hạn {max_size}')
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return _loads(payload.decode('utf-8'))
+
+
+def write_message(stream, message):
+    payload = _dumps(message).encode('utf-8')
+    stream.write(_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+class _OutputBudget:
+    """Hạn mức byte output (stdout + stderr) cho một lần chạy"""
+
+    def __init__(self, limit):
+        self.remaining = limit
+        self.truncated = False
+
+
+class _OutputStream(io.TextIOBase):
+    """Thay cho sys.stdout/sys.stderr: cắt output khi vượt hạn mức.
+
+    Chế độ stream: gom các lần ghi và gửi từng chunk qua kênh giao thức
+    (khi gặp xuống dòng, đủ CHUNK_SIZE hoặc đã quá CHUNK_INTERVAL giây),
+    worker không giữ toàn bộ output trong bộ nhớ.
+    """
+
+    CHUNK_SIZE = 4096
+    CHUNK_INTERVAL = 0.05
+
+    def __init__(self, name, budget, emit=None):
+        self.name = name
+        self.budget = budget
+        self.emit = emit
+        self._parts = []
+        self._pending_size = 0
+        self._last_emit = time.monotonic()
+
+    def writable(self):
+        return True
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(f'write() argument must be str, not {type(text).__name__}')
+        written = len(text)
+        if self.budget.truncated or not text:
+            return written
+
+        data = text.encode('utf-8', errors='replace')
+        if len(data) > self.budget.remaining:
+            text = data[:self.budget.remaining].decode('utf-8', errors='ignore')
+            data = text.encode('utf-8')
+            self.budget.truncated = True
+        self.budget.remaining -= len(data)
+
+        self._parts.append(text)
+        self._pending_size += len(data)
+        if self.emit and ('\n' in text or self._pending_size >= self.CHUNK_SIZE
+                          or time.monotonic() - self._last_emit >= self.CHUNK_INTERVAL
+                          or self.budget.truncated):
+            self.flush()
+        return written
+
+    def flush(self):
+        if self.emit and self._parts:
+            self.emit(self.name, ''.join(self._parts))
+            self._parts = []
+            self._pending_size = 0
+            self._last_emit = time.monotonic()
+
+    def getvalue(self):
+        return ''.join(self._parts)
+
+
+def _print_user_traceback(stderr):
+    """In traceback, bỏ frame của chính worker"""
+    etype, value, tb = sys.exc_info()
+    if tb is not None:
+        tb = tb.tb_next
+    traceback.print_exception(etype, value, tb, file=stderr)
+
+
+def run_code(code, stdin_text, max_output, emit=None):
+    budget = _OutputBudget(max_output)
+    stdout = _OutputStream('stdout', budget, emit)
+    stderr = _OutputStream('stderr', budget, emit)
+    returncode = 0
+    namespace = {'__name__': '__main__', '__builtins__': builtins}
+
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin = io.StringIO(stdin_text or '')
+    sys.stdout = stdout
+    sys.stderr = stderr
+    sys.argv[:] = ['<string>']
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        exec(compile(code, '<string>', 'exec'), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=stderr)
+            returncode = 1
+    except BaseException:
+        _print_user_traceback(stderr)
+        returncode = 1
+    finally:
+        duration = time.perf_counter() - started
+        cpu_time = time.process_time() - cpu_started
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+
+    stdout.flush()
+    stderr.flush()
+    return {
+        'type': 'result',
+        'returncode': returncode,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'truncated': budget.truncated,
+        'duration': duration,
+        'cpu_time': cpu_time
+    }
+
+
+def _result_fields(message):
+    """Các trường kết quả do tiến trình con gửi, đã kiểm tra kiểu; None nếu không hợp lệ"""
+    returncode, stdout, stderr = message.get('returncode'), message.get('stdout'), message.get('stderr')
+    if type(returncode) is not int or not isinstance(stdout, str) or not isinstance(stderr, str):
+        return None
+    return {'returncode': returncode, 'stdout': stdout, 'stderr': stderr,
+            'truncated': bool(message.get('truncated'))}
+
+
+def _drain(stream):
+    while stream.read(65536):
+        pass
+
+
+def run_forked(request, proto_in, proto_out):
+    """Chạy một request trong tiến trình con fork từ zygote; trả về message kết quả.
+
+    Code người dùng ghi bậy vào pipe của lần chạy chỉ làm hỏng kết quả của
+    chính lần chạy đó, không chen được message vào kênh giao thức với pool.
+    """
+    max_output = request.get('max_output', DEFAULT_MAX_OUTPUT)
+    # JSON có thể nở tới 6 lần (\u00XX) so với output gốc
+    max_frame = 6 * max_output + 65536
+    stream = bool(request.get('stream'))
+    run_read, run_write = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            os.close(run_read)
+            # Đóng kênh giao thức trước khi chạy code người dùng
+            proto_in.close()
+            proto_out.close()
+            channel = os.fdopen(run_write, 'wb')
+            # Con kế thừa trạng thái random của zygote: seed lại để mỗi lần chạy khác nhau
+            sys.modules['random'].seed()
+            emit = None
+            if stream:
+                def emit(name, data):
+                    write_message(channel, {'type': 'chunk', 'stream': name, 'data': data})
+            result = run_code(request.get('code', ''), request.get('stdin', ''), max_output, emit)
+            write_message(channel, result)
+        except BaseException:
+            status = 70
+        finally:
+            # Thoát ngay: không chạy atexit/finalizer của code người dùng, mọi thread chết theo
+            os._exit(status)
+
+    os.close(run_write)
+    fields = None
+    forwarded = 0
+    with os.fdopen(run_read, 'rb') as channel:
+        try:
+            while True:
+                message = read_message(channel, max_frame)
+                if message is None:
+                    break
+                if not isinstance(message, dict):
+                    raise ValueError('message không hợp lệ')
+                if message.get('type') == 'result':
+                    fields = _result_fields(message)
+                elif message.get('type') == 'chunk' and stream and forwarded < max_output:
+                    name, data = message.get('stream'), message.get('data')
+                    if name in ('stdout', 'stderr') and isinstance(data, str):
+                        forwarded += len(data.encode('utf-8', errors='replace'))
+                        write_message(proto_out, {'type': 'chunk', 'stream': name, 'data': data})
+        except (ValueError, UnicodeDecodeError):
+            fields = None
+            _drain(channel)
+    _, status, usage = os.wait4(pid, 0)
+    duration = time.perf_counter() - started
+    if fields is not None:
+        return dict(fields, type='result', duration=duration, cpu_time=usage.ru_utime + usage.ru_stime)
+
+    # Con thoát trước khi gửi kết quả (os._exit, bị signal...) hoặc gửi kết quả hỏng
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status) or 1
+    return {
+        'type': 'result',
+        'returncode': returncode,
+        'stdout': '',
+        'stderr': f'Process exited with code {returncode} before reporting a result',
+        'truncated': False,
+        'duration': duration,
+        'cpu_time': None
+    }
+
+
+def main():
+    proto_in = os.fdopen(os.dup(0), 'rb')
+    proto_out = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    can_fork = hasattr(os, 'fork')
+    if can_fork:
+        for name in PRELOAD_MODULES:
+            try:
+                __import__(name)
+            except ImportError:
+                pass
+    write_message(proto_out, {'type': 'ready', 'pid': os.getpid()})
+
+    while True:
+        request = read_message(proto_in)
+        if request is None:
+            break
+        if can_fork:
+            write_message(proto_out, run_forked(request, proto_in, proto_out))
+            continue
+
+        emit = None
+        if request.get('stream'):
+            def emit(name, data):
+                write_message(proto_out, {'type': 'chunk', 'stream': name, 'data': data})
+        result = run_code(request.get('code', ''), request.get('stdin', ''),
+                          request.get('max_output', DEFAULT_MAX_OUTPUT), emit)
+        # Không cô lập được giữa các lần chạy: worker thoát, pool khởi động worker mới
+        result['recycle'] = True
+        write_message(proto_out, result)
+        break
+
+
+if __name__ == '__main__':
+    main()
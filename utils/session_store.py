@@ -0,0 +1,517 @@
+import atexit
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from database.pool import db_pool
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session lưu phía server; cookie chỉ chứa session id đã ký"""
+
+    def __init__(self, initial=None, sid=None, new=False, digest=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.digest = digest
+        # Hạn đang lưu ở server (None với session mới)
+        self.expires_at = expires_at
+        # sid cũ cần xóa ở server sau regenerate()
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """Đổi sang session id mới, giữ nguyên dữ liệu; sid cũ bị xóa khi lưu session.
+
+        Gọi khi đăng nhập/đăng xuất để sid bị lộ (hoặc bị cài sẵn) trước đó
+        không dùng được nữa.
+        """
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.digest = None
+        self.expires_at = None
+        self.modified = True
+
+
+class SQLiteSessionBackend:
+    """Tầng lưu bền bằng file SQLite (dùng chung cho các worker trên cùng máy)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def load(self, sid):
+        row = self._conn().execute(
+            'SELECT data, expires_at, version FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    def version(self, sid):
+        row = self._conn().execute(
+            'SELECT version, expires_at FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save_many(self, rows):
+        with self._conn() as conn:
+            conn.executemany(
+                'INSERT INTO sessions (sid, data, expires_at, version) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at, '
+                'version = excluded.version',
+                rows)
+
+    def touch_many(self, rows):
+        with self._conn() as conn:
+            conn.executemany('UPDATE sessions SET expires_at = MAX(expires_at, ?) WHERE sid = ?', rows)
+
+    def delete_many(self, sids):
+        with self._conn() as conn:
+            conn.executemany('DELETE FROM sessions WHERE sid = ?', [(sid,) for sid in sids])
+
+    def purge(self, now):
+        with self._conn() as conn:
+            return conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,)).rowcount
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            if not self._schema_ready:
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                                 'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, version TEXT)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+                    columns = [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+                    if 'version' not in columns:
+                        conn.execute('ALTER TABLE sessions ADD COLUMN version TEXT')
+                self._schema_ready = True
+        return conn
+
+
+class PostgresSessionBackend:
+    """Tầng lưu bền bằng bảng web_sessions trong PostgreSQL (dùng chung mọi máy)"""
+
+    def __init__(self, pool=None):
+        self.pool = pool or db_pool
+        self._schema_ready = False
+
+    def load(self, sid):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.execute('SELECT data, expires_at, version FROM web_sessions WHERE sid = %s', (sid,))
+            row = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        return (row[0], row[1], row[2]) if row else None
+
+    def version(self, sid):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.execute('SELECT version, expires_at FROM web_sessions WHERE sid = %s', (sid,))
+            row = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        return (row[0], row[1]) if row else None
+
+    def save_many(self, rows):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.executemany('''
+                INSERT INTO web_sessions (sid, data, expires_at, version) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (sid) DO UPDATE SET
+                    data = EXCLUDED.data, expires_at = EXCLUDED.expires_at, version = EXCLUDED.version
+            ''', rows)
+            conn.commit()
+            cursor.close()
+
+    def touch_many(self, rows):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.executemany('''
+                UPDATE web_sessions SET expires_at = GREATEST(expires_at, %s) WHERE sid = %s
+            ''', rows)
+            conn.commit()
+            cursor.close()
+
+    def delete_many(self, sids):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.execute('DELETE FROM web_sessions WHERE sid = ANY(%s)', (list(sids),))
+            conn.commit()
+            cursor.close()
+
+    def purge(self, now):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema(cursor)
+            cursor.execute('DELETE FROM web_sessions WHERE expires_at < %s', (now,))
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        return deleted
+
+    def _ensure_schema(self, cursor):
+        if self._schema_ready:
+            return
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS web_sessions (
+                sid VARCHAR(64) PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at DOUBLE PRECISION NOT NULL,
+                version VARCHAR(32)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_web_sessions_expires_at ON web_sessions (expires_at)')
+        cursor.execute('ALTER TABLE web_sessions ADD COLUMN IF NOT EXISTS version VARCHAR(32)')
+        self._schema_ready = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session lưu phía server thay cho cookie chứa toàn bộ dữ liệu.
+
+    - cookie chỉ chứa session id đã ký, kích thước cố định
+    - dữ liệu session nằm trong LRU trong process (`max_entries` session gần
+      nhất); mỗi lần ghi gắn một version mới. Bản trong LRU được dùng thẳng
+      trong `cache_ttl` giây kể từ lần đối chiếu gần nhất; quá hạn đó mới so
+      version với tầng lưu bền (chỉ đọc cột version, không đọc lại dữ liệu), nên
+      process khác sửa hay xóa session thì bản cũ bị bỏ chậm nhất sau cache_ttl
+      giây (cache_ttl = 0: đối chiếu ở mọi request)
+    - tầng lưu bền (SQLite hoặc PostgreSQL) được ghi trễ (write-behind): thay
+      đổi gom lại và ghi theo lô mỗi `flush_interval` giây bởi một luồng nền;
+      process khác chỉ thấy thay đổi sau khi được ghi, flush_interval = 0 thì
+      ghi ngay trong request
+    - session hết hạn được dọn định kỳ mỗi `sweep_interval` giây
+
+    Dữ liệu session chỉ được ghi khi nội dung thực sự đổi (so sánh hash), kể
+    cả khi code sửa list/dict lồng bên trong mà không gán lại. Nội dung không
+    đổi thì chỉ gia hạn expires_at (khi hạn mới xa hơn hạn đang lưu ít nhất
+    EXPIRY_REFRESH_SECONDS), không ghi đè dữ liệu process khác vừa ghi.
+    """
+
+    # Chỉ gia hạn session ở server khi hạn mới xa hơn hạn đang lưu ít nhất chừng này giây
+    EXPIRY_REFRESH_SECONDS = 60
+
+    serializer = TaggedJSONSerializer()
+    salt = 'codequest-session'
+
+    def __init__(self, backend=None, max_entries=10000, flush_interval=1.0, sweep_interval=300, cache_ttl=5.0):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cache = OrderedDict()  # sid -> (data, expires_at, version)
+        self._checked = {}           # sid -> time.monotonic() lần cuối bản trong cache khớp tầng lưu bền
+        self._dirty = {}             # sid -> (data, expires_at, version) | None (xóa)
+        self._touched = {}           # sid -> expires_at mới (chỉ gia hạn)
+        self._thread = None
+        self._last_sweep = time.time()
+
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._checks = 0
+        self._writes = 0
+        self._touches = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._purged = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình SESSION_* từ Flask app và thay session interface mặc định"""
+        app.config.setdefault('SESSION_BACKEND', os.environ.get('SESSION_BACKEND', 'sqlite'))
+        app.config.setdefault('SESSION_SQLITE_PATH', os.environ.get(
+            'SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.db')))
+        app.config.setdefault('SESSION_CACHE_SIZE', int(os.environ.get('SESSION_CACHE_SIZE', 10000)))
+        app.config.setdefault('SESSION_CACHE_TTL', float(os.environ.get('SESSION_CACHE_TTL', 5)))
+        app.config.setdefault('SESSION_FLUSH_INTERVAL', float(os.environ.get('SESSION_FLUSH_INTERVAL', 1)))
+        app.config.setdefault('SESSION_SWEEP_INTERVAL', int(os.environ.get('SESSION_SWEEP_INTERVAL', 300)))
+
+        if app.config['SESSION_BACKEND'] == 'postgres':
+            self.backend = PostgresSessionBackend()
+        else:
+            self.backend = SQLiteSessionBackend(app.config['SESSION_SQLITE_PATH'])
+        self.max_entries = app.config['SESSION_CACHE_SIZE']
+        self.cache_ttl = app.config['SESSION_CACHE_TTL']
+        self.flush_interval = app.config['SESSION_FLUSH_INTERVAL']
+        self.sweep_interval = app.config['SESSION_SWEEP_INTERVAL']
+        app.session_interface = self
+        app.extensions['session_store'] = self
+
+    # ---- Flask SessionInterface ----
+
+    def open_session(self, app, request):
+        signer = self._signer(app)
+        if signer is None:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+            entry = self._load(sid) if sid else None
+            if entry is not None:
+                data, expires_at = entry[0], entry[1]
+                return ServerSession(self.serializer.loads(data), sid=sid, digest=self._digest(data),
+                                     expires_at=expires_at)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            self._store(session.previous_sid, None)
+
+        if not session:
+            if not session.new or session.previous_sid is not None:
+                response.vary.add('Cookie')
+                if not session.new:
+                    self._store(session.sid, None)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        response.vary.add('Cookie')
+        data = self.serializer.dumps(dict(session))
+        expires = self.get_expiration_time(app, session)
+        expires_at = expires.timestamp() if expires else time.time() + app.permanent_session_lifetime.total_seconds()
+        if self._digest(data) != session.digest:
+            self._store(session.sid, (data, expires_at, secrets.token_hex(8)))
+        elif expires_at - (session.expires_at or 0) >= self.EXPIRY_REFRESH_SECONDS:
+            # Nội dung không đổi nhưng cookie được gia hạn: gia hạn cả bản ở server
+            self._touch(session.sid, expires_at)
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode('utf-8'),
+                                expires=expires, httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+    # ---- cache + write-behind ----
+
+    def flush(self):
+        """Ghi toàn bộ thay đổi đang chờ xuống tầng lưu bền"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._dirty = self._dirty, {}
+                touched, self._touched = self._touched, {}
+            if not pending and not touched:
+                return 0
+            upserts = [(sid,) + entry for sid, entry in pending.items() if entry is not None]
+            deletes = [sid for sid, entry in pending.items() if entry is None]
+            try:
+                if upserts:
+                    self.backend.save_many(upserts)
+                if deletes:
+                    self.backend.delete_many(deletes)
+                if touched:
+                    self.backend.touch_many([(expires_at, sid) for sid, expires_at in touched.items()])
+            except Exception as e:
+                print(f"Session flush error: {e}")
+                with self._lock:
+                    self._flush_errors += 1
+                    # Giữ lại để thử lại lần sau, không đè lên thay đổi mới hơn
+                    for sid, entry in pending.items():
+                        self._dirty.setdefault(sid, entry)
+                    for sid, expires_at in touched.items():
+                        self._touched[sid] = max(expires_at, self._touched.get(sid, 0))
+                return 0
+            with self._lock:
+                self._flushes += 1
+            return len(pending) + len(touched)
+
+    def sweep(self):
+        """Dọn session hết hạn ở tầng lưu bền và trong cache"""
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, (_, expires_at, _) in self._cache.items() if expires_at < now]:
+                del self._cache[sid]
+                self._checked.pop(sid, None)
+        try:
+            purged = self.backend.purge(now)
+        except Exception as e:
+            print(f"Session sweep error: {e}")
+            return 0
+        with self._lock:
+            self._purged += purged
+        return purged
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': type(self.backend).__name__,
+                'cached': len(self._cache),
+                'pending_writes': len(self._dirty) + len(self._touched),
+                'hits': self._hits,
+                'misses': self._misses,
+                'stale': self._stale,
+                'checks': self._checks,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'writes': self._writes,
+                'touches': self._touches,
+                'flushes': self._flushes,
+                'flush_errors': self._flush_errors,
+                'purged': self._purged
+            }
+
+    def _load(self, sid):
+        """(data, expires_at, version) của session còn hạn, hoặc None"""
+        now = time.time()
+        with self._lock:
+            if sid in self._dirty:
+                # Thay đổi chưa ghi của chính process này là bản mới nhất
+                self._hits += 1
+                entry = self._dirty[sid]
+                return entry if entry is not None and entry[1] >= now else None
+            cached = self._cache.get(sid)
+            if cached is not None:
+                self._cache.move_to_end(sid)
+                checked = self._checked.get(sid)
+                if checked is not None and time.monotonic() - checked < self.cache_ttl:
+                    self._hits += 1
+                    return cached if cached[1] >= now else None
+                self._checks += 1
+
+        if cached is not None:
+            # Process khác có thể đã sửa/xóa session: chỉ so version, không đọc lại dữ liệu
+            try:
+                current = self.backend.version(sid)
+            except Exception as e:
+                print(f"Session load error: {e}")
+                current = cached[2], cached[1]
+            with self._lock:
+                if current is not None and current[0] == cached[2]:
+                    self._hits += 1
+                    # expires_at có thể đã được process khác gia hạn
+                    entry = (cached[0], max(cached[1], current[1]), cached[2])
+                    if sid in self._cache:
+                        self._cache[sid] = entry
+                        self._checked[sid] = time.monotonic()
+                    return entry if entry[1] >= now else None
+                self._stale += 1
+                self._cache.pop(sid, None)
+                self._checked.pop(sid, None)
+            if current is None:
+                return None
+
+        with self._lock:
+            self._misses += 1
+        try:
+            entry = self.backend.load(sid)
+        except Exception as e:
+            print(f"Session load error: {e}")
+            return None
+        if entry is None or entry[1] < now:
+            return None
+        self._cache_put(sid, entry)
+        return entry
+
+    def _store(self, sid, entry):
+        with self._lock:
+            self._writes += 1
+            if entry is None:
+                self._cache.pop(sid, None)
+                self._checked.pop(sid, None)
+            else:
+                self._cache_set(sid, entry)
+            self._dirty[sid] = entry
+            self._touched.pop(sid, None)
+        self._schedule_flush()
+
+    def _touch(self, sid, expires_at):
+        with self._lock:
+            self._touches += 1
+            if sid in self._dirty:
+                # Đang chờ ghi cả session (hoặc xóa): gia hạn luôn bản chờ ghi
+                entry = self._dirty[sid]
+                if entry is None:
+                    return
+                self._dirty[sid] = (entry[0], max(entry[1], expires_at), entry[2])
+            else:
+                self._touched[sid] = max(expires_at, self._touched.get(sid, 0))
+            cached = self._cache.get(sid)
+            if cached is not None:
+                self._cache[sid] = (cached[0], max(cached[1], expires_at), cached[2])
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _cache_put(self, sid, entry):
+        with self._lock:
+            self._cache_set(sid, entry)
+
+    def _cache_set(self, sid, entry):
+        # Gọi khi đang giữ lock; entry vừa đọc/ghi ở tầng lưu bền nên coi như đã đối chiếu
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        self._checked[sid] = time.monotonic()
+        self._trim()
+
+    def _trim(self):
+        # Gọi khi đang giữ lock; session bị đẩy ra vẫn nằm trong _dirty tới khi được ghi
+        while len(self._cache) > self.max_entries:
+            sid, _ = self._cache.popitem(last=False)
+            self._checked.pop(sid, None)
+
+    def _ensure_flusher(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._flush_loop, name='session-flusher', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.time() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.time()
+                self.sweep()
+
+    def _signer(self, app):
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac', digest_method=hashlib.sha256)
+
+    @staticmethod
+    def _digest(data):
+        return hashlib.sha1(data.encode('utf-8')).digest()
+
+
+session_store = ServerSessionInterface()
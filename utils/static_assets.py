@@ -0,0 +1,163 @@
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, send_file, send_from_directory
+
+MANIFEST_NAME = 'manifest.json'
+# Thứ tự ưu tiên khi client nhận nhiều kiểu nén
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class _BuiltAsset:
+    """Một file có hash trong bản build cùng các bản nén sẵn của nó"""
+
+    __slots__ = ('logical', 'path', 'mimetype', 'hash', 'variants')
+
+    def __init__(self, logical, path, digest, encodings):
+        self.logical = logical
+        self.path = path
+        self.mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+        self.hash = digest
+        self.variants = {encoding: path + suffix for encoding, suffix in ENCODINGS if encoding in encodings}
+
+
+class StaticAssets:
+    """Phục vụ /assets/<path> từ bản build của scripts/build_assets.py.
+
+    - file có hash trong tên (thay đổi nội dung = đổi tên) được cache một
+      năm với Cache-Control: immutable, ETag là hash nội dung
+    - chọn bản .br/.gz nén sẵn theo Accept-Encoding (kèm Vary), không nén
+      lúc chạy
+    - tên gốc không hash (chưa build, hoặc JS tự ghép đường dẫn) được phục
+      vụ từ assets/ với Cache-Control: no-cache để trình duyệt luôn hỏi lại
+    Request có If-None-Match/If-Modified-Since khớp nhận 304.
+
+    Khi có bản build, template được đọc từ build/pages (đường dẫn asset đã
+    viết lại). Bản build cũ hơn mã nguồn trong assets/ hoặc pages/ bị bỏ qua.
+    """
+
+    def __init__(self, source_dir=None, build_dir=None, max_age=31536000):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._assets = {}
+        self._urls = {}
+
+        self._served = {'br': 0, 'gzip': 0, 'identity': 0}
+        self._not_modified = 0
+        self._fallbacks = 0
+
+    def init_app(self, app):
+        """Đọc cấu hình STATIC_* từ Flask app"""
+        app.config.setdefault('STATIC_SOURCE_DIR', os.path.join(app.root_path, 'assets'))
+        app.config.setdefault('STATIC_BUILD_DIR', os.environ.get('STATIC_BUILD_DIR', os.path.join(app.root_path, 'build')))
+        app.config.setdefault('STATIC_MAX_AGE', int(os.environ.get('STATIC_MAX_AGE', 31536000)))
+
+        self.source_dir = app.config['STATIC_SOURCE_DIR']
+        self.build_dir = app.config['STATIC_BUILD_DIR']
+        self.max_age = app.config['STATIC_MAX_AGE']
+        self.load(template_dir=os.path.join(app.root_path, app.template_folder))
+
+        pages_dir = os.path.join(self.build_dir, 'pages') if self.build_dir else None
+        if self._assets and os.path.isdir(pages_dir):
+            app.template_folder = pages_dir
+        app.extensions['static_assets'] = self
+
+    @property
+    def enabled(self):
+        return bool(self._assets)
+
+    def load(self, template_dir=None):
+        """Đọc manifest của bản build; trả về số asset có hash"""
+        assets, urls = {}, {}
+        manifest_path = os.path.join(self.build_dir, 'assets', MANIFEST_NAME) if self.build_dir else None
+        if manifest_path and os.path.exists(manifest_path):
+            if self._is_stale(manifest_path, template_dir):
+                print("⚠️  Bản build asset cũ hơn mã nguồn, bỏ qua (chạy lại scripts/build_assets.py)")
+            else:
+                try:
+                    with open(manifest_path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)['assets']
+                    for logical, entry in manifest.items():
+                        path = os.path.join(self.build_dir, 'assets', *entry['file'].split('/'))
+                        assets[entry['file']] = _BuiltAsset(logical, path, entry['hash'], entry['encodings'])
+                        urls[logical] = entry['file']
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Static assets manifest error: {e}")
+                    assets, urls = {}, {}
+
+        with self._lock:
+            self._assets = assets
+            self._urls = urls
+        return len(assets)
+
+    def url(self, logical):
+        """Đường dẫn /assets/... của một file (tên có hash nếu đã build)"""
+        return '/assets/' + self._urls.get(logical, logical)
+
+    def send(self, filename):
+        asset = self._assets.get(filename)
+        if asset is None:
+            return self._send_source(filename)
+
+        encoding, path = 'identity', asset.path
+        if asset.variants:
+            for name, _ in ENCODINGS:
+                if name in asset.variants and request.accept_encodings[name]:
+                    encoding, path = name, asset.variants[name]
+                    break
+
+        etag = asset.hash if encoding == 'identity' else f'{asset.hash}-{encoding}'
+        response = send_file(path, mimetype=asset.mimetype, etag=etag, conditional=True, max_age=self.max_age)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        self._record(encoding, response.status_code)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'assets': len(self._assets),
+                'served': dict(self._served),
+                'not_modified': self._not_modified,
+                'fallbacks': self._fallbacks
+            }
+
+    def _send_source(self, filename):
+        response = send_from_directory(self.source_dir, filename, max_age=0)
+        # Tên không hash có thể đổi nội dung bất cứ lúc nào: luôn hỏi lại (ETag -> 304)
+        response.cache_control.no_cache = True
+        with self._lock:
+            self._fallbacks += 1
+        self._record('identity', response.status_code, fallback=True)
+        return response
+
+    def _record(self, encoding, status_code, fallback=False):
+        with self._lock:
+            if status_code == 304:
+                self._not_modified += 1
+            elif not fallback:
+                self._served[encoding] += 1
+
+    def _is_stale(self, manifest_path, template_dir):
+        built_at = os.path.getmtime(manifest_path)
+        for directory in (self.source_dir, template_dir):
+            if not directory or not os.path.isdir(directory):
+                continue
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if os.path.getmtime(os.path.join(dirpath, filename)) > built_at:
+                        return True
+        return False
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,6 @@
+from app import create_app, start_services
+
+# Điểm vào cho WSGI server, vd: gunicorn -k gthread --threads $WSGI_THREADS wsgi:app
+# (WSGI_THREADS quyết định số kết nối SSE/long-poll tối đa, xem utils/battle_events.py)
+app = create_app()
+start_services(app)